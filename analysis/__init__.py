@@ -1,49 +1,45 @@
-import streamlit as st
 import os
-import tempfile
-from datetime import datetime
-from docx import Document
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
 import io
+import json
+import time
+from datetime import datetime
 from dotenv import load_dotenv
-from docx import Document
-from openpyxl import  load_workbook
-from reportlab.lib.pagesizes import letter             
 import logging
 
-from .document_processor import DocumentProcessor
-from .screenshot_handler import EvidenceScreenshotHandler
-from .corrective_extractor import CorrectiveActionsExtractor
-from .excel_handler import ExcelHandler
-from .llm_processor import LLMProcessor
-from .response_processor import ResponsePreprocessor
-from .template_analyzer import TemplateAnalyzer
-from .report_generator import ReportGenerator
-
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-
+# Read settings such as OPENAI_API_KEY from .env once for the whole package,
+# before any module reads its environment-configurable constants
 load_dotenv(".env")
 
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
-# Set page configuration
-st.set_page_config(
-    page_title="AI Audit Report Generator",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+# Seconds between progress refreshes while a submitted report is generating
+JOB_POLL_SECONDS = float(os.environ.get('REPORT_JOB_POLL_SECONDS', 1))
 
 
 
 # ------- Enhanced Streamlit User Interface -------
 def main():
+    # The UI and the pipeline stages are imported here so that importing the
+    # package (for the batch CLI or a single module) stays cheap
+    import streamlit as st
+
+    from .corrective_extractor import CorrectiveActionsExtractor
+    from .excel_handler import ExcelHandler
+    from .jobs import get_job_queue, start_local_workers, QUEUED, RUNNING, FAILED
+
+    # Set page configuration
+    st.set_page_config(
+        page_title="AI Audit Report Generator",
+        page_icon="📊",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
     st.title("AI Audit Report Generator")
     st.write("Generate professional internal audit reports from your evidence files.")
     
@@ -89,6 +85,13 @@ def main():
         st.session_state.report_date = datetime.now().strftime("%d/%m/%Y")
     if 'register_updated' not in st.session_state:
         st.session_state.register_updated = False
+    if 'corrective_actions_cache' not in st.session_state:
+        st.session_state.corrective_actions_cache = {}
+    if 'report_previews' not in st.session_state:
+        st.session_state.report_previews = []
+    
+    # Set while a submitted report is queued or running, to refresh its progress
+    poll_job = False
     
     with tab1:
         # File uploads for evidence
@@ -127,197 +130,150 @@ def main():
             key="generate_btn"
         )
         
+        # Reports are generated by the job workers rather than in this script run,
+        # so a long report survives reruns, and a page refresh reattaches to it
+        # through the job id kept in the URL
+        job_queue = get_job_queue()
+        start_local_workers()
+        
         if generate_btn and evidence_files and template_file:
-            # logger.info(f"First: {evidence_files}")
-            progress_container = st.container()
-            with progress_container:
-                progress_bar = st.progress(0)
-                status_text = st.empty()
+            job_id = job_queue.submit(
+                [(file.name, file.getbuffer()) for file in evidence_files],
+                (template_file.name, template_file.getbuffer()),
+                provider=ai_provider.lower(),
+                model=model,
+                auditor_name=auditor_name
+            )
+            st.session_state.report_job_id = job_id
+            st.query_params["job"] = job_id
+        
+        job_id = st.session_state.get('report_job_id') or st.query_params.get("job")
+        job = job_queue.get(job_id) if job_id else None
+        
+        if job_id and job is None:
+            st.warning("The report job could not be found; it may have expired. Please generate the report again.")
+            st.session_state.report_job_id = None
+            if "job" in st.query_params:
+                del st.query_params["job"]
+        
+        elif job and job['status'] in (QUEUED, RUNNING):
+            st.session_state.report_job_id = job_id
+            st.progress(job['progress'])
+            if job['status'] == QUEUED:
+                ahead = job_queue.position(job_id)
+                st.text("Waiting for a worker..." + (f" ({ahead} reports ahead in the queue)" if ahead else ""))
+            else:
+                st.text(job['message'])
+            
+            # Sections of the report appear here as the AI writes them
+            if job['preview']:
+                st.subheader("Report Preview")
+                st.info("The report is still being written; sections appear as they are completed.")
+                st.markdown(job['preview'])
+            poll_job = True
+        
+        elif job:
+            st.session_state.report_job_id = job_id
+            job_result = job_queue.result(job_id)
+            
+            if job['status'] == FAILED:
+                st.error(f"Error during report generation: {job['error']}")
+                st.text(job['message'])
+            
+            elif st.session_state.get('loaded_report_job_id') != job_id:
+                # Store the report data in session state for use in other tabs
+                st.session_state.generated_report_content = job_result['report_content']
+                st.session_state.report_bytes = job_result['report_bytes']
+                st.session_state.report_previews = job_result['previews']
+                st.session_state.loaded_report_job_id = job_id
                 
-                # Create temp directory for processing
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    try:
-                        # Save uploaded files
-                        status_text.text("Processing uploaded files...")
-                        evidence_paths = []
-                        
-                        for i, file in enumerate(evidence_files):
-                            file_path = os.path.join(temp_dir, file.name)
-                            with open(file_path, "wb") as f:
-                                f.write(file.getbuffer())
-                            evidence_paths.append(file_path)
-                            progress_bar.progress((i + 1) / (len(evidence_files) + 5))
-                        
-                        template_path = os.path.join(temp_dir, template_file.name)
-                        with open(template_path, "wb") as f:
-                            f.write(template_file.getbuffer())
-                        
-                        # Extract text from evidence files
-                        status_text.text("Extracting content from evidence files...")
-                        all_evidence_text = ""
-
-                        # logger.info(f"file path before DocumentProcessor:{evidence_paths}")
-
-                        
-                        for i, file_path in enumerate(evidence_paths):
-                            text = DocumentProcessor.process_file(file_path)
-                            all_evidence_text += f"\n\n--- EVIDENCE FROM {os.path.basename(file_path)} ---\n\n"
-                            all_evidence_text += text
-                            progress_bar.progress((len(evidence_files) + i + 1) / (len(evidence_files) * 2 + 5))
-                        
-                        # Generate screenshots of evidence files
-                        status_text.text("Capturing screenshots from evidence files...")
-                        # logger.info(f"file path after DocumentProcessor:{evidence_paths}")
-                        screenshot_handler = EvidenceScreenshotHandler()
-                        evidence_images = screenshot_handler.process_evidence_files(evidence_paths)
-                        progress_bar.progress((len(evidence_files) * 2 + 1) / (len(evidence_files) * 2 + 5))
-                        
-                        # Analyze template structure
-                        status_text.text("Analyzing template structure...")
-                        template_structure = TemplateAnalyzer.extract_template_structure(template_path)
-                        template_prompt = TemplateAnalyzer.format_template_for_prompt(template_structure)
-                        progress_bar.progress((len(evidence_files) * 2 + 2) / (len(evidence_files) * 2 + 5))
-                        
-                        # Create preprocessor for handling evidence references
-                        response_preprocessor = ResponsePreprocessor()
-                        
-                        # Different handling based on AI provider
-                        status_text.text(f"Generating audit report with {ai_provider} AI...")
-                        
-                        if ai_provider.lower() == "openai":
-                            # Add evidence file references to the prompt
-                            evidence_names = [os.path.basename(path) for path in evidence_paths]
-                            evidence_prompt = "Evidence files provided: " + ", ".join(evidence_names)
-                            logger.info(f"FILES:{evidence_prompt}")
-                            evidence_prompt += "\n\nPlease reference these evidence files where appropriate in the report, especially in the 'SIGHTED EVIDENCE' sections."
-                            
-                            # For OpenAI, use the batch processing directly with evidence and template
-                            llm_response = LLMProcessor.analyze_with_model(
-                                prompt=evidence_prompt, 
-                                provider=ai_provider.lower(), 
-                                model=model,
-                                evidence_text=all_evidence_text,
-                                template_structure=template_prompt,
-                                auditor_name=auditor_name
-                            )
-                        else:
-                            # For Gemini, use the traditional approach with single prompt
-                            evidence_names = [os.path.basename(path) for path in evidence_paths]
-                            evidence_prompt = "Evidence files provided: " + ", ".join(evidence_names)
-                            evidence_prompt += "\n\nPlease reference these evidence files where appropriate in the report, especially in the 'SIGHTED EVIDENCE' sections."
-                            
-                            # Add evidence file names to the prompt
-                            prompt = LLMProcessor.create_audit_prompt(all_evidence_text, template_prompt, auditor_name)
-                            prompt += "\n\n" + evidence_prompt
-                            
-                            llm_response = LLMProcessor.analyze_with_model(
-                                prompt=prompt,
-                                provider=ai_provider.lower(), 
-                                model=model
-                            )
-                        
-                        # Process AI response
-                        status_text.text("Processing AI response...")
-                        processed_response = response_preprocessor.preprocess(llm_response)
-                        progress_bar.progress((len(evidence_files) * 2 + 3) / (len(evidence_files) * 2 + 5))
-                        
-                        # Create the report generator and set evidence images
-                        report_generator = ReportGenerator()
-                        logger.info(len(evidence_images))
-                        report_generator.set_evidence_images(evidence_images)
-                        report_generator.set_preprocessor(response_preprocessor)
-                                                
-                        # Generate report document by filling the template
-                        status_text.text("Filling template with audit results and evidence images...")
-                        report_doc = report_generator.fill_template_document(template_path, processed_response, auditor_name)
-                        
-                        if report_doc:
-                            # Save the report
-                            output_path = os.path.join(temp_dir, "Completed_Audit_Report.docx")
-                            report_doc.save(output_path)
-                            progress_bar.progress(1.0)
-                            status_text.text("Report generated successfully!")
-                            
-                            # Store the report data in session state for use in other tabs
-                            st.session_state.generated_report_content = processed_response
-                            
-                            # Save the report bytes for download
-                            with open(output_path, "rb") as file:
-                                report_bytes = file.read()
-                                st.session_state.report_bytes = report_bytes
-                            
-                            # Reset the register updated flag
-                            st.session_state.register_updated = False
-                            
-                            # Display the AI-generated content for review
-                            st.subheader("AI-Generated Report Content")
-                            st.write("Review the content before downloading:")
-                            
-                            # Show in expander to save space
-                            with st.expander("Show AI-Generated Content", expanded=False):
-                                st.markdown(processed_response)
-                            
-                            # Display evidence preview
-                            with st.expander("Evidence Screenshots Preview", expanded=False):
-                                st.write("The following evidence screenshots were captured and added to the report:")
-                                
-                                # Create columns to display evidence thumbnails
-                                cols = st.columns(3)  # Display 3 thumbnails per row
-                                col_idx = 0
-                                
-                                for file_name, images in evidence_images.items():
-                                    for img in images:
-                                        # Create an in-memory file-like object
-                                        img_bytes = io.BytesIO(img['data'])
-                                        
-                                        # Display in the appropriate column
-                                        with cols[col_idx % 3]:
-                                            st.image(img_bytes, caption=img['source'], width=200)
-                                            st.write(f"Added to report under 'SIGHTED EVIDENCE'")
-                                        
-                                        col_idx += 1
-                            
-                            # Provide download button for the report
-                            st.download_button(
-                                label="Download Completed Report",
-                                data=report_bytes,
-                                file_name="Internal_Audit_Report.docx",
-                                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                                use_container_width=True
-                            )
-                            
-                            # Show preview of first page
-                            st.subheader("Report Preview")
-                            st.info("This is a preview of how your report will look. Download the document for the complete formatted report with evidence screenshots.")
-                            
-                            # Display a sample of the structure (first few sections)
-                            preview_sections = []
-                            section_count = 0
-                            current_section = ""
-                            
-                            for line in processed_response.split('\n'):
-                                if line.startswith('#'):
-                                    if current_section and section_count < 5:
-                                        preview_sections.append(current_section)
-                                        section_count += 1
-                                    current_section = line + "\n"
-                                elif section_count < 5:
-                                    current_section += line + "\n"
-                            
-                            if current_section and section_count < 5:
-                                preview_sections.append(current_section)
-                            
-                            st.markdown('\n\n'.join(preview_sections))
-                            
-                            # Prompt to update Corrective Actions Register
-                            st.info("Now you can go to the 'Corrective Actions Register' tab to update your register with the findings from this audit.")
-                            
-                        else:
-                            status_text.text("Error generating report document.")
-                            
-                    except Exception as e:
-                        st.error(f"Error during report generation: {str(e)}")
-                        status_text.text(f"Error: {str(e)}")
+                # Reset the register updated flag
+                st.session_state.register_updated = False
+            
+            if job['status'] != FAILED:
+                processed_response = st.session_state.generated_report_content
+                report_bytes = st.session_state.report_bytes
+                
+                st.progress(1.0)
+                st.text(job['message'])
+                
+                # Display the AI-generated content for review
+                st.subheader("AI-Generated Report Content")
+                st.write("Review the content before downloading:")
+                
+                # Show in expander to save space
+                with st.expander("Show AI-Generated Content", expanded=False):
+                    st.markdown(processed_response)
+                
+                # Display evidence preview
+                with st.expander("Evidence Screenshots Preview", expanded=False):
+                    st.write("The following evidence screenshots were captured and added to the report:")
+                    
+                    # Create columns to display evidence thumbnails
+                    cols = st.columns(3)  # Display 3 thumbnails per row
+                    
+                    for col_idx, (source, data) in enumerate(st.session_state.report_previews):
+                        # Display in the appropriate column
+                        with cols[col_idx % 3]:
+                            st.image(io.BytesIO(data), caption=source, width=200)
+                            st.write(f"Added to report under 'SIGHTED EVIDENCE'")
+                
+                # Provide download button for the report
+                st.download_button(
+                    label="Download Completed Report",
+                    data=report_bytes,
+                    file_name="Internal_Audit_Report.docx",
+                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                    use_container_width=True
+                )
+                
+                # Show preview of first page
+                st.subheader("Report Preview")
+                st.info("This is a preview of how your report will look. Download the document for the complete formatted report with evidence screenshots.")
+                
+                # Display a sample of the structure (first few sections)
+                preview_sections = []
+                section_count = 0
+                current_section = ""
+                
+                for line in processed_response.split('\n'):
+                    if line.startswith('#'):
+                        if current_section and section_count < 5:
+                            preview_sections.append(current_section)
+                            section_count += 1
+                        current_section = line + "\n"
+                    elif section_count < 5:
+                        current_section += line + "\n"
+                
+                if current_section and section_count < 5:
+                    preview_sections.append(current_section)
+                
+                st.markdown('\n\n'.join(preview_sections))
+                
+                # Prompt to update Corrective Actions Register
+                st.info("Now you can go to the 'Corrective Actions Register' tab to update your register with the findings from this audit.")
+            
+            # Show where the time went, also for failed runs
+            run_metrics = job_result['metrics'] if job_result else {}
+            if run_metrics:
+                with st.expander("Run metrics", expanded=False):
+                    st.dataframe(
+                        [{'stage': name, **entry} for name, entry in run_metrics['stages'].items()],
+                        use_container_width=True
+                    )
+                    st.write("API usage:")
+                    st.json(run_metrics['api'])
+                    if run_metrics['values']:
+                        st.json(run_metrics['values'])
+                    if run_metrics['files']:
+                        st.write("Per-file timings:")
+                        st.dataframe(run_metrics['files'], use_container_width=True)
+                    st.download_button(
+                        label="Download Run Metrics (JSON)",
+                        data=json.dumps(run_metrics, indent=2),
+                        file_name="run_metrics.json",
+                        mime="application/json"
+                    )
     
     with tab2:
         st.subheader("Corrective Actions Register")
@@ -334,11 +290,13 @@ def main():
                 key="register_file"
             )
             
-            # Extract corrective actions from the report
+            # Extract corrective actions from the report (memoised so reruns from
+            # editing the fields below do not repeat the LLM call)
             if not st.session_state.register_updated:
-                extracted_data = CorrectiveActionsExtractor.extract_from_report(
+                extracted_data, _ = CorrectiveActionsExtractor.extract_from_report_cached(
                     st.session_state.generated_report_content,
-                    st.session_state.report_date
+                    st.session_state.report_date,
+                    cache=st.session_state.corrective_actions_cache
                 )
                 
                 # Show preview of extracted data
@@ -431,5 +389,9 @@ def main():
         6. You can review and download both the completed report and updated register
         
         #### Privacy & Security:
-        All processing happens within this application. Your files are not stored permanently and are deleted after processing.
+        All processing happens within this application. Your uploaded files are deleted once the report is generated, and generated reports are kept only until they expire from the report queue.
         """)
+    
+    if poll_job:
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import sys
+import threading
+
+from .evidence_cache import EvidenceCache
+from .response_cache import NullResponseCache, set_response_cache
+
+
+def main(argv=None):
+    """Command line entry point: python -m analysis <command>."""
+    parser = argparse.ArgumentParser(prog="python -m analysis", description="AI Audit Report Generator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Generate one report per evidence set without the Streamlit UI"
+    )
+    batch_parser.add_argument("evidence_dir", help="Directory containing one sub-directory per evidence set")
+    batch_parser.add_argument("template", help="Audit report template (Word format)")
+    batch_parser.add_argument("-o", "--output-dir", default="reports", help="Directory to write the reports to")
+    batch_parser.add_argument("-w", "--workers", type=int, default=2, help="Number of evidence sets processed concurrently")
+    batch_parser.add_argument("--model", default="gpt-4o", choices=["gpt-4o", "gpt-4o-mini"], help="OpenAI model")
+    batch_parser.add_argument("--auditor-name", default="", help="Auditor name written into the reports")
+    batch_parser.add_argument("--no-cache", action="store_true", help="Ignore cached evidence extractions and AI responses")
+    batch_parser.add_argument("--metrics-json", help="Write per-set run metrics to this JSON file")
+
+    worker_parser = subparsers.add_parser(
+        "worker",
+        help="Generate the reports submitted through the Streamlit app"
+    )
+    worker_parser.add_argument("-c", "--concurrency", type=int, default=1, help="Number of jobs processed concurrently")
+    worker_parser.add_argument("--job-dir", help="Job queue directory (default: REPORT_JOB_DIR)")
+    worker_parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between checks of an empty queue")
+    worker_parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        from .batch import BatchRunner
+
+        if args.no_cache:
+            set_response_cache(NullResponseCache())
+            EvidenceCache.default().enabled = False
+
+        runner = BatchRunner(
+            evidence_root=args.evidence_dir,
+            template_path=args.template,
+            output_dir=args.output_dir,
+            max_workers=args.workers,
+            model=args.model,
+            auditor_name=args.auditor_name
+        )
+        results = runner.run()
+        print(BatchRunner.format_timing_summary(results))
+        if args.metrics_json:
+            with open(args.metrics_json, 'w', encoding='utf-8') as f:
+                json.dump({r['set_name']: r['metrics'] for r in results}, f, indent=2)
+        return 0 if results and all(r['status'] == "ok" for r in results) else 1
+
+    if args.command == "worker":
+        from .jobs import JobQueue, JobWorker
+
+        job_queue = JobQueue(job_dir=args.job_dir)
+        workers = [JobWorker(job_queue, poll_interval=args.poll_interval) for _ in range(max(1, args.concurrency))]
+        threads = [threading.Thread(target=worker.run, kwargs={'once': args.once}, daemon=True) for worker in workers]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1.0)
+        except KeyboardInterrupt:
+            # Let the running jobs finish; their heartbeats stop if the process is killed
+            for worker in workers:
+                worker.stop()
+            for thread in threads:
+                thread.join()
+        return 0
+
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
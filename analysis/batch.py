@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .pipeline import ReportPipeline
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Evidence formats accepted by the Streamlit uploader
+EVIDENCE_EXTENSIONS = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.jpg', '.jpeg', '.png', '.txt', '.dotx'}
+
+
+# ------- Batch Processing Module -------
+class BatchRunner:
+    """Generate reports for many evidence sets concurrently with a bounded worker pool."""
+
+    def __init__(self, evidence_root, template_path, output_dir, max_workers=2,
+                 provider="openai", model="gpt-4o", auditor_name=""):
+        """Initialize the batch runner."""
+        self.evidence_root = evidence_root
+        self.template_path = template_path
+        self.output_dir = output_dir
+        self.max_workers = max(1, int(max_workers))
+        self.provider = provider
+        self.model = model
+        self.auditor_name = auditor_name
+        self.results = []
+
+    @staticmethod
+    def _list_evidence_files(directory):
+        """List the supported evidence files in a directory, sorted by name."""
+        files = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and os.path.splitext(name)[1].lower() in EVIDENCE_EXTENSIONS:
+                files.append(path)
+        return files
+
+    def discover_evidence_sets(self):
+        """
+        Find the evidence sets to process.
+
+        Every sub-directory of the evidence root is one evidence set. If the root
+        has no sub-directories, the root itself is treated as a single set.
+        """
+        evidence_sets = {}
+        for name in sorted(os.listdir(self.evidence_root)):
+            path = os.path.join(self.evidence_root, name)
+            if os.path.isdir(path):
+                files = self._list_evidence_files(path)
+                if files:
+                    evidence_sets[name] = files
+
+        if not evidence_sets:
+            files = self._list_evidence_files(self.evidence_root)
+            if files:
+                evidence_sets[os.path.basename(os.path.normpath(self.evidence_root))] = files
+
+        return evidence_sets
+
+    def _run_one(self, set_name, evidence_paths):
+        """Run the pipeline for a single evidence set and save its report."""
+        output_path = os.path.join(self.output_dir, f"{set_name}_Internal_Audit_Report.docx")
+        pipeline = ReportPipeline(provider=self.provider, model=self.model, auditor_name=self.auditor_name)
+        start = time.perf_counter()
+        try:
+            result = pipeline.run(evidence_paths, self.template_path, output_path=output_path)
+            status = "ok" if result['report_doc'] else "failed"
+            error = None if result['report_doc'] else "No report document generated"
+        except Exception as e:
+            logger.error(f"Error generating report for {set_name}: {str(e)}")
+            status = "failed"
+            error = str(e)
+
+        return {
+            'set_name': set_name,
+            'status': status,
+            'error': error,
+            'output_path': output_path if status == "ok" else None,
+            'files': len(evidence_paths),
+            'timings': pipeline.timings,
+            'metrics': pipeline.metrics.to_dict(),
+            'elapsed': time.perf_counter() - start,
+        }
+
+    def run(self):
+        """Process every evidence set and return the per-set results."""
+        evidence_sets = self.discover_evidence_sets()
+        if not evidence_sets:
+            logger.warning(f"No evidence sets found in {self.evidence_root}")
+            return []
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        logger.info(f"Processing {len(evidence_sets)} evidence sets with {self.max_workers} workers")
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._run_one, set_name, paths): set_name
+                for set_name, paths in evidence_sets.items()
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                logger.info(f"Finished {result['set_name']} ({result['status']}) in {result['elapsed']:.1f}s")
+                results.append(result)
+
+        # Keep the report order stable regardless of completion order
+        results.sort(key=lambda r: r['set_name'])
+        self.results = results
+        return results
+
+    @staticmethod
+    def format_timing_summary(results):
+        """Format a per-stage timing summary across all processed evidence sets."""
+        lines = []
+        lines.append(f"{'Stage':<20}{'Total (s)':>12}{'Mean (s)':>12}{'Max (s)':>12}")
+
+        for stage in ReportPipeline.STAGES:
+            durations = [r['timings'][stage] for r in results if stage in r['timings']]
+            if not durations:
+                continue
+            lines.append(
+                f"{stage:<20}{sum(durations):>12.2f}{sum(durations) / len(durations):>12.2f}{max(durations):>12.2f}"
+            )
+
+        api_calls = [r['metrics']['api'] for r in results if r.get('metrics')]
+        if api_calls:
+            lines.append("")
+            lines.append(
+                f"API calls: {sum(a['calls'] for a in api_calls)} "
+                f"({sum(a['cached_calls'] for a in api_calls)} cached), "
+                f"tokens in/out: {sum(a['prompt_tokens'] for a in api_calls)}/{sum(a['completion_tokens'] for a in api_calls)}, "
+                f"API latency: {sum(a['total_latency_seconds'] for a in api_calls):.2f}s, "
+                f"retries: {sum(a.get('retries', 0) for a in api_calls)}, "
+                f"rate limit wait: {sum(a.get('queued_seconds', 0.0) for a in api_calls):.2f}s"
+            )
+
+        succeeded = sum(1 for r in results if r['status'] == "ok")
+        lines.append("")
+        lines.append(f"Reports generated: {succeeded}/{len(results)}")
+        for r in results:
+            if r['status'] != "ok":
+                lines.append(f"  FAILED {r['set_name']}: {r['error']}")
+
+        return '\n'.join(lines)
@@ -0,0 +1,368 @@
+import os
+import time
+import queue
+import atexit
+import itertools
+import threading
+import collections
+import multiprocessing
+import logging
+from concurrent.futures import Future
+
+from .renderers import RENDER_TIMEOUT, get_renderer_class, render_pages
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Number of warm converter processes
+POOL_SIZE = int(os.environ.get('CONVERTER_POOL_SIZE', min(4, max(2, os.cpu_count() or 1))))
+
+# Seconds a worker may take to start its converter before it is replaced
+STARTUP_TIMEOUT = float(os.environ.get('CONVERTER_STARTUP_TIMEOUT', 120))
+
+# Seconds a conversion may run before its worker is treated as hung and restarted
+TASK_TIMEOUT = float(os.environ.get('CONVERTER_TASK_TIMEOUT', RENDER_TIMEOUT * 2))
+
+# Idle workers are pinged this often so a dead converter is replaced before it is needed
+HEALTH_CHECK_INTERVAL = float(os.environ.get('CONVERTER_HEALTH_CHECK_INTERVAL', 30))
+
+
+def _run_task(renderers, renderer_name, kind, args):
+    """Run one request in a worker, reusing the worker's resident renderers."""
+    if kind == "ping":
+        return True
+
+    file_path = args[0]
+    renderer_class = get_renderer_class(renderer_name, file_path)
+    if renderer_class is None:
+        raise RuntimeError(f"No document renderer available for {os.path.basename(file_path)}")
+
+    renderer = renderers.get(renderer_class.name)
+    if renderer is None:
+        renderer = renderer_class()
+        renderer.open()
+        renderers[renderer_class.name] = renderer
+
+    if kind == "pdf":
+        return renderer.to_pdf(file_path, args[1])
+    if kind == "render":
+        return render_pages(renderer, file_path, max_pages=args[1], zoom=args[2])
+    raise ValueError(f"Unknown converter request: {kind}")
+
+
+def _worker_main(worker_id, renderer_name, task_queue, result_queue):
+    """Worker process loop: keep the converters resident and serve requests until told to stop."""
+    renderers = {}
+    result_queue.put(("ready", worker_id, None, None))
+    try:
+        while True:
+            message = task_queue.get()
+            if message is None:
+                break
+            task_id, kind, args = message
+            try:
+                result_queue.put(("done", worker_id, task_id, _run_task(renderers, renderer_name, kind, args)))
+            except Exception as e:
+                result_queue.put(("error", worker_id, task_id, f"{type(e).__name__}: {str(e)}"))
+    finally:
+        for renderer in renderers.values():
+            try:
+                renderer.close()
+            except Exception:
+                pass
+
+
+class _Task:
+    """A queued conversion request."""
+
+    __slots__ = ('task_id', 'kind', 'args', 'future', 'timeout', 'deadline', 'retried')
+
+    def __init__(self, task_id, kind, args, timeout):
+        self.task_id = task_id
+        self.kind = kind
+        self.args = args
+        self.future = Future()
+        self.timeout = timeout
+        self.deadline = None
+        self.retried = False
+
+
+class _Worker:
+    """Handle on one converter process and the request it is serving."""
+
+    def __init__(self, worker_id, context, renderer_name, result_queue):
+        self.worker_id = worker_id
+        self.task_queue = context.Queue()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(worker_id, renderer_name, self.task_queue, result_queue),
+            daemon=True
+        )
+        self.process.start()
+        self.started = time.monotonic()
+        self.last_seen = self.started
+        self.ready = False
+        self.task = None
+
+    def stop(self, timeout=5):
+        """Ask the worker to exit, killing it if it does not."""
+        try:
+            self.task_queue.put(None)
+        except Exception:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+
+
+# ------- Converter Pool Module -------
+class ConverterPool:
+    """
+    Long-lived pool of converter processes shared by every document conversion.
+
+    Each worker keeps its renderer resident (an Office instance for the COM
+    backends, an initialised profile for LibreOffice), so a batch of N documents
+    pays the converter start-up once per worker instead of once per document.
+    Requests wait in a queue until a worker is free; workers that die, hang on a
+    request or stop answering health checks are restarted.
+    """
+
+    def __init__(self, size=None, renderer_name=None, task_timeout=None):
+        """Initialize the pool; worker processes are started on first use."""
+        self.size = max(1, size or POOL_SIZE)
+        self.renderer_name = renderer_name
+        self.task_timeout = task_timeout or TASK_TIMEOUT
+        self.restarts = 0
+        self.completed = 0
+        # Spawned workers start clean: a fork would copy the parent's threads,
+        # locks and open clients, which can leave a worker deadlocked at start
+        self._context = multiprocessing.get_context("spawn")
+        self._result_queue = None
+        self._workers = {}
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._worker_ids = itertools.count()
+        self._dispatcher = None
+        self._closed = False
+
+    def _start(self):
+        """Start the worker processes and the dispatcher thread (caller holds the lock)."""
+        if self._dispatcher is not None:
+            return
+        self._result_queue = self._context.Queue()
+        for slot in range(self.size):
+            self._workers[slot] = self._new_worker()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="converter-pool", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Started converter pool with {self.size} workers")
+
+    def _new_worker(self):
+        return _Worker(next(self._worker_ids), self._context, self.renderer_name, self._result_queue)
+
+    def submit(self, kind, *args, timeout=None):
+        """
+        Queue a conversion request.
+
+        Args:
+            kind: "pdf" (args: file_path, output_dir) or "render" (args: file_path, max_pages, zoom)
+            timeout: Seconds the request may run before its worker is restarted
+
+        Returns:
+            A Future for the request's result
+        """
+        task = _Task(next(self._task_ids), kind, args, timeout or self.task_timeout)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Converter pool is shut down")
+            self._start()
+            self._pending.append(task)
+            self._assign_pending()
+        return task.future
+
+    def _assign_pending(self):
+        """Hand queued requests to idle workers (caller holds the lock)."""
+        for worker in self._workers.values():
+            if not self._pending:
+                return
+            if not worker.ready or worker.task is not None:
+                continue
+            while self._pending:
+                task = self._pending.popleft()
+                # Retried requests are already running; new ones may have been cancelled
+                if task.future.running() or task.future.set_running_or_notify_cancel():
+                    self._send(worker, task)
+                    break
+
+    @staticmethod
+    def _send(worker, task):
+        task.deadline = time.monotonic() + task.timeout
+        worker.task = task
+        worker.task_queue.put((task.task_id, task.kind, task.args))
+
+    def _dispatch_loop(self):
+        """Collect results, check worker health and assign queued requests."""
+        while not self._closed:
+            try:
+                message = self._result_queue.get(timeout=0.5)
+            except queue.Empty:
+                message = None
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                if self._closed:
+                    break
+                if message is not None:
+                    self._handle_message(*message)
+                self._check_health()
+                self._assign_pending()
+
+    def _handle_message(self, status, worker_id, task_id, value):
+        """Apply a worker message (caller holds the lock)."""
+        worker = next((w for w in self._workers.values() if w.worker_id == worker_id), None)
+        if worker is None:
+            # Late message from a worker that has been replaced
+            return
+        worker.last_seen = time.monotonic()
+        if status == "ready":
+            worker.ready = True
+            return
+
+        task = worker.task
+        if task is None or task.task_id != task_id:
+            return
+        worker.task = None
+        self.completed += 1
+        if status == "done":
+            task.future.set_result(value)
+        else:
+            task.future.set_exception(RuntimeError(value))
+
+    def _check_health(self):
+        """Restart dead, hung or unresponsive workers (caller holds the lock)."""
+        now = time.monotonic()
+        for slot, worker in list(self._workers.items()):
+            task = worker.task
+            if not worker.process.is_alive():
+                self._restart(slot, "exited")
+                if task is not None and not task.retried and task.kind != "ping":
+                    # The crash may not be the document's fault; give it one more try
+                    task.retried = True
+                    self._pending.appendleft(task)
+                elif task is not None:
+                    task.future.set_exception(RuntimeError("Converter worker exited"))
+            elif task is not None and now > task.deadline:
+                self._restart(slot, "hung")
+                task.future.set_exception(TimeoutError(f"Conversion timed out after {task.timeout:.0f}s"))
+            elif not worker.ready and now - worker.started > STARTUP_TIMEOUT:
+                self._restart(slot, "did not start")
+            elif worker.ready and task is None and now - worker.last_seen > HEALTH_CHECK_INTERVAL:
+                ping = _Task(next(self._task_ids), "ping", (), min(self.task_timeout, 30))
+                ping.future.set_running_or_notify_cancel()
+                self._send(worker, ping)
+
+    def _restart(self, slot, reason):
+        """Replace the worker in a slot (caller holds the lock)."""
+        worker = self._workers[slot]
+        logger.warning(f"Restarting converter worker {worker.worker_id}: {reason}")
+        worker.process.terminate()
+        worker.process.join(5)
+        if worker.process.is_alive():
+            worker.process.kill()
+        self._workers[slot] = self._new_worker()
+        self.restarts += 1
+
+    def convert_to_pdf(self, file_path, output_dir):
+        """
+        Convert a document to PDF in output_dir.
+
+        Returns:
+            Path to the PDF, or None if no renderer is available or conversion failed
+        """
+        if get_renderer_class(self.renderer_name, file_path) is None:
+            logger.warning(f"No document renderer available for {os.path.basename(file_path)}")
+            return None
+        try:
+            return self.submit("pdf", os.path.abspath(file_path), os.path.abspath(output_dir)).result()
+        except Exception as e:
+            logger.error(f"Error converting {file_path} to PDF: {str(e)}")
+            return None
+
+    def render_many(self, file_paths, max_pages=1, zoom=None):
+        """
+        Render documents to PNG page images concurrently.
+
+        Returns:
+            Dictionary mapping each path to its list of PNG bytes (empty on failure)
+        """
+        results = {}
+        futures = {}
+        for path in file_paths:
+            if get_renderer_class(self.renderer_name, path) is None:
+                logger.warning(f"No document renderer available for {os.path.basename(path)}")
+                results[path] = []
+            else:
+                futures[path] = self.submit("render", os.path.abspath(path), max_pages, zoom)
+
+        for path, future in futures.items():
+            try:
+                results[path] = future.result() or []
+            except Exception as e:
+                logger.error(f"Error rendering {path}: {str(e)}")
+                results[path] = []
+        return results
+
+    def render_pages(self, file_path, max_pages=1, zoom=None):
+        """Render one document to PNG page images."""
+        return self.render_many([file_path], max_pages=max_pages, zoom=zoom)[file_path]
+
+    def stats(self):
+        """Return worker, restart, completion and queue counters."""
+        with self._lock:
+            return {
+                'workers': len(self._workers),
+                'busy': sum(1 for w in self._workers.values() if w.task is not None),
+                'restarts': self.restarts,
+                'completed': self.completed,
+                'queued': len(self._pending),
+            }
+
+    def shutdown(self):
+        """Stop every worker and fail requests that are still queued."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending = list(self._pending)
+            self._pending.clear()
+            workers = list(self._workers.values())
+            self._workers = {}
+
+        for task in pending:
+            # Retried requests are already running and cannot be cancelled
+            if not task.future.cancel() and not task.future.done():
+                task.future.set_exception(RuntimeError("Converter pool is shut down"))
+        for worker in workers:
+            if worker.task is not None and not worker.task.future.done():
+                worker.task.future.set_exception(RuntimeError("Converter pool is shut down"))
+            worker.stop()
+        if self._dispatcher is not None:
+            self._dispatcher.join(5)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_converter_pool():
+    """Return the process-wide converter pool shared by all conversion call sites."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConverterPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -1,17 +1,15 @@
 
 import os
+import json
+import hashlib
+import threading
+import collections
 from datetime import datetime
-from docx import Document
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
-from dotenv import load_dotenv
-from docx import Document
-from openpyxl import load_workbook
-from reportlab.lib.pagesizes import letter
 import logging
 
 from  .llm_processor import LLMProcessor
 
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -20,9 +18,76 @@ logger = logging.getLogger(__name__)
 class CorrectiveActionsExtractor:
     """Extract corrective actions data from an audit report for the register."""
     
+    # Fallback memo used when the caller does not provide its own cache, and
+    # the number of reports it keeps (least recently used are dropped first)
+    MEMO_ENTRIES = 32
+    _memo = collections.OrderedDict()
+    _memo_lock = threading.Lock()
+    
+    @staticmethod
+    def report_key(report_content, report_date=None, score_data=None):
+        """Build a memo key from a hash of the report content and extraction inputs."""
+        digest = hashlib.sha256(report_content.encode('utf-8'))
+        digest.update(f"|{report_date}|".encode('utf-8'))
+        if score_data:
+            digest.update(json.dumps(score_data, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+    
+    @staticmethod
+    def extract_from_report_cached(report_content, report_date=None, score_data=None, cache=None):
+        """
+        Extract corrective action data, reusing the result for report content seen before.
+        
+        Args:
+            report_content: The full text of the generated audit report
+            report_date: Date to record in the register
+            score_data: Optional score analysis per evidence file
+            cache: Dictionary-like memo, e.g. a Streamlit session_state entry;
+                defaults to a bounded in-process memo
+            
+        Returns:
+            Tuple of (extracted data dictionary, whether it came from the cache)
+        """
+        key = CorrectiveActionsExtractor.report_key(report_content, report_date, score_data)
+        if cache is None:
+            with CorrectiveActionsExtractor._memo_lock:
+                cached = CorrectiveActionsExtractor._memo.get(key)
+                if cached is not None:
+                    CorrectiveActionsExtractor._memo.move_to_end(key)
+        else:
+            cached = cache.get(key)
+        if cached is not None:
+            return dict(cached), True
+        
+        data, complete = CorrectiveActionsExtractor.extract_with_status(report_content, report_date, score_data)
+        # Fallback values from a failed LLM extraction are not kept, so the next call retries it
+        if complete:
+            if cache is None:
+                with CorrectiveActionsExtractor._memo_lock:
+                    memo = CorrectiveActionsExtractor._memo
+                    memo[key] = dict(data)
+                    while len(memo) > CorrectiveActionsExtractor.MEMO_ENTRIES:
+                        memo.popitem(last=False)
+            else:
+                cache[key] = dict(data)
+        return data, False
+    
     @staticmethod
     def extract_from_report(report_content, report_date=None, score_data=None):
         """Extract key information for the corrective actions register."""
+        return CorrectiveActionsExtractor.extract_with_status(report_content, report_date, score_data)[0]
+    
+    @staticmethod
+    def extract_with_status(report_content, report_date=None, score_data=None):
+        """
+        Extract key information for the corrective actions register.
+        
+        Returns:
+            Tuple of (extracted data dictionary, False if the LLM extraction
+            failed and the data holds rule-based fallbacks)
+        """
+        complete = True
+        
         if not report_date:
             report_date = datetime.now().strftime("%d/%m/%Y")
         
@@ -134,9 +199,12 @@ class CorrectiveActionsExtractor:
                         data["Corrective Actions Implemented"] = enhanced_data["corrective_actions"]
                     if enhanced_data.get("source_of_issue") and len(enhanced_data["source_of_issue"]) > 3:
                         data["Source of Issue"] = enhanced_data["source_of_issue"]
+                else:
+                    complete = False
             except Exception as e:
                 # Fallback to the previously extracted data if LLM fails
                 print(f"LLM extraction failed: {str(e)}")
+                complete = False
         
         # Set a fallback if we still don't have details
         if not data["Details"] or len(data["Details"]) < 10:
@@ -151,7 +219,7 @@ class CorrectiveActionsExtractor:
                 if data['category'] in ['OFI', 'NC']:
                     issue_details.append(f"Issue with {os.path.basename(file_name)}: {data['comment']}")
                     
-        return data
+        return data, complete
     
     @staticmethod
     def determine_source_of_issue(report_content):
@@ -1,82 +1,47 @@
-import sys
-import streamlit as st
 import os
-import tempfile
-from datetime import datetime
-import pandas as pd
-import docx
-from docx import Document
-import comtypes.client
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
-import fitz  # PyMuPDF
-import io
-import win32gui
-import win32ui
-import win32con
-import win32com.client
-from dotenv import load_dotenv
-import pytesseract
-import mammoth
-import base64
-import win32com.client
-import pythoncom
 import time
-from PIL import Image
-import openai
-from PIL import Image, ImageDraw, ImageFont
-from docx import Document
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl import Workbook, load_workbook
-import re
-import openpyxl
-from openpyxl.drawing.image import Image as ExcelImage
-from docxcompose.composer import Composer
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import logging
 
-# from trial import _extract_from_excel as EXTRACT_FROM_EXCEL
-                
+from docx import Document
+from PIL import Image
 
-from typing import List, Dict, Tuple, Union, Optional
-import logging
+from .evidence_cache import EvidenceCache
+from .instrumentation import track_stage, record_stage
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+def _timed_extract_text(file_path):
+    """Extract a single file's text and return it with the extraction latency in seconds."""
+    start = time.perf_counter()
+    text = DocumentProcessor.extract_text(file_path)
+    return text, time.perf_counter() - start
 
-load_dotenv(".env")
-
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
-
-# Set page configuration
-# st.set_page_config(
-#     page_title="AI Audit Report Generator",
-#     page_icon="📊",
-#     layout="wide",
-#     initial_sidebar_state="expanded"
-# )
 
 # ------- Document Processing Module -------
 class DocumentProcessor:
     """Process various document types and extract text."""
     
+    # CPU-bound formats (PDF parsing, OCR) are extracted in a process pool,
+    # everything else is I/O-bound and runs in a thread pool
+    PROCESS_POOL_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+    
+    # Bump when the extracted text changes so stale cache entries are ignored
+    EXTRACTOR_VERSION = 1
+    
     @staticmethod
     def extract_text_from_pdf(file_path):
         """Extract text from PDF files."""
         try:
-            text = ""
-            doc = fitz.open(file_path)
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-            return text
+            import fitz  # PyMuPDF
+            with fitz.open(file_path) as doc:
+                return "".join(page.get_text() for page in doc)
         except Exception as e:
-            st.error(f"Error extracting text from PDF: {e}")
+            logger.error(f"Error extracting text from PDF: {e}")
             return ""
     
     @staticmethod
@@ -100,18 +65,19 @@ class DocumentProcessor:
             
             return '\n'.join(full_text)
         except Exception as e:
-            st.error(f"Error extracting text from DOCX: {e}")
+            logger.error(f"Error extracting text from DOCX: {e}")
             return ""
     
     @staticmethod
     def extract_text_from_image(file_path):
         """Extract text from image files using OCR."""
         try:
+            import pytesseract
             image = Image.open(file_path)
             text = pytesseract.image_to_string(image)
             return text
         except Exception as e:
-            st.error(f"Error extracting text from image: {e}")
+            logger.error(f"Error extracting text from image: {e}")
             return ""
     
     @staticmethod
@@ -150,7 +116,7 @@ class DocumentProcessor:
                     # Try to import openpyxl directly to ensure it's available
                     import openpyxl
                 except ImportError:
-                    st.error("Missing openpyxl library. Install it with: pip install openpyxl")
+                    logger.error("Missing openpyxl library. Install it with: pip install openpyxl")
                     return "ERROR: openpyxl library missing. Install with: pip install openpyxl"
                 
                 df_dict = pd.read_excel(file_path, sheet_name=None, engine='openpyxl')
@@ -163,10 +129,10 @@ class DocumentProcessor:
                 return '\n'.join(full_text)
                 
         except ImportError as e:
-            st.error(f"Missing required library: {e}. Install openpyxl with: pip install openpyxl")
+            logger.error(f"Missing required library: {e}. Install openpyxl with: pip install openpyxl")
             return f"ERROR: Missing required library: {e}. Install with pip."
         except Exception as e:
-            st.error(f"Error extracting text from Excel: {e}")
+            logger.error(f"Error extracting text from Excel: {e}")
             return f"Error: {str(e)}"
     
     @staticmethod
@@ -176,12 +142,12 @@ class DocumentProcessor:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
                 return file.read()
         except Exception as e:
-            st.error(f"Error extracting text from TXT: {e}")
+            logger.error(f"Error extracting text from TXT: {e}")
             return ""
     
     @staticmethod
-    def process_file(file_path):
-        """Process a file based on its extension."""
+    def extract_text(file_path):
+        """Extract text from a file based on its extension, without caching."""
         file_extension = os.path.splitext(file_path)[1].lower()
         
         if file_extension in ['.pdf']:
@@ -196,3 +162,130 @@ class DocumentProcessor:
             return DocumentProcessor.extract_text_from_txt(file_path)
         else:
             return f"Unsupported file format: {file_extension}"
+    
+    @staticmethod
+    def _cache_key(file_path, cache):
+        """Get the cache key for a file, or None if the file cannot be hashed."""
+        if not cache.enabled:
+            return None
+        try:
+            return cache.key_for_file(file_path, "text", DocumentProcessor.EXTRACTOR_VERSION)
+        except OSError as e:
+            logger.warning(f"Could not hash {file_path} for caching: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _is_cacheable(text):
+        """Only cache successful extractions so failures are retried on the next upload."""
+        return bool(text) and not text.startswith(("Error:", "ERROR:", "Unsupported file format"))
+    
+    @staticmethod
+    def process_file(file_path, cache=None):
+        """Process a file based on its extension, reusing cached text for identical files."""
+        cache = cache or EvidenceCache.default()
+        key = DocumentProcessor._cache_key(file_path, cache)
+        if key:
+            cached_text = cache.get(key)
+            if cached_text is not None:
+                return cached_text
+        
+        text = DocumentProcessor.extract_text(file_path)
+        if key and DocumentProcessor._is_cacheable(text):
+            cache.set(key, text)
+        return text
+    
+    @staticmethod
+    @track_stage("extract_text")
+    def process_files(file_paths, max_workers=None, cache=None):
+        """
+        Extract text from many files concurrently.
+        
+        Cached files are served from the evidence cache. OCR and PDF work for the
+        remaining files runs in a process pool, the other formats in a thread pool.
+        
+        Args:
+            file_paths: List of file paths to process
+            max_workers: Maximum workers per pool (defaults to the CPU count)
+            cache: EvidenceCache to use (defaults to the shared cache)
+            
+        Returns:
+            List of dictionaries with 'file_path', 'text' and 'latency' keys, in input order
+        """
+        file_paths = list(file_paths)
+        if not file_paths:
+            return []
+        
+        cache = cache or EvidenceCache.default()
+        results = [None] * len(file_paths)
+        cache_keys = {}
+        pending = []
+        
+        # Serve what we can from the cache; only the misses need extracting
+        for i, path in enumerate(file_paths):
+            start = time.perf_counter()
+            key = DocumentProcessor._cache_key(path, cache)
+            cached_text = cache.get(key) if key else None
+            if cached_text is not None:
+                results[i] = {
+                    'file_path': path,
+                    'text': cached_text,
+                    'latency': time.perf_counter() - start
+                }
+                record_stage("extract_text.file", results[i]['latency'], file=os.path.basename(path))
+                logger.info(f"Loaded {os.path.basename(path)} from cache")
+            else:
+                cache_keys[i] = key
+                pending.append(i)
+        
+        max_workers = max_workers or os.cpu_count() or 1
+        cpu_indices = {i for i in pending
+                       if os.path.splitext(file_paths[i])[1].lower() in DocumentProcessor.PROCESS_POOL_EXTENSIONS}
+        io_indices = [i for i in pending if i not in cpu_indices]
+        
+        futures = {}
+        process_pool = None
+        try:
+            if len(cpu_indices) > 1:
+                try:
+                    # Spawned, not forked: this runs in threads of the Streamlit server, the
+                    # job workers and the batch runner, and a fork would copy their held locks
+                    process_pool = ProcessPoolExecutor(max_workers=min(max_workers, len(cpu_indices)),
+                                                       mp_context=multiprocessing.get_context("spawn"))
+                except Exception as e:
+                    logger.warning(f"Could not start process pool, extracting in threads: {str(e)}")
+                    io_indices = list(pending)
+                    cpu_indices = set()
+            else:
+                # A single CPU-bound file is not worth a process start-up
+                io_indices = list(pending)
+                cpu_indices = set()
+            
+            with ThreadPoolExecutor(max_workers=min(max_workers, max(1, len(io_indices)))) as thread_pool:
+                for i in sorted(cpu_indices):
+                    futures[i] = process_pool.submit(_timed_extract_text, file_paths[i])
+                for i in io_indices:
+                    futures[i] = thread_pool.submit(_timed_extract_text, file_paths[i])
+                
+                for i, future in futures.items():
+                    try:
+                        text, latency = future.result()
+                    except Exception as e:
+                        # A crashed worker should not lose the rest of the batch
+                        logger.error(f"Error processing file {file_paths[i]}: {str(e)}")
+                        text, latency = _timed_extract_text(file_paths[i])
+                    if cache_keys[i] and DocumentProcessor._is_cacheable(text):
+                        cache.set(cache_keys[i], text)
+                    results[i] = {
+                        'file_path': file_paths[i],
+                        'text': text,
+                        'latency': latency
+                    }
+                    record_stage("extract_text.file", latency, file=os.path.basename(file_paths[i]))
+                    logger.info(f"Extracted {os.path.basename(file_paths[i])} in {latency:.2f}s")
+        finally:
+            if process_pool:
+                process_pool.shutdown()
+        
+        stats = cache.stats()
+        logger.info(f"Evidence text cache: {stats['hits']} hits, {stats['misses']} misses")
+        return results
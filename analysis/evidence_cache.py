@@ -0,0 +1,263 @@
+import os
+import json
+import stat
+import hashlib
+import tempfile
+import threading
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def user_cache_dir(*parts):
+    """Path under the current user's cache directory (LOCALAPPDATA on Windows, XDG_CACHE_HOME or ~/.cache elsewhere)."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, "report_generation", *parts)
+
+
+def ensure_private_dir(path):
+    """
+    Create a directory only the current user can access, or check an existing one.
+
+    An existing directory the user owns has its group and other permissions removed.
+
+    Raises:
+        PermissionError: The path is not a directory (e.g. a symlink) or belongs to another user
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"Cache directory {path} is not a directory")
+    if hasattr(os, 'getuid'):
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"Cache directory {path} is owned by another user")
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+# ------- Evidence Cache Module -------
+class EvidenceCache:
+    """Content-addressed on-disk cache for extracted evidence text and screenshots.
+
+    Entries are keyed by the SHA-256 of the file bytes plus the extractor name and
+    version, so re-uploading the same evidence file only costs a hash. The cache is
+    bounded in size and evicts the least recently used entries first.
+
+    Values may be None, booleans, numbers, strings, bytes, lists, tuples and dicts
+    with string keys; tuples come back as lists. An entry is a JSON header line
+    followed by the raw bytes values it refers to, so nothing read from the cache
+    directory is ever executed.
+    """
+
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+    HASH_BLOCK_SIZE = 1024 * 1024
+    ENTRY_SUFFIX = '.entry'
+    # Entries written by earlier versions; never read, only evicted
+    LEGACY_SUFFIX = '.pkl'
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, cache_dir=None, max_bytes=None, enabled=True):
+        """Initialize the cache in the given directory."""
+        self.cache_dir = cache_dir or user_cache_dir("evidence")
+        self.max_bytes = max_bytes if max_bytes is not None else self.DEFAULT_MAX_BYTES
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+        if self.enabled:
+            try:
+                ensure_private_dir(self.cache_dir)
+            except OSError as e:
+                logger.warning(f"Evidence cache unavailable, caching disabled: {str(e)}")
+                self.enabled = False
+
+    @classmethod
+    def default(cls):
+        """Return the process-wide cache configured from the environment."""
+        with cls._default_lock:
+            if cls._default is None:
+                max_mb = os.environ.get('EVIDENCE_CACHE_MAX_MB')
+                cls._default = cls(
+                    cache_dir=os.environ.get('EVIDENCE_CACHE_DIR'),
+                    max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+                    enabled=os.environ.get('EVIDENCE_CACHE_DISABLED', '').lower() not in ('1', 'true', 'yes')
+                )
+            return cls._default
+
+    @staticmethod
+    def hash_file(file_path):
+        """Compute the SHA-256 hex digest of a file's bytes."""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(EvidenceCache.HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def key_for_file(self, file_path, kind, version):
+        """Build the cache key for a file, an extractor kind and the extractor version."""
+        return f"{self.hash_file(file_path)}-{kind}-v{version}"
+
+    def _entry_path(self, key):
+        """Get the on-disk path for a cache key."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}{self.ENTRY_SUFFIX}")
+
+    @staticmethod
+    def _encode(value, blobs):
+        """Convert a value to JSON-compatible data, moving bytes into blobs."""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            blobs.append(bytes(value))
+            return {'$blob': len(blobs) - 1}
+        if isinstance(value, (list, tuple)):
+            return [EvidenceCache._encode(item, blobs) for item in value]
+        if isinstance(value, dict):
+            if not all(isinstance(k, str) for k in value):
+                raise TypeError("Cached dicts must have string keys")
+            return {k: EvidenceCache._encode(v, blobs) for k, v in value.items()}
+        raise TypeError(f"Cannot cache values of type {type(value).__name__}")
+
+    @staticmethod
+    def _decode(data, blobs):
+        """Rebuild a value from its JSON data and blobs."""
+        if isinstance(data, list):
+            return [EvidenceCache._decode(item, blobs) for item in data]
+        if isinstance(data, dict):
+            if data.keys() == {'$blob'}:
+                return blobs[data['$blob']]
+            return {k: EvidenceCache._decode(v, blobs) for k, v in data.items()}
+        return data
+
+    @staticmethod
+    def _read_entry(f):
+        """Read a value written by _write_entry."""
+        header = json.loads(f.readline())
+        blobs = []
+        for size in header['blobs']:
+            blob = f.read(size)
+            if len(blob) != size:
+                raise ValueError("truncated entry")
+            blobs.append(blob)
+        return EvidenceCache._decode(header['value'], blobs)
+
+    @staticmethod
+    def _write_entry(f, value):
+        """Write a value as a JSON header line followed by its bytes values."""
+        blobs = []
+        data = EvidenceCache._encode(value, blobs)
+        header = {'value': data, 'blobs': [len(blob) for blob in blobs]}
+        f.write(json.dumps(header, ensure_ascii=True).encode('ascii') + b'\n')
+        for blob in blobs:
+            f.write(blob)
+
+    def get(self, key):
+        """Return the cached value for a key, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = self._read_entry(f)
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path, None)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {key}: {str(e)}")
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a value in the cache, evicting old entries if the size limit is exceeded."""
+        if not self.enabled:
+            return
+
+        path = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    self._write_entry(f, value)
+                os.replace(tmp_path, path)
+            except BaseException:
+                self._remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"Could not write cache entry {key}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._size is not None:
+                self._size += os.path.getsize(path)
+        self._evict_if_needed()
+
+    def _entries(self):
+        """List all cache entries as (mtime, size, path) tuples."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith((self.ENTRY_SUFFIX, self.LEGACY_SUFFIX)):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict_if_needed(self):
+        """Evict least recently used entries until the cache fits its size limit."""
+        with self._lock:
+            if self._size is not None and self._size <= self.max_bytes:
+                return
+
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes:
+                        break
+                    self._remove(path)
+                    total -= size
+            self._size = total
+
+    @staticmethod
+    def _remove(path):
+        """Remove a cache entry, ignoring entries that are already gone."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            for _, _, path in self._entries():
+                self._remove(path)
+            self._size = 0
+
+    def stats(self):
+        """Return the hit and miss counters."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
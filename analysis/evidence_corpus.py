@@ -0,0 +1,91 @@
+import os
+import logging
+
+from .tokenizer import count_tokens
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# ------- Evidence Corpus Module -------
+class EvidenceSegment:
+    """Extracted text of one evidence file."""
+
+    __slots__ = ('name', 'text', 'model', '_token_count')
+
+    def __init__(self, name, text, model="gpt-4o"):
+        """Initialize the segment."""
+        self.name = name
+        self.text = text
+        self.model = model
+        self._token_count = None
+
+    @property
+    def header(self):
+        """Marker line that introduces this file's evidence in the prompt."""
+        return EvidenceCorpus.HEADER_TEMPLATE.format(name=self.name)
+
+    @property
+    def token_count(self):
+        """Number of tokens in the segment text, counted once."""
+        if self._token_count is None:
+            self._token_count = count_tokens(self.text, self.model)
+        return self._token_count
+
+
+class EvidenceCorpus:
+    """Per-file evidence segments that are rendered into one prompt string only when needed."""
+
+    HEADER_TEMPLATE = "\n\n--- EVIDENCE FROM {name} ---\n\n"
+
+    def __init__(self, model="gpt-4o"):
+        """Initialize an empty corpus."""
+        self.model = model
+        self.segments = []
+        self._rendered = None
+
+    @classmethod
+    def from_results(cls, results, model="gpt-4o"):
+        """
+        Build a corpus from DocumentProcessor extraction results.
+
+        Args:
+            results: Iterable of dictionaries with 'file_path' and 'text' keys
+            model: Model whose tokenizer is used for token counts
+        """
+        corpus = cls(model=model)
+        for result in results:
+            corpus.add(os.path.basename(result['file_path']), result['text'])
+        return corpus
+
+    def add(self, name, text):
+        """Add the extracted text of one evidence file."""
+        self.segments.append(EvidenceSegment(name, text or "", self.model))
+        self._rendered = None
+
+    @property
+    def token_count(self):
+        """Total tokens of the rendered corpus, without rendering it."""
+        return sum(
+            segment.token_count + count_tokens(segment.header, self.model)
+            for segment in self.segments
+        )
+
+    def parts(self):
+        """Yield the header and text of each segment, in prompt order."""
+        for segment in self.segments:
+            yield segment.header
+            yield segment.text
+
+    def render(self):
+        """Join all segments into the prompt text, once."""
+        if self._rendered is None:
+            self._rendered = "".join(self.parts())
+        return self._rendered
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __str__(self):
+        return self.render()
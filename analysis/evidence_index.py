@@ -0,0 +1,267 @@
+import os
+import bisect
+import logging
+from functools import lru_cache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Characters that separate keywords in file and process names
+KEYWORD_SEPARATORS = str.maketrans('._-', '   ')
+
+
+def keywords(text):
+    """Lower-cased keyword set of a file or process name ('Company_A.docx' -> {'company', 'a', 'docx'})."""
+    return set(text.lower().translate(KEYWORD_SEPARATORS).split()) if text else set()
+
+
+class _Haystack:
+    """Lower-cased names joined into one string, for C-speed substring search over all of them."""
+
+    __slots__ = ('text', 'starts')
+
+    def __init__(self, names):
+        self.text = '\n'.join(names)
+        self.starts = []
+        offset = 0
+        for name in names:
+            self.starts.append(offset)
+            offset += len(name) + 1
+
+    def positions(self, needle):
+        """Yield, in order, the positions of the names that contain needle."""
+        if not needle:
+            # Every name contains the empty string
+            yield from range(len(self.starts))
+            return
+        if '\n' in needle:
+            return
+        index = self.text.find(needle)
+        while index != -1:
+            position = bisect.bisect_right(self.starts, index) - 1
+            yield position
+            if position + 1 >= len(self.starts):
+                return
+            # Continue from the next name; one hit per name is enough
+            index = self.text.find(needle, self.starts[position + 1])
+
+
+# ------- Evidence Index Module -------
+class EvidenceIndex:
+    """
+    Lookup structures over one run's evidence file names, built once.
+
+    Every query returns files in evidence order and gives the same answer as
+    the per-row loops it replaces, which lower-cased and split every file
+    name for every table row.
+    """
+
+    def __init__(self, evidence_files):
+        """
+        Index evidence file names.
+
+        Args:
+            evidence_files: Evidence file names (or paths) in priority order
+        """
+        self.files = list(evidence_files)
+
+        lower_names = [file.lower() for file in self.files]
+        self.base_names = [os.path.basename(file).lower() for file in self.files]
+        self.keywords = [keywords(base_name) for base_name in self.base_names]
+        self._names = _Haystack(lower_names)
+        self._base_names = _Haystack(self.base_names)
+
+        # Keyword -> positions of files whose base name has it, ascending
+        self._postings = {}
+        for position, file_keywords in enumerate(self.keywords):
+            for keyword in file_keywords:
+                self._postings.setdefault(keyword, []).append(position)
+
+        # Exact stem before the first '.', as written -> positions
+        self._raw_stems = {}
+        for position, file in enumerate(self.files):
+            self._raw_stems.setdefault(file.split('.')[0], []).append(position)
+
+        # (first position, needle) lists with each needle once, for first-match scans
+        # that can stop at the first needle found
+        self._name_parts = self._needles(enumerate(name.split('.') for name in lower_names))
+        self._base_stems = self._needles((position, [base_name.split('.')[0]]) for position, base_name in enumerate(self.base_names))
+
+        # Lower-cased stem before the first '.' -> positions
+        self._name_stems = {}
+        for position, name in enumerate(lower_names):
+            self._name_stems.setdefault(name.split('.')[0], []).append(position)
+
+    @staticmethod
+    def _needles(position_needles):
+        first = {}
+        for position, needles in position_needles:
+            for needle in needles:
+                first.setdefault(needle, position)
+        return sorted((position, needle) for needle, position in first.items())
+
+    def __len__(self):
+        return len(self.files)
+
+    @staticmethod
+    def _first_contained(needles, text, stop=None):
+        """Position of the first needle contained in text, or None; positions >= stop are not checked."""
+        for position, needle in needles:
+            if stop is not None and position >= stop:
+                return None
+            if needle in text:
+                return position
+        return None
+
+    def match_cell(self, evidence_text, process_text=None):
+        """
+        Find the evidence file a process table row refers to.
+
+        A file matches if any '.'-separated part of its name appears in the
+        SIGHTED EVIDENCE text or, when process_text is given, if its base
+        name stem appears in the PROCESS text. The first matching file wins.
+
+        Args:
+            evidence_text: Text of the SIGHTED EVIDENCE cell
+            process_text: Text of the PROCESS cell, or None to match on evidence only
+
+        Returns:
+            Evidence file name, or None
+        """
+        best = self._first_contained(self._name_parts, evidence_text.lower())
+        if process_text is not None:
+            by_process = self._first_contained(self._base_stems, process_text.lower(), stop=best)
+            if by_process is not None:
+                best = by_process
+        return self.files[best] if best is not None else None
+
+    def _first_unused(self, positions, used, stop=None):
+        """First of the ascending positions whose file is not in used; positions >= stop are not checked."""
+        for position in positions:
+            if stop is not None and position >= stop:
+                return None
+            if self.files[position] not in used:
+                return position
+        return None
+
+    def _first_unused_of_any(self, position_lists, used):
+        """Smallest position, over all the ascending lists, whose file is not in used."""
+        best = None
+        for positions in position_lists:
+            position = self._first_unused(positions, used, stop=best)
+            if position is not None:
+                best = position
+        return best
+
+    def match_process(self, process_name, evidence_file, used):
+        """
+        Pick the evidence file for a report row, preferring files not used yet.
+
+        Tried in order: an unused file whose base name contains evidence_file;
+        an unused file sharing a keyword with the process or evidence name; an
+        unused file whose base name contains one of those keywords (longer than
+        two characters); any unused file. Once every file is used, the file
+        with the most keyword overlap is reused.
+
+        Args:
+            process_name: Text of the PROCESS field
+            evidence_file: Text of the SIGHTED EVIDENCE field
+            used: Set of files already placed; the chosen unused file is added to it
+
+        Returns:
+            Evidence file name, or None if there is no evidence
+        """
+        if not self.files:
+            return None
+
+        chosen = None
+        if evidence_file:
+            chosen = self._first_unused(self._base_names.positions(evidence_file.lower()), used)
+
+        if chosen is None:
+            process_keywords = keywords(process_name)
+            evidence_keywords = keywords(evidence_file)
+            query_keywords = process_keywords | evidence_keywords
+            chosen = self._first_unused_of_any((self._postings.get(keyword, ()) for keyword in query_keywords), used)
+
+        if chosen is None:
+            chosen = self._first_unused_of_any(
+                (self._base_names.positions(keyword) for keyword in query_keywords if len(keyword) > 2), used
+            )
+
+        if chosen is None:
+            chosen = self._first_unused(range(len(self.files)), used)
+
+        if chosen is not None:
+            used.add(self.files[chosen])
+            return self.files[chosen]
+
+        # Every file is used: reuse the most relevant one. Files outside these
+        # candidates score 0 and are never chosen.
+        candidates = set()
+        for keyword in query_keywords:
+            candidates.update(self._postings.get(keyword, ()))
+        if process_name:
+            candidates.update(self._base_names.positions(process_name.lower()))
+        if evidence_file:
+            candidates.update(self._base_names.positions(evidence_file.lower()))
+
+        best_score = 0
+        best_position = None
+        for position in sorted(candidates):
+            file_keywords = self.keywords[position]
+            score = len(process_keywords & file_keywords) + len(evidence_keywords & file_keywords)
+            if process_name and process_name.lower() in self.base_names[position]:
+                score += 10
+            if evidence_file and evidence_file.lower() in self.base_names[position]:
+                score += 10
+            if score > best_score:
+                best_score = score
+                best_position = position
+
+        return self.files[best_position] if best_position is not None else self.files[0]
+
+    def related_files(self, name):
+        """
+        Files whose name contains name, or whose stem is contained in name (case-insensitive).
+
+        Returns:
+            File names in evidence order
+        """
+        query = name.lower()
+        positions = set(self._names.positions(query))
+        for stem, stem_positions in self._name_stems.items():
+            if stem in query:
+                positions.update(stem_positions)
+        return [self.files[position] for position in sorted(positions)]
+
+    def files_with_stem(self, *stems):
+        """
+        Files whose name up to the first '.' equals one of stems exactly.
+
+        Returns:
+            File names in evidence order
+        """
+        positions = set()
+        for stem in stems:
+            positions.update(self._raw_stems.get(stem, ()))
+        return [self.files[position] for position in sorted(positions)]
+
+
+@lru_cache(maxsize=8)
+def _cached_index(evidence_files):
+    return EvidenceIndex(evidence_files)
+
+
+def get_evidence_index(evidence_files):
+    """
+    Return the index for a run's evidence files, building it on first use.
+
+    The preprocessor and the report generator of one run share the same index.
+
+    Args:
+        evidence_files: Evidence file names in priority order (a dict's keys are fine)
+    """
+    return _cached_index(tuple(evidence_files))
@@ -1,65 +1,38 @@
-import sys
-import streamlit as st
 import os
-import tempfile
-from datetime import datetime
-import pandas as pd
-import docx
-from docx import Document
-import comtypes.client
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
-import fitz  # PyMuPDF
 import io
-import win32gui
-import win32ui
-import win32con
-import win32com.client
-from dotenv import load_dotenv
-import pytesseract
-import mammoth
-import base64
-import win32com.client
-import pythoncom
-import time
-from PIL import Image
-import openai
-from PIL import Image, ImageDraw, ImageFont
-from docx import Document
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl import Workbook, load_workbook
-import re
-import openpyxl
-from openpyxl.drawing.image import Image as ExcelImage
-from docxcompose.composer import Composer
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-
-# from trial import _extract_from_excel as EXTRACT_FROM_EXCEL
-                
-
-from typing import List, Dict, Tuple, Union, Optional
+import copy
+from datetime import datetime
 import logging
 
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side, NamedStyle
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+# Register layout: the header is on row 5 and actions start on row 6
+HEADER_ROW = 5
+FIRST_DATA_ROW = 6
 
-load_dotenv(".env")
+# Action fields in register column order
+ACTION_FIELDS = [
+    "Date", "Source of Issue", "Type", "Details", "Root Cause",
+    "Person", "Corrective Actions Implemented", "Actual close out date"
+]
+COLUMN_WIDTHS = [12, 25, 20, 40, 25, 25, 40, 15]
 
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
+# Named styles shared by every action cell, registered once per workbook
+ENTRY_STYLE = "Register Entry"
+OPEN_ENTRY_STYLE = "Register Open Entry"
 
-# Set page configuration
-# st.set_page_config(
-#     page_title="AI Audit Report Generator",
-#     page_icon="📊",
-#     layout="wide",
-#     initial_sidebar_state="expanded"
-# )
+# REGISTER_STREAMING=1 makes streaming the default way registers are rewritten
+# (openpyxl's read-only reader and write-only writer). Streaming keeps memory
+# flat for very large registers but does not carry over column widths, merged
+# cells or other sheet settings (the standard register layout is applied instead).
+STREAMING_WRITES = os.environ.get('REGISTER_STREAMING', '0').lower() in ('1', 'true', 'yes')
 
 
 # Add Excel handling functions
@@ -73,20 +46,19 @@ class ExcelHandler:
         sheet = workbook.active
         sheet.title = "CORRECTIVE ACTIONS REGISTER"
         
-        # Define headers and their widths
+        # Define headers
         headers = [
             "Date", "Source of Issue", "Type", "Details", "Root Cause", 
             "Person(s) responsible for response", "Corrective Actions Implemented", "Actual close out date"
         ]
-        column_widths = [12, 25, 20, 40, 25, 25, 40, 15]
         
         # Create header row
         for col_idx, header in enumerate(headers, 1):
-            cell = sheet.cell(row=5, column=col_idx, value=header)
+            cell = sheet.cell(row=HEADER_ROW, column=col_idx, value=header)
             cell.font = Font(bold=True, color="FFFFFF")
             cell.fill = PatternFill(start_color="0070C0", end_color="0070C0", fill_type="solid")
             cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            sheet.column_dimensions[chr(64 + col_idx)].width = column_widths[col_idx - 1]
+            sheet.column_dimensions[chr(64 + col_idx)].width = COLUMN_WIDTHS[col_idx - 1]
         
         # Add title
         sheet.merge_cells('A1:H1')
@@ -112,8 +84,75 @@ class ExcelHandler:
         return workbook
     
     @staticmethod
-    def add_action_to_register(excel_file, action_data):
-        """Add a new corrective action to the register Excel file."""
+    def register_styles(workbook):
+        """
+        Register the named styles used for action rows, if the workbook lacks them.
+        
+        Every action cell refers to one of the two shared styles instead of
+        carrying its own fill, border and alignment.
+        
+        Returns:
+            Tuple of (entry style name, open entry style name)
+        """
+        if ENTRY_STYLE not in workbook.named_styles:
+            entry = NamedStyle(name=ENTRY_STYLE)
+            entry.border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                                  top=Side(style='thin'), bottom=Side(style='thin'))
+            entry.alignment = Alignment(wrap_text=True, vertical='top')
+            workbook.add_named_style(entry)
+        
+        if OPEN_ENTRY_STYLE not in workbook.named_styles:
+            # Yellow marks an action that is still open (no close out date)
+            open_entry = NamedStyle(name=OPEN_ENTRY_STYLE)
+            open_entry.border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                                       top=Side(style='thin'), bottom=Side(style='thin'))
+            open_entry.alignment = Alignment(wrap_text=True, vertical='top')
+            open_entry.fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+            workbook.add_named_style(open_entry)
+        
+        return ENTRY_STYLE, OPEN_ENTRY_STYLE
+    
+    @staticmethod
+    def _action_style(action_data):
+        return OPEN_ENTRY_STYLE if not action_data["Actual close out date"] else ENTRY_STYLE
+    
+    @staticmethod
+    def find_append_row(sheet):
+        """
+        Find the row after the last action in the register.
+        
+        Starts from the sheet's recorded dimensions and steps back over
+        trailing rows that have no value in the register columns (rows that
+        were only formatted), so it never scans the existing actions.
+        
+        Returns:
+            Row number for the next action
+        """
+        for row in range(sheet.max_row, HEADER_ROW, -1):
+            values = next(sheet.iter_rows(min_row=row, max_row=row, max_col=len(ACTION_FIELDS), values_only=True))
+            if any(value not in (None, '') for value in values):
+                return row + 1
+        return FIRST_DATA_ROW
+    
+    @staticmethod
+    def add_actions_to_register(excel_file, actions, streaming=None):
+        """
+        Add corrective actions to the register in one load and save cycle.
+        
+        Args:
+            excel_file: Existing register (path or file object), or None to start a new one
+            actions: Iterable of action dictionaries keyed by ACTION_FIELDS
+            streaming: Rewrite the register row by row through openpyxl's
+                read-only and write-only modes; defaults to STREAMING_WRITES
+        
+        Returns:
+            The updated workbook, ready for save_register_to_bytes
+        """
+        if streaming is None:
+            streaming = STREAMING_WRITES
+        if streaming and excel_file:
+            return ExcelHandler._stream_actions_to_register(excel_file, actions)
+        
         if excel_file:
             # Load existing file
             workbook = load_workbook(excel_file)
@@ -122,47 +161,101 @@ class ExcelHandler:
             workbook = ExcelHandler.create_new_register()
         
         sheet = workbook.active
+        ExcelHandler.register_styles(workbook)
         
-        # Find the last row with data
-        last_row = 5  # Start after header row
-        for row in range(6, sheet.max_row + 1):
-            if sheet.cell(row=row, column=1).value is not None:
-                last_row = row
-            else:
-                break
-        
-        # Add new row
-        new_row = last_row + 1
-        
-        # Add data to the new row
-        sheet.cell(row=new_row, column=1, value=action_data["Date"])
-        sheet.cell(row=new_row, column=2, value=action_data["Source of Issue"])
-        sheet.cell(row=new_row, column=3, value=action_data["Type"])
-        sheet.cell(row=new_row, column=4, value=action_data["Details"])
-        sheet.cell(row=new_row, column=5, value=action_data["Root Cause"])
-        sheet.cell(row=new_row, column=6, value=action_data["Person"])
-        sheet.cell(row=new_row, column=7, value=action_data["Corrective Actions Implemented"])
-        sheet.cell(row=new_row, column=8, value=action_data["Actual close out date"])
-        
-        # Apply styling
-        yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        
-        # Color the row yellow (open) if no close date
-        if not action_data["Actual close out date"]:
-            for col in range(1, 9):
-                sheet.cell(row=new_row, column=col).fill = yellow_fill
-        
-        # Apply borders and text wrapping
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
-                            top=Side(style='thin'), bottom=Side(style='thin'))
-        
-        for col in range(1, 9):
-            cell = sheet.cell(row=new_row, column=col)
-            cell.border = thin_border
-            cell.alignment = Alignment(wrap_text=True, vertical='top')
+        new_row = ExcelHandler.find_append_row(sheet)
+        added = 0
+        for action_data in actions:
+            style = ExcelHandler._action_style(action_data)
+            for col_idx, field in enumerate(ACTION_FIELDS, 1):
+                cell = sheet.cell(row=new_row, column=col_idx, value=action_data[field])
+                cell.style = style
+            new_row += 1
+            added += 1
         
+        logger.info(f"Added {added} actions to the corrective actions register")
         return workbook
     
+    @staticmethod
+    def _stream_actions_to_register(excel_file, actions):
+        """
+        Copy the register into a write-only workbook and append the actions.
+        
+        Existing rows are read and written one at a time with their values and
+        cell styles; trailing rows without values are dropped so the actions
+        follow the last existing one.
+        """
+        source = load_workbook(excel_file, read_only=True)
+        try:
+            source_sheet = source.active
+            
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet(source_sheet.title)
+            ExcelHandler.register_styles(workbook)
+            
+            # Column widths and merges must be set before any row is written
+            for col_idx, width in enumerate(COLUMN_WIDTHS, 1):
+                sheet.column_dimensions[chr(64 + col_idx)].width = width
+            sheet.merged_cells.add('A1:H1')
+            
+            # Source style -> the same style in the new workbook. Registers use a
+            # handful of styles, so each is translated once instead of per cell.
+            styles = {}
+            written = 0
+            blank_rows = []
+            for row in source_sheet.iter_rows():
+                cells = []
+                for source_cell in row:
+                    cell = WriteOnlyCell(sheet, value=source_cell.value)
+                    if getattr(source_cell, 'has_style', False):
+                        key = source_cell.style_array
+                        if key not in styles:
+                            cell.font = source_cell.font
+                            cell.fill = source_cell.fill
+                            cell.border = source_cell.border
+                            cell.alignment = source_cell.alignment
+                            cell.number_format = source_cell.number_format
+                            cell.protection = source_cell.protection
+                            styles[key] = copy.copy(cell._style)
+                        else:
+                            cell._style = copy.copy(styles[key])
+                    cells.append(cell)
+                
+                # Hold back rows without values until a later row shows they are not trailing
+                if all(cell.value in (None, '') for cell in cells):
+                    blank_rows.append(cells)
+                    continue
+                for blank_row in blank_rows:
+                    sheet.append(blank_row)
+                sheet.append(cells)
+                written += len(blank_rows) + 1
+                blank_rows = []
+            
+            # Fill out the header area if the register is shorter than that
+            for _ in range(written, HEADER_ROW):
+                sheet.append([])
+            
+            added = 0
+            for action_data in actions:
+                style = ExcelHandler._action_style(action_data)
+                cells = []
+                for field in ACTION_FIELDS:
+                    cell = WriteOnlyCell(sheet, value=action_data[field])
+                    cell.style = style
+                    cells.append(cell)
+                sheet.append(cells)
+                added += 1
+        finally:
+            source.close()
+        
+        logger.info(f"Streamed {added} actions into the corrective actions register")
+        return workbook
+    
+    @staticmethod
+    def add_action_to_register(excel_file, action_data):
+        """Add a new corrective action to the register Excel file."""
+        return ExcelHandler.add_actions_to_register(excel_file, [action_data])
+    
     @staticmethod
     def save_register_to_bytes(workbook):
         """Convert workbook to bytes for download."""
@@ -0,0 +1,145 @@
+import os
+import io
+import hashlib
+import threading
+import logging
+
+from PIL import Image
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Size evidence images are displayed at in the report table, in inches
+EMBED_WIDTH_INCHES = 2.0
+EMBED_HEIGHT_INCHES = 1.5
+
+# Resolution of embedded images; 150 DPI prints sharply at 2 inches wide
+EMBED_DPI = int(os.environ.get('EVIDENCE_IMAGE_DPI', 150))
+
+# JPEG quality (1-95) used when re-encoding embedded images
+JPEG_QUALITY = int(os.environ.get('EVIDENCE_IMAGE_QUALITY', 80))
+
+# "auto" keeps whichever of JPEG and PNG is smaller; "jpeg" or "png" forces one
+EMBED_FORMAT = os.environ.get('EVIDENCE_IMAGE_FORMAT', 'auto').lower()
+
+# Shorter side, in pixels, of rendered evidence pages. The pages are also read by
+# the vision model, which works on images of about 768 pixels on the short side.
+RENDER_SHORT_SIDE = int(os.environ.get('EVIDENCE_RENDER_SHORT_SIDE', 1024))
+
+# Upper bound on the render zoom, the fixed zoom used before
+MAX_RENDER_ZOOM = 2.0
+
+
+def render_zoom(page_width, page_height):
+    """
+    Choose the zoom for rasterising a PDF page from its size in points.
+
+    Args:
+        page_width: Page width in points (1/72 inch)
+        page_height: Page height in points
+
+    Returns:
+        Zoom factor that gives RENDER_SHORT_SIDE pixels on the shorter side
+    """
+    short_side = min(page_width, page_height)
+    if short_side <= 0:
+        return MAX_RENDER_ZOOM
+    return min(MAX_RENDER_ZOOM, RENDER_SHORT_SIDE / short_side)
+
+
+# ------- Image Budget Module -------
+class ImageBudget:
+    """Downscale, re-encode and deduplicate the images embedded in one report."""
+
+    def __init__(self, width_inches=EMBED_WIDTH_INCHES, height_inches=EMBED_HEIGHT_INCHES,
+                 dpi=None, quality=None, image_format=None):
+        """Initialize the budget for images displayed at width_inches x height_inches."""
+        self.width_inches = width_inches
+        self.height_inches = height_inches
+        self.dpi = dpi or EMBED_DPI
+        self.quality = quality or JPEG_QUALITY
+        self.image_format = (image_format or EMBED_FORMAT).lower()
+        self.images = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    @property
+    def target_size(self):
+        """Pixel size that fills the display box at the configured DPI."""
+        return int(self.width_inches * self.dpi), int(self.height_inches * self.dpi)
+
+    def _encode(self, data):
+        """Downscale and re-encode one image; returns (bytes, format)."""
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            target_width, target_height = self.target_size
+
+            # The picture is stretched to the display box, so each axis only needs
+            # as many pixels as the box has at the target DPI
+            size = (min(img.width, target_width), min(img.height, target_height))
+            if size != img.size:
+                img = img.resize(size, Image.LANCZOS)
+
+            has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            candidates = []
+            if self.image_format in ('auto', 'png') or has_alpha:
+                png_bytes = io.BytesIO()
+                img.save(png_bytes, format='PNG', optimize=True)
+                candidates.append((png_bytes.getvalue(), 'png'))
+            if self.image_format in ('auto', 'jpeg', 'jpg') and not has_alpha:
+                jpeg_bytes = io.BytesIO()
+                jpeg_img = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+                jpeg_img.save(jpeg_bytes, format='JPEG', quality=self.quality, optimize=True)
+                candidates.append((jpeg_bytes.getvalue(), 'jpeg'))
+
+        return min(candidates, key=lambda candidate: len(candidate[0]))
+
+    def prepare(self, data, image_format='png'):
+        """
+        Return the bytes and format to embed for an image.
+
+        Identical source images are encoded once, so every use of them embeds
+        the same bytes and the document stores a single copy.
+
+        Args:
+            data: Source image bytes
+            image_format: Format of the source image, returned if re-encoding fails
+
+        Returns:
+            Tuple of (image bytes, format)
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            self.images += 1
+            if digest in self._prepared:
+                return self._prepared[digest]
+
+        try:
+            prepared = self._encode(data)
+            if len(prepared[0]) >= len(data):
+                # Re-encoding did not help; keep the original
+                prepared = (data, image_format)
+        except Exception as e:
+            logger.warning(f"Could not re-encode image, embedding the original: {str(e)}")
+            prepared = (data, image_format)
+
+        with self._lock:
+            if digest not in self._prepared:
+                self._prepared[digest] = prepared
+                self.bytes_before += len(data)
+                self.bytes_after += len(prepared[0])
+            return self._prepared[digest]
+
+    def stats(self):
+        """Return image counts and the embedded bytes before and after re-encoding."""
+        with self._lock:
+            return {
+                'images': self.images,
+                'unique_images': len(self._prepared),
+                'bytes_before': self.bytes_before,
+                'bytes_after': self.bytes_after,
+            }
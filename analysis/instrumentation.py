@@ -0,0 +1,223 @@
+import sys
+import json
+import time
+import threading
+import functools
+import contextvars
+import logging
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+_current_metrics = contextvars.ContextVar('run_metrics', default=None)
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024)
+    except Exception:
+        return None
+
+
+# ------- Instrumentation Module -------
+class RunMetrics:
+    """Collect wall time, CPU time, peak RSS, token counts and API latency for one report run."""
+
+    def __init__(self, run_name=""):
+        """Initialize an empty set of metrics."""
+        self.run_name = run_name
+        self.started_at = time.time()
+        self.stages = []
+        self.api_calls = []
+        self.values = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current():
+        """Return the metrics collector active in this context, if any."""
+        return _current_metrics.get()
+
+    def activate(self):
+        """Make this collector current; returns a token for deactivate()."""
+        return _current_metrics.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        """Restore the collector that was current before activate()."""
+        _current_metrics.reset(token)
+
+    @contextmanager
+    def scope(self):
+        """Context manager that makes this collector current."""
+        token = self.activate()
+        try:
+            yield self
+        finally:
+            self.deactivate(token)
+
+    @contextmanager
+    def stage(self, name, file=None):
+        """Measure a stage (optionally for one file) and record it."""
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self.record_stage(
+                name,
+                wall=time.perf_counter() - wall_start,
+                cpu=time.process_time() - cpu_start,
+                file=file
+            )
+
+    def record_stage(self, name, wall, cpu=None, file=None):
+        """Record a stage measurement taken elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self.stages.append({
+                'stage': name,
+                'file': file,
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                'peak_rss_mb': _peak_rss_mb(),
+            })
+
+    def record_api_call(self, model, latency, prompt_tokens=None, completion_tokens=None, cached=False,
+                        retries=0, queued_seconds=0.0):
+        """Record one LLM API call; queued_seconds is time spent waiting for rate limits and retry backoff."""
+        with self._lock:
+            self.api_calls.append({
+                'model': model,
+                'latency_seconds': latency,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'cached': cached,
+                'retries': retries,
+                'queued_seconds': queued_seconds,
+            })
+
+    def record_value(self, name, value):
+        """Record a named measurement, such as image byte counts."""
+        with self._lock:
+            self.values[name] = value
+
+    def stage_summary(self):
+        """Aggregate the whole-stage measurements (per-file entries excluded) by stage name."""
+        summary = {}
+        with self._lock:
+            stages = list(self.stages)
+        for record in stages:
+            if record['file'] is not None:
+                continue
+            entry = summary.setdefault(record['stage'], {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': None
+            })
+            entry['calls'] += 1
+            entry['wall_seconds'] += record['wall_seconds']
+            entry['cpu_seconds'] += record['cpu_seconds'] or 0.0
+            if record['peak_rss_mb'] is not None:
+                entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0.0, record['peak_rss_mb'])
+        return summary
+
+    def file_timings(self):
+        """List the per-file measurements."""
+        with self._lock:
+            return [record for record in self.stages if record['file'] is not None]
+
+    def api_summary(self):
+        """Aggregate API calls: counts, tokens and latency."""
+        with self._lock:
+            calls = list(self.api_calls)
+        live_calls = [call for call in calls if not call['cached']]
+        latencies = sorted(call['latency_seconds'] for call in live_calls)
+        return {
+            'calls': len(calls),
+            'cached_calls': len(calls) - len(live_calls),
+            'prompt_tokens': sum(call['prompt_tokens'] or 0 for call in calls),
+            'completion_tokens': sum(call['completion_tokens'] or 0 for call in calls),
+            'total_latency_seconds': sum(latencies),
+            'max_latency_seconds': latencies[-1] if latencies else 0.0,
+            'median_latency_seconds': latencies[len(latencies) // 2] if latencies else 0.0,
+            'retries': sum(call.get('retries', 0) for call in calls),
+            'queued_seconds': sum(call.get('queued_seconds', 0.0) for call in calls),
+        }
+
+    def to_dict(self):
+        """Export all metrics as a JSON-serialisable dictionary."""
+        with self._lock:
+            stages = list(self.stages)
+            api_calls = list(self.api_calls)
+        return {
+            'run_name': self.run_name,
+            'started_at': self.started_at,
+            'peak_rss_mb': _peak_rss_mb(),
+            'stages': self.stage_summary(),
+            'files': [record for record in stages if record['file'] is not None],
+            'api': self.api_summary(),
+            'api_calls': api_calls,
+            'values': dict(self.values),
+        }
+
+    def to_json(self, indent=2):
+        """Export all metrics as JSON."""
+        return json.dumps(self.to_dict(), indent=indent)
+
+
+@contextmanager
+def track(name, file=None):
+    """Measure a block into the current metrics collector; does nothing if none is active."""
+    metrics = RunMetrics.current()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name, file=file):
+        yield
+
+
+def track_stage(name):
+    """Decorator that records each call of a function as a pipeline stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_stage(name, wall, cpu=None, file=None):
+    """Record a measurement taken elsewhere into the current metrics collector, if any."""
+    metrics = RunMetrics.current()
+    if metrics is not None:
+        metrics.record_stage(name, wall, cpu, file)
+
+
+def record_api_call(model, latency, prompt_tokens=None, completion_tokens=None, cached=False, retries=0, queued_seconds=0.0):
+    """Record an LLM API call into the current metrics collector, if any."""
+    metrics = RunMetrics.current()
+    if metrics is not None:
+        metrics.record_api_call(model, latency, prompt_tokens, completion_tokens, cached, retries, queued_seconds)
+
+
+def record_value(name, value):
+    """Record a named measurement into the current metrics collector, if any."""
+    metrics = RunMetrics.current()
+    if metrics is not None:
+        metrics.record_value(name, value)
+
+
+def submit_with_context(executor, func, *args, **kwargs):
+    """Submit work to a thread pool so it records into the caller's metrics collector."""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
@@ -0,0 +1,431 @@
+import os
+import json
+import base64
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import threading
+import logging
+
+from .evidence_cache import user_cache_dir, ensure_private_dir
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Directory holding the job database and each queued job's input files. Workers on
+# other machines can serve the same queue by pointing this at a shared directory.
+# It holds uploaded evidence and finished reports, so it is only accessible to
+# the user running the app and its workers.
+JOB_DIR = os.environ.get('REPORT_JOB_DIR') or user_cache_dir("jobs")
+
+# Report generation workers started inside the Streamlit server process; set to 0
+# when reports are generated by separate `python -m analysis worker` processes
+LOCAL_WORKERS = int(os.environ.get('REPORT_JOB_LOCAL_WORKERS', 1))
+
+# Seconds between a running job's heartbeats, and without one before the job is
+# considered abandoned (its worker died) and handed to another worker
+HEARTBEAT_INTERVAL = float(os.environ.get('REPORT_JOB_HEARTBEAT_INTERVAL', 10))
+STALE_AFTER = float(os.environ.get('REPORT_JOB_STALE_AFTER', 120))
+
+# A job abandoned this many times is failed instead of being run again
+MAX_ATTEMPTS = int(os.environ.get('REPORT_JOB_MAX_ATTEMPTS', 2))
+
+# Hours finished jobs and their reports are kept
+RESULT_TTL_HOURS = float(os.environ.get('REPORT_JOB_RESULT_TTL_HOURS', 24))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Job columns returned by JobQueue.get(); the report and previews are loaded by result()
+_JOB_COLUMNS = ("id", "status", "provider", "model", "auditor_name", "progress", "message", "error",
+                "attempts", "worker", "created", "started", "finished", "preview")
+
+
+# ------- Job Queue Module -------
+class JobQueue:
+    """
+    SQLite-backed queue of report generation jobs.
+
+    The Streamlit app submits an evidence set and a template and polls the job;
+    workers claim queued jobs, report progress and store the finished report.
+    Input files live in a directory per job next to the database, and the
+    generated report's bytes are stored in the database.
+    """
+
+    def __init__(self, job_dir=None):
+        """Initialize the queue database."""
+        self.job_dir = job_dir or JOB_DIR
+        self.db_path = os.path.join(self.job_dir, "jobs.sqlite3")
+
+        ensure_private_dir(self.job_dir)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, provider TEXT NOT NULL, model TEXT NOT NULL, "
+                "auditor_name TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, error TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, created REAL NOT NULL, started REAL, "
+                "heartbeat REAL, finished REAL, report BLOB, report_content TEXT, previews TEXT, metrics TEXT, "
+                "preview TEXT)"
+            )
+            # Queues created before report previews were streamed lack the column
+            if "preview" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN preview TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+
+    def _connect(self):
+        """Open a connection; one per operation keeps the queue safe across threads and processes."""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def input_dir(self, job_id):
+        """Directory holding a job's uploaded files."""
+        return os.path.join(self.job_dir, job_id)
+
+    def submit(self, evidence_files, template_file, provider="openai", model="gpt-4o", auditor_name=""):
+        """
+        Queue a report for an evidence set.
+
+        Args:
+            evidence_files: Iterable of (file name, bytes) pairs
+            template_file: (file name, bytes) of the Word report template
+            provider: AI provider
+            model: Model name
+            auditor_name: Auditor name written into the report
+
+        Returns:
+            The job id
+        """
+        job_id = uuid.uuid4().hex
+        job_input_dir = self.input_dir(job_id)
+        for sub_dir, files in (("evidence", evidence_files), ("template", [template_file])):
+            os.makedirs(os.path.join(job_input_dir, sub_dir), exist_ok=True)
+            for name, data in files:
+                with open(os.path.join(job_input_dir, sub_dir, os.path.basename(name)), "wb") as f:
+                    f.write(data)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, provider, model, auditor_name, message, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, provider, model, auditor_name, "Waiting for a worker...", time.time())
+            )
+        self.purge_expired()
+        logger.info(f"Queued report job {job_id}")
+        return job_id
+
+    def input_files(self, job_id):
+        """
+        Return a job's input files.
+
+        Returns:
+            Tuple of (evidence paths in name order, template path)
+        """
+        job_input_dir = self.input_dir(job_id)
+        evidence_dir = os.path.join(job_input_dir, "evidence")
+        template_dir = os.path.join(job_input_dir, "template")
+        evidence_paths = [os.path.join(evidence_dir, name) for name in sorted(os.listdir(evidence_dir))]
+        template_path = os.path.join(template_dir, os.listdir(template_dir)[0])
+        return evidence_paths, template_path
+
+    def claim(self, worker_id):
+        """
+        Take the oldest queued job for a worker.
+
+        Jobs whose worker stopped sending heartbeats are queued again first, or
+        failed once they have been abandoned MAX_ATTEMPTS times.
+
+        Returns:
+            The claimed job (as returned by get()), or None if the queue is empty
+        """
+        now = time.time()
+        with self._connect() as conn:
+            # Take the write lock up front so two workers cannot claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            abandoned = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                (RUNNING, now - STALE_AFTER, MAX_ATTEMPTS)
+            )]
+            for job_id in abandoned:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, message = ?, error = ?, finished = ? WHERE id = ?",
+                    (FAILED, "Error: the worker running this job stopped responding",
+                     "The worker running this job stopped responding", now, job_id)
+                )
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ? WHERE status = ? AND heartbeat < ?",
+                (QUEUED, "Waiting for a worker...", RUNNING, now - STALE_AFTER)
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started = ?, heartbeat = ?, "
+                    "progress = 0, message = ?, preview = NULL WHERE id = ?",
+                    (RUNNING, worker_id, now, now, "Starting...", row[0])
+                )
+
+        for job_id in abandoned:
+            shutil.rmtree(self.input_dir(job_id), ignore_errors=True)
+        return self.get(row[0]) if row is not None else None
+
+    def heartbeat(self, job_id, worker_id, progress=None, message=None, preview=None):
+        """
+        Mark a running job as alive, optionally updating its progress (0-1), status
+        message and the markdown preview of the report written so far.
+
+        Only the worker that holds the job can update it; a worker whose job was
+        handed to another worker after it stopped sending heartbeats cannot.
+
+        Returns:
+            True if worker_id still holds the job
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat = ?, progress = COALESCE(?, progress), message = COALESCE(?, message), "
+                "preview = COALESCE(?, preview) WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), progress, message, preview, job_id, worker_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, report_bytes, report_content, previews, metrics):
+        """
+        Store a finished job's report and release its input files.
+
+        Nothing is stored if worker_id no longer holds the job: another worker
+        has taken it over and is still using its input files.
+
+        Args:
+            worker_id: Worker that ran the job
+            report_bytes: The generated report (.docx bytes)
+            report_content: Preprocessed AI response shown for review
+            previews: List of (caption, image bytes) evidence screenshots
+            metrics: RunMetrics.to_dict() of the run
+
+        Returns:
+            True if the result was stored
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, progress = 1, message = ?, finished = ?, report = ?, "
+                "report_content = ?, previews = ?, metrics = ? WHERE id = ? AND worker = ? AND status = ?",
+                (DONE, "Report generated successfully!", time.time(), report_bytes, report_content,
+                 self._encode_previews(previews), json.dumps(metrics),
+                 job_id, worker_id, RUNNING)
+            )
+        return self._release(job_id, worker_id, cursor.rowcount == 1)
+
+    def fail(self, job_id, worker_id, error, metrics=None):
+        """
+        Mark a job as failed and release its input files.
+
+        Returns:
+            True if worker_id still held the job and it was marked failed
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, error = ?, finished = ?, metrics = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (FAILED, f"Error: {error}", error, time.time(), json.dumps(metrics) if metrics else None,
+                 job_id, worker_id, RUNNING)
+            )
+        return self._release(job_id, worker_id, cursor.rowcount == 1)
+
+    def _release(self, job_id, worker_id, owned):
+        """Delete a finished job's input files, unless the job has moved to another worker."""
+        if owned:
+            shutil.rmtree(self.input_dir(job_id), ignore_errors=True)
+        else:
+            logger.warning(f"Worker {worker_id} no longer holds job {job_id}; its outcome was discarded")
+        return owned
+
+    def get(self, job_id):
+        """Return a job's state as a dictionary, or None if it does not exist."""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(_JOB_COLUMNS, row)) if row else None
+
+    def position(self, job_id):
+        """Number of queued jobs ahead of a queued job."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created < (SELECT created FROM jobs WHERE id = ?)",
+                (QUEUED, job_id)
+            ).fetchone()
+        return row[0]
+
+    def result(self, job_id):
+        """
+        Return a finished job's outputs.
+
+        Returns:
+            Dictionary with 'report_bytes', 'report_content', 'previews' and 'metrics'
+            keys, or None if the job has no report
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT report, report_content, previews, metrics FROM jobs WHERE id = ? AND status = ?",
+                (job_id, DONE)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'report_bytes': row[0],
+            'report_content': row[1],
+            'previews': self._decode_previews(row[2]),
+            'metrics': json.loads(row[3]) if row[3] else {},
+        }
+
+    @staticmethod
+    def _encode_previews(previews):
+        """Previews as JSON; the queue database may be shared, so it never holds pickles."""
+        return json.dumps([
+            {'caption': caption, 'data': base64.b64encode(data).decode('ascii')} for caption, data in previews
+        ])
+
+    @staticmethod
+    def _decode_previews(value):
+        """List of (caption, image bytes) from _encode_previews() output."""
+        if not value:
+            return []
+        try:
+            return [(preview['caption'], base64.b64decode(preview['data'])) for preview in json.loads(value)]
+        except (ValueError, TypeError, KeyError):
+            # Rows written by older versions hold pickles, which are not loaded
+            logger.warning("Ignoring evidence previews stored in an unsupported format")
+            return []
+
+    def purge_expired(self):
+        """Delete finished jobs older than RESULT_TTL_HOURS."""
+        cutoff = time.time() - RESULT_TTL_HOURS * 3600
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?", (DONE, FAILED, cutoff))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not purge expired jobs: {str(e)}")
+
+
+# ------- Job Worker Module -------
+class JobWorker:
+    """Claim report jobs from a JobQueue and run the pipeline for each."""
+
+    def __init__(self, job_queue, worker_id=None, poll_interval=1.0):
+        """Initialize the worker."""
+        self.job_queue = job_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.completed = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the worker to exit after its current job."""
+        self._stop.set()
+
+    def run(self, once=False):
+        """
+        Process jobs until stopped.
+
+        Args:
+            once: Return as soon as the queue is empty instead of waiting for more jobs
+        """
+        logger.info(f"Report worker {self.worker_id} started")
+        while not self._stop.is_set():
+            try:
+                job = self.job_queue.claim(self.worker_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                if once:
+                    break
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process(job)
+        logger.info(f"Report worker {self.worker_id} stopped after {self.completed} jobs")
+
+    def process(self, job):
+        """Generate the report for a claimed job and store the outcome."""
+        from .pipeline import ReportPipeline
+
+        job_id = job['id']
+        logger.info(f"Worker {self.worker_id} generating report for job {job_id}")
+        pipeline = ReportPipeline(provider=job['provider'], model=job['model'], auditor_name=job['auditor_name'])
+
+        # Keep the job alive during long stages that do not report progress
+        finished = threading.Event()
+        def send_heartbeats():
+            while not finished.wait(HEARTBEAT_INTERVAL):
+                try:
+                    self.job_queue.heartbeat(job_id, self.worker_id)
+                except sqlite3.Error as e:
+                    logger.warning(f"Heartbeat for job {job_id} failed: {str(e)}")
+        heartbeat_thread = threading.Thread(target=send_heartbeats, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            evidence_paths, template_path = self.job_queue.input_files(job_id)
+            # Named per attempt so a stalled earlier attempt cannot overwrite this one's report
+            output_path = os.path.join(self.job_queue.input_dir(job_id), f"Completed_Audit_Report_{uuid.uuid4().hex[:8]}.docx")
+            result = pipeline.run(
+                evidence_paths,
+                template_path,
+                output_path=output_path,
+                on_progress=lambda progress, message: self.job_queue.heartbeat(job_id, self.worker_id, progress, message),
+                on_preview=lambda preview: self.job_queue.heartbeat(job_id, self.worker_id, preview=preview)
+            )
+
+            if result['report_doc']:
+                with open(output_path, "rb") as f:
+                    report_bytes = f.read()
+                previews = [(img['source'], img['data'])
+                            for images in result['evidence_images'].values() for img in images]
+                self.job_queue.complete(job_id, self.worker_id, report_bytes, result['report_content'], previews, result['metrics'])
+            else:
+                self.job_queue.fail(job_id, self.worker_id, "Error generating report document.", result['metrics'])
+        except Exception as e:
+            logger.error(f"Error generating report for job {job_id}: {str(e)}")
+            self.job_queue.fail(job_id, self.worker_id, str(e), pipeline.metrics.to_dict())
+        finally:
+            finished.set()
+            heartbeat_thread.join()
+            self.completed += 1
+
+
+_queue = None
+_local_workers = []
+_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue in JOB_DIR."""
+    global _queue
+    with _lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def start_local_workers(count=None):
+    """
+    Start report workers as threads in this process, once per process.
+
+    The Streamlit server keeps them across script reruns and browser sessions,
+    so a report keeps generating when the page is refreshed.
+    """
+    count = LOCAL_WORKERS if count is None else count
+    job_queue = get_job_queue()
+    with _lock:
+        while len(_local_workers) < count:
+            worker = JobWorker(job_queue)
+            thread = threading.Thread(target=worker.run, name=f"report-worker-{len(_local_workers)}", daemon=True)
+            thread.start()
+            _local_workers.append(worker)
+    return list(_local_workers)
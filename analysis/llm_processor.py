@@ -1,34 +1,18 @@
-import streamlit as st
 import os
-from datetime import datetime
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
-from dotenv import load_dotenv
-import openai
-from docx import Document
-from openpyxl import  load_workbook
 import re
-from reportlab.lib.pagesizes import letter
 import logging
-from .prompts import get_prompt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .prompts import get_template, render_prompt
+from .openai_client import chat_completion
+from .tokenizer import count_tokens, split_to_token_budget
+from .evidence_corpus import EvidenceCorpus
+from .instrumentation import track_stage, submit_with_context
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-
-load_dotenv(".env")
-
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
-
-# Set page configuration
-# st.set_page_config(
-#     page_title="AI Audit Report Generator",
-#     page_icon="📊",
-#     layout="wide",
-#     initial_sidebar_state="expanded"
-# )
-
 # ------- LLM Integration Module -------
 class LLMProcessor:
     """Process extracted text using Language Models with optimized context handling."""
@@ -50,87 +34,123 @@ class LLMProcessor:
         "gpt-4o-mini": 4096,
     }
     
+    # System message sent with every request
+    SYSTEM_PROMPT = "You are an expert ISO auditor assistant specializing in creating detailed audit reports from evidence analysis."
+    
+    # Tokens the chat format adds around the system and user messages
+    MESSAGE_OVERHEAD_TOKENS = 12
+    
+    # Maximum number of evidence chunks summarised at the same time
+    MAX_CONCURRENT_REQUESTS = int(os.environ.get('OPENAI_MAX_CONCURRENCY', 4))
+    
     @staticmethod
     def create_audit_prompt(evidence_text, template_structure, auditor_name):
-        """Create a highly structured prompt for the LLM to generate a professional audit report."""
-        current_date = datetime.now().strftime('%d/%m/%Y')
-
-        prompt = get_prompt(evidence_text=evidence_text, template_structure=template_structure, auditor_name=auditor_name, use_prompt=2) 
-        return prompt
+        """Create a highly structured prompt for the LLM to generate a professional audit report.
+        evidence_text may be an EvidenceCorpus, which is written into the prompt without being rendered first."""
+        return render_prompt("audit_report", evidence_text=evidence_text, template_structure=template_structure, auditor_name=auditor_name)
         
     @staticmethod
-    def estimate_token_count(text):
-        """Estimate the number of tokens in a text string.
-        Uses a rough approximation of 4 characters per token."""
-        return len(text) // 4
+    def estimate_token_count(text, model="gpt-4o"):
+        """Count the number of tokens in a text string with the model's BPE tokenizer.
+        Falls back to 4 characters per token if the tokenizer is unavailable."""
+        return count_tokens(text, model)
     
     @staticmethod
     def get_available_tokens(model):
         """Get the maximum available tokens for input based on model."""
         max_tokens = LLMProcessor.MODEL_MAX_TOKENS.get(model, 4096)
         reserved_tokens = LLMProcessor.RESERVED_OUTPUT_TOKENS.get(model, 2048)
-        return max_tokens - reserved_tokens
+        # The system message and chat formatting are sent with every prompt
+        overhead_tokens = LLMProcessor.estimate_token_count(LLMProcessor.SYSTEM_PROMPT, model) + LLMProcessor.MESSAGE_OVERHEAD_TOKENS
+        return max_tokens - reserved_tokens - overhead_tokens
     
     @staticmethod
-    def chunk_evidence(evidence_text, max_tokens, chunk_size=4000):
-        """Chunk the evidence text into smaller pieces that fit within token limits.
-        Returns a list of evidence chunks."""
-        # Split by evidence file markers
-        file_pattern = r"--- EVIDENCE FROM (.*?) ---\n\n"
-        evidence_parts = re.split(file_pattern, evidence_text)
+    def chunk_evidence(evidence_text, max_tokens, chunk_size=4000, model="gpt-4o"):
+        """Chunk the evidence into smaller pieces that fit within token limits.
+        Accepts an EvidenceCorpus or rendered evidence text. Returns a list of evidence chunks."""
+        if isinstance(evidence_text, EvidenceCorpus):
+            # Use the per-file segments directly instead of re-splitting the rendered text,
+            # with the token counts they already hold for this model
+            evidence_files = [
+                (segment.name, segment.text, segment.token_count if segment.model == model else None)
+                for segment in evidence_text.segments
+            ]
+        else:
+            # Split by evidence file markers
+            file_pattern = r"--- EVIDENCE FROM (.*?) ---\n\n"
+            evidence_parts = re.split(file_pattern, evidence_text)
+            
+            # Pair filenames with content
+            evidence_files = []
+            for i in range(1, len(evidence_parts), 2):
+                if i < len(evidence_parts) - 1:
+                    filename = evidence_parts[i]
+                    content = evidence_parts[i+1]
+                    evidence_files.append((filename, content, None))
+        
+        def tokens(text):
+            return LLMProcessor.estimate_token_count(text, model)
         
-        # Pair filenames with content
-        evidence_files = []
-        for i in range(1, len(evidence_parts), 2):
-            if i < len(evidence_parts) - 1:
-                filename = evidence_parts[i]
-                content = evidence_parts[i+1]
-                evidence_files.append((filename, content))
+        # Chunk parts are joined with a blank line, which costs tokens too
+        separator_tokens = tokens("\n\n")
         
         # Create balanced chunks
         chunks = []
         current_chunk = []
         current_token_count = 0
         
-        for filename, content in evidence_files:
+        for filename, content, content_tokens in evidence_files:
             file_header = f"--- EVIDENCE FROM {filename} ---\n\n"
-            file_tokens = LLMProcessor.estimate_token_count(content) + LLMProcessor.estimate_token_count(file_header)
+            header_tokens = tokens(file_header)
+            if content_tokens is None:
+                content_tokens = tokens(content)
+            file_tokens = content_tokens + header_tokens
             
             # If file is larger than chunk_size, split it further
             if file_tokens > chunk_size:
                 # Add file header to current chunk
-                if current_token_count + LLMProcessor.estimate_token_count(file_header) <= max_tokens:
+                if current_token_count + header_tokens + separator_tokens <= max_tokens:
                     current_chunk.append(file_header.rstrip())
-                    current_token_count += LLMProcessor.estimate_token_count(file_header)
+                    current_token_count += header_tokens + separator_tokens
                 else:
                     # Start a new chunk
                     if current_chunk:
                         chunks.append("\n\n".join(current_chunk))
                     current_chunk = [file_header.rstrip()]
-                    current_token_count = LLMProcessor.estimate_token_count(file_header)
+                    current_token_count = header_tokens
                 
-                # Split content into paragraphs
-                paragraphs = content.split('\n\n')
-                for para in paragraphs:
-                    para_tokens = LLMProcessor.estimate_token_count(para)
-                    
-                    if current_token_count + para_tokens <= max_tokens:
+                # Split content into paragraphs, and paragraphs too large for any chunk into token windows
+                # Each paragraph is counted once and its count kept next to it
+                continuation = f"(Continued from {filename})\n"
+                continuation_tokens = tokens(continuation)
+                window_size = max(1, max_tokens - continuation_tokens - separator_tokens)
+                paragraphs = []
+                for para in content.split('\n\n'):
+                    para_tokens = tokens(para)
+                    if para_tokens > window_size:
+                        paragraphs.extend((piece, tokens(piece)) for piece in split_to_token_budget(para, window_size, model))
+                    else:
+                        paragraphs.append((para, para_tokens))
+                
+                for para, para_tokens in paragraphs:
+                    if current_token_count + para_tokens + separator_tokens <= max_tokens:
                         current_chunk.append(para)
-                        current_token_count += para_tokens
+                        current_token_count += para_tokens + separator_tokens
                     else:
                         # Add current chunk to chunks and start a new one
                         chunks.append("\n\n".join(current_chunk))
-                        current_chunk = [f"(Continued from {filename})\n{para}"]
-                        current_token_count = LLMProcessor.estimate_token_count(current_chunk[0])
+                        current_chunk = [f"{continuation}{para}"]
+                        current_token_count = continuation_tokens + para_tokens
             else:
                 # Add entire file as one unit if it fits in the current chunk
                 file_content = f"{file_header}{content}"
-                if current_token_count + file_tokens <= max_tokens:
+                if current_token_count + file_tokens + separator_tokens <= max_tokens:
                     current_chunk.append(file_content.rstrip())
-                    current_token_count += file_tokens
+                    current_token_count += file_tokens + separator_tokens
                 else:
                     # Add current chunk to chunks and start a new one with this file
-                    chunks.append("\n\n".join(current_chunk))
+                    if current_chunk:
+                        chunks.append("\n\n".join(current_chunk))
                     current_chunk = [file_content.rstrip()]
                     current_token_count = file_tokens
         
@@ -142,138 +162,182 @@ class LLMProcessor:
     
     @staticmethod
     def create_summary_prompt(evidence_chunks, template_structure, *args, **kwargs):
-        """Create a prompt to summarize evidence chunks for the final report."""
-        current_date = datetime.now().strftime('%d/%m/%Y')
-        chunk_summaries = []
-        
-        for i, chunk in enumerate(evidence_chunks):
-            chunk_summaries.append(f"EVIDENCE CHUNK {i+1}:\n{chunk}")
-        
-        prompt = get_prompt(chunk_summaries=chunk_summaries, template_structure=template_structure, use_prompt=3)
-        return prompt
+        """Create a prompt to summarize evidence chunks for the final report; the prompt embeds the first chunk."""
+        chunk_summary = f"EVIDENCE CHUNK 1:\n{evidence_chunks[0]}" if evidence_chunks else ""
+        return render_prompt("evidence_chunk_summary", chunk_summary=chunk_summary, template_structure=template_structure)
     
     @staticmethod
     def create_final_report_prompt(evidence_summaries, template_structure, auditor_name):
-        """Create a prompt to generate the final report based on evidence summaries."""        
-        prompt = get_prompt(evidence_summaries=evidence_summaries, template_structure=template_structure, auditor_name=auditor_name, use_prompt=4)
-        
-        return prompt
+        """Create a prompt to generate the final report based on evidence summaries."""
+        return render_prompt("final_report", evidence_summaries=evidence_summaries, template_structure=template_structure, auditor_name=auditor_name)
 
     @staticmethod
-    def analyze_with_openai(prompt, model="gpt-4o"):
-        """Send prompt to OpenAI API and get response."""
-        try:
-            openai.api_key = LLMProcessor.OPENAI_API_KEY
+    def create_chunk_summary_prompt(chunk, chunk_index, template_structure, auditor_name):
+        """Create the summary prompt for one evidence chunk."""
+        if chunk_index == 0:
+            return LLMProcessor.create_summary_prompt([chunk], template_structure, auditor_name)
+        
+        return render_prompt("evidence_chunk_continuation", chunk_number=chunk_index + 1, chunk=chunk)
+    
+    @staticmethod
+    def summarize_chunks(evidence_chunks, template_structure, auditor_name, model="gpt-4o", max_concurrency=None, on_progress=None):
+        """
+        Summarise evidence chunks concurrently.
+        
+        Args:
+            evidence_chunks: List of evidence chunk strings
+            template_structure: Formatted template structure for the prompt
+            auditor_name: Name of the auditor
+            model: OpenAI model to use
+            max_concurrency: Maximum number of requests in flight (defaults to MAX_CONCURRENT_REQUESTS)
+            on_progress: Optional callback called with (completed, total) as each chunk finishes
             
-            response = openai.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are an expert ISO auditor assistant specializing in creating detailed audit reports from evidence analysis."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=4096,
-                temperature=0.2  # Lower temperature for more factual responses
-            )
+        Returns:
+            List of chunk summaries in the same order as the chunks
+        """
+        max_concurrency = max(1, max_concurrency or LLMProcessor.MAX_CONCURRENT_REQUESTS)
+        summaries = [None] * len(evidence_chunks)
+        
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, max(1, len(evidence_chunks)))) as executor:
+            futures = {
+                submit_with_context(
+                    executor,
+                    LLMProcessor.analyze_with_openai,
+                    LLMProcessor.create_chunk_summary_prompt(chunk, i, template_structure, auditor_name),
+                    model
+                ): i
+                for i, chunk in enumerate(evidence_chunks)
+            }
             
-            return response.choices[0].message.content
-        except Exception as e:
-            st.error(f"Error with OpenAI API: {e}")
-            return f"Error: {str(e)}"
+            # Progress is reported from this thread so Streamlit widgets can be updated safely
+            try:
+                for completed, future in enumerate(as_completed(futures), start=1):
+                    i = futures[future]
+                    summaries[i] = f"ANALYSIS OF EVIDENCE CHUNK {i+1}:\n{future.result()}"
+                    if on_progress:
+                        on_progress(completed, len(evidence_chunks))
+            except Exception:
+                # The report cannot be completed: do not spend quota on chunks that have not started
+                for future in futures:
+                    future.cancel()
+                raise
+        
+        return summaries
+    
+    @staticmethod
+    def analyze_with_openai(prompt, model="gpt-4o", on_delta=None):
+        """
+        Send prompt to OpenAI API and get response.
+        
+        Args:
+            prompt: User prompt
+            model: OpenAI model to use
+            on_delta: Optional callback given the response text piece by piece as it streams in
+        
+        Raises:
+            LLMError: The request failed after the scheduler's retries
+        """
+        return chat_completion(
+            model=model,
+            messages=[
+                {"role": "system", "content": LLMProcessor.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=4096,
+            temperature=0.2,  # Lower temperature for more factual responses
+            on_delta=on_delta
+        )
     
     
     @staticmethod
-    def process_batch_with_openai(evidence_text, template_structure, auditor_name, model="gpt-4o"):
-        """Process evidence in batches for OpenAI due to context limitations."""
-        try:
-            # Calculate available tokens for input
-            available_tokens = LLMProcessor.get_available_tokens(model)
+    def process_batch_with_openai(evidence_text, template_structure, auditor_name, model="gpt-4o", max_concurrency=None,
+                                  on_delta=None, on_progress=None):
+        """Process evidence in batches for OpenAI due to context limitations.
+        evidence_text may be an EvidenceCorpus, which is only written into a prompt if it fits in one batch.
+        Only the report itself is streamed to on_delta, not the chunk summaries.
+        on_progress, if given, is called with (message, fraction of this step done) while batches are processed."""
+        def progress(message, fraction):
+            if on_progress is not None:
+                on_progress(message, fraction)
+        
+        # Calculate available tokens for input
+        available_tokens = LLMProcessor.get_available_tokens(model)
+        
+        # Calculate tokens for template and other parts of the prompt
+        base_prompt_tokens = get_template("audit_report").token_count(
+            model, template_structure=template_structure, auditor_name=auditor_name
+        )
+        
+        # Calculate tokens available for evidence
+        evidence_tokens_available = available_tokens - base_prompt_tokens
+        
+        # If evidence is too large, process in batches
+        if isinstance(evidence_text, EvidenceCorpus):
+            evidence_tokens = evidence_text.token_count
+        else:
+            evidence_tokens = LLMProcessor.estimate_token_count(evidence_text, model)
+        
+        if evidence_tokens <= evidence_tokens_available:
+            # Evidence fits in one batch
+            full_prompt = LLMProcessor.create_audit_prompt(evidence_text, template_structure, auditor_name)
+            return LLMProcessor.analyze_with_openai(full_prompt, model, on_delta=on_delta)
+        else:
+            # Need to process in batches
+            logger.info("Evidence is large - processing in batches for optimal analysis.")
             
-            # Calculate tokens for template and other parts of the prompt
-            template_tokens = LLMProcessor.estimate_token_count(template_structure)
-            base_prompt_tokens = LLMProcessor.estimate_token_count(
-                LLMProcessor.create_audit_prompt("", template_structure, auditor_name)
+            # Chunk the evidence
+            evidence_chunks = LLMProcessor.chunk_evidence(
+                evidence_text, 
+                max_tokens=evidence_tokens_available, 
+                chunk_size=evidence_tokens_available//2,
+                model=model
             )
             
-            # Calculate tokens available for evidence
-            evidence_tokens_available = available_tokens - base_prompt_tokens
+            # Summarise the chunks concurrently, keeping them in order
+            progress(f"Processing {len(evidence_chunks)} evidence chunks...", 0.0)
             
-            # If evidence is too large, process in batches
-            evidence_tokens = LLMProcessor.estimate_token_count(evidence_text)
+            def update_progress(completed, total):
+                progress(f"Processed evidence chunk {completed} of {total}...", completed / total * 0.9)
             
-            if evidence_tokens <= evidence_tokens_available:
-                # Evidence fits in one batch
-                full_prompt = LLMProcessor.create_audit_prompt(evidence_text, template_structure, auditor_name)
-                return LLMProcessor.analyze_with_openai(full_prompt, model)
-            else:
-                # Need to process in batches
-                st.info("Evidence is large - processing in batches for optimal analysis.")
-                
-                # Chunk the evidence
-                evidence_chunks = LLMProcessor.chunk_evidence(
-                    evidence_text, 
-                    max_tokens=evidence_tokens_available, 
-                    chunk_size=evidence_tokens_available//2
-                )
-                
-                # Process each chunk for summary
-                chunk_summaries = []
-                progress_text = st.empty()
-                progress_bar = st.progress(0)
-                
-                for i, chunk in enumerate(evidence_chunks):
-                    progress_text.text(f"Processing evidence chunk {i+1} of {len(evidence_chunks)}...")
-                    progress_bar.progress((i) / len(evidence_chunks))
-                    
-                    # Create a summary prompt for this chunk
-                    if i == 0:
-                        summary_prompt = LLMProcessor.create_summary_prompt([chunk], template_structure, auditor_name)
-                    else:
-                        summary_prompt = f"""
-                        Continue analyzing this additional evidence chunk:
-                        
-                        EVIDENCE CHUNK {i+1}:
-                        {chunk}
-                        
-                        Follow the same format as before - identify key findings, issues, and process compliance status.
-                        Be specific but concise with bullet points by topic area.
-                        """
-                    
-                    # Get summary for this chunk
-                    chunk_summary = LLMProcessor.analyze_with_openai(summary_prompt, model)
-                    chunk_summaries.append(f"ANALYSIS OF EVIDENCE CHUNK {i+1}:\n{chunk_summary}")
-                
-                # Combine summaries and generate final report
-                progress_text.text("Generating final comprehensive report...")
-                progress_bar.progress(0.9)
-                
-                combined_summaries = "\n\n".join(chunk_summaries)
-                final_prompt = LLMProcessor.create_final_report_prompt(combined_summaries, template_structure, auditor_name)
-                
-                # Generate final report
-                final_report = LLMProcessor.analyze_with_openai(final_prompt, model)
-                
-                progress_text.text("Report generation complete!")
-                progress_bar.progress(1.0)
-                
-                return final_report
-                
-        except Exception as e:
-            st.error(f"Error processing batches with OpenAI: {e}")
-            return f"Error: {str(e)}"
+            chunk_summaries = LLMProcessor.summarize_chunks(
+                evidence_chunks,
+                template_structure,
+                auditor_name,
+                model=model,
+                max_concurrency=max_concurrency,
+                on_progress=update_progress
+            )
+            
+            # Combine summaries and generate final report
+            progress("Generating final comprehensive report...", 0.9)
+            
+            combined_summaries = "\n\n".join(chunk_summaries)
+            final_prompt = LLMProcessor.create_final_report_prompt(combined_summaries, template_structure, auditor_name)
+            
+            # Generate final report
+            final_report = LLMProcessor.analyze_with_openai(final_prompt, model, on_delta=on_delta)
+            
+            progress("Report generation complete!", 1.0)
+            
+            return final_report
     
     @staticmethod
-    def analyze_with_model(prompt, provider="openai", model="gpt-4o", evidence_text="", template_structure="", auditor_name=""):
-        """Use the selected AI provider to analyze the prompt."""
+    @track_stage("llm")
+    def analyze_with_model(prompt, provider="openai", model="gpt-4o", evidence_text="", template_structure="", auditor_name="",
+                           on_delta=None, on_progress=None):
+        """Use the selected AI provider to analyze the prompt, streaming the response to on_delta if given.
+        on_progress(message, fraction) reports progress when OpenAI evidence is processed in batches."""
         if provider.lower() == "openai":
             # For OpenAI, use batch processing if evidence_text is provided
             if evidence_text and template_structure:
-                return LLMProcessor.process_batch_with_openai(evidence_text, template_structure, auditor_name, model)
+                return LLMProcessor.process_batch_with_openai(evidence_text, template_structure, auditor_name, model,
+                                                              on_delta=on_delta, on_progress=on_progress)
             else:
-                return LLMProcessor.analyze_with_openai(prompt, model)
+                return LLMProcessor.analyze_with_openai(prompt, model, on_delta=on_delta)
         elif provider.lower() == "gemini":
             return LLMProcessor.analyze_with_gemini(prompt, model)
         else:
-            return f"Error: Unsupported AI provider: {provider}"
+            raise ValueError(f"Unsupported AI provider: {provider}")
         
     @staticmethod
     def extract_corrective_actions(report_content):
@@ -288,7 +352,7 @@ class LLMProcessor:
         """
         try:
             # Create a targeted prompt for extracting specific information
-            prompt = get_prompt(report_content=report_content, use_prompt=5)
+            prompt = render_prompt("corrective_actions", report_content=report_content)
             
             # Use a smaller, faster model for this extraction task
             response = LLMProcessor.analyze_with_model(
@@ -0,0 +1,337 @@
+import os
+import time
+import random
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Requests and tokens (prompt plus max output) allowed per minute for each model;
+# 0 disables the limit. Set them to the organisation's limits for the model.
+REQUESTS_PER_MINUTE = int(os.environ.get('OPENAI_RPM_LIMIT', 500))
+TOKENS_PER_MINUTE = int(os.environ.get('OPENAI_TPM_LIMIT', 450000))
+
+# Requests in flight at once across all callers in this process
+MAX_IN_FLIGHT = int(os.environ.get('OPENAI_MAX_IN_FLIGHT', os.environ.get('OPENAI_MAX_CONNECTIONS', 20)))
+
+# Retries after a rate limit, server error or timeout, and the backoff bounds in seconds
+MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 5))
+BACKOFF_BASE = float(os.environ.get('OPENAI_BACKOFF_BASE', 1))
+BACKOFF_MAX = float(os.environ.get('OPENAI_BACKOFF_MAX', 60))
+
+_deadline = contextvars.ContextVar('llm_deadline', default=None)
+
+
+# ------- LLM Errors -------
+class LLMError(Exception):
+    """An LLM request failed; retryable errors are retried by the scheduler before they are raised."""
+
+    retryable = False
+
+    def __init__(self, message, status_code=None, retry_after=None, retryable=None):
+        """
+        Initialize the error.
+
+        Args:
+            message: Error message
+            status_code: HTTP status of the failed response, if any
+            retry_after: Seconds the service asked callers to wait, if it said
+            retryable: Override the class default, e.g. for a 429 caused by an exhausted quota
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.attempts = 1
+        if retryable is not None:
+            self.retryable = retryable
+
+
+class LLMRateLimitError(LLMError):
+    """The service rejected the request with 429 Too Many Requests."""
+
+    retryable = True
+
+
+class LLMServiceError(LLMError):
+    """The service failed (5xx) or could not be reached."""
+
+    retryable = True
+
+
+class LLMTimeoutError(LLMError):
+    """A request attempt timed out."""
+
+    retryable = True
+
+
+class LLMDeadlineExceeded(LLMTimeoutError):
+    """The caller's deadline passed, or would pass, before the request could complete."""
+
+    retryable = False
+
+
+class LLMRequestError(LLMError):
+    """The service rejected the request itself (bad request, authentication, ...); retrying will not help."""
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """
+    Bound every LLM request made in the block to finish within seconds.
+
+    The deadline follows the context, so requests made from threads started with
+    submit_with_context inherit it. A nested scope can only shorten the deadline.
+    Nothing is bounded when seconds is None or 0.
+    """
+    if not seconds:
+        yield _deadline.get()
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    """The time.monotonic() deadline of the current context, or None."""
+    return _deadline.get()
+
+
+def resolve_deadline(deadline=None):
+    """The earlier of deadline and the current context's deadline; None if neither is set."""
+    current = _deadline.get()
+    if deadline is None:
+        return current
+    return deadline if current is None else min(deadline, current)
+
+
+# ------- LLM Scheduler Module -------
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding up to one minute of tokens.
+
+    Reservations are taken immediately and may leave the bucket in debt; the
+    caller then waits until the debt is refilled. Callers are served in the
+    order they reserved, and a request larger than the bucket still goes
+    through once the bucket is full.
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until', '_lock')
+
+    def __init__(self, rate_per_minute):
+        """Initialize a full bucket."""
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """
+        Take amount tokens.
+
+        Returns:
+            Seconds to wait before the reserved tokens are covered
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Wait for a full bucket rather than forever for a request larger than it
+            self.tokens -= min(amount, self.capacity)
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def refund(self, amount):
+        """Give back tokens that were reserved but not used (a negative amount takes more)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def pause(self, seconds):
+        """Make new reservations wait at least seconds, e.g. after the service answered 429."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def paused_for(self):
+        """Seconds left of the current pause."""
+        with self._lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+
+class RequestScheduler:
+    """
+    Admit LLM requests under shared rate and concurrency limits, with retries.
+
+    Every chat completion in the process goes through one scheduler: chunk
+    summaries, the final report, vision extraction and corrective-action
+    extraction of all concurrent runs. Each model has a requests-per-minute and
+    a tokens-per-minute bucket, a semaphore bounds the requests in flight, and
+    retryable failures are retried with jittered exponential backoff. A 429
+    pauses the model's buckets, so other callers back off too instead of
+    spending their attempts on the same limit.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES):
+        """Initialize the scheduler; limits of 0 are not enforced."""
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _model_buckets(self, model):
+        """(requests bucket, tokens bucket) for model; either may be None when unlimited."""
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = (
+                    TokenBucket(self.requests_per_minute) if self.requests_per_minute > 0 else None,
+                    TokenBucket(self.tokens_per_minute) if self.tokens_per_minute > 0 else None,
+                )
+            return self._buckets[model]
+
+    @staticmethod
+    def _remaining(deadline):
+        return None if deadline is None else deadline - time.monotonic()
+
+    @staticmethod
+    def _sleep(seconds, deadline, reason):
+        """Sleep, or raise LLMDeadlineExceeded at once if the sleep would pass the deadline."""
+        if seconds <= 0:
+            return
+        remaining = RequestScheduler._remaining(deadline)
+        if remaining is not None and seconds >= remaining:
+            raise LLMDeadlineExceeded(f"Deadline reached while waiting for {reason} ({seconds:.1f}s needed, {max(0.0, remaining):.1f}s left)")
+        time.sleep(seconds)
+
+    def _admit(self, model, token_estimate, deadline):
+        """Reserve one request and token_estimate tokens, and wait until the model's limits allow them."""
+        requests, tokens = self._model_buckets(model)
+        wait = requests.reserve(1) if requests else 0.0
+        if tokens:
+            wait = max(wait, tokens.reserve(token_estimate))
+        try:
+            self._sleep(wait, deadline, f"{model} rate limit")
+            # A 429 seen by another caller while this one waited pauses it too
+            for bucket in (requests, tokens):
+                while bucket and bucket.paused_for() > 0:
+                    self._sleep(bucket.paused_for(), deadline, f"{model} rate limit")
+        except LLMDeadlineExceeded:
+            self._release(model, 1, token_estimate)
+            raise
+
+    def _release(self, model, request_count, token_count):
+        requests, tokens = self._model_buckets(model)
+        if requests and request_count:
+            requests.refund(request_count)
+        if tokens and token_count:
+            tokens.refund(token_count)
+
+    def backoff(self, attempt, error):
+        """Full-jitter exponential backoff for the attempt (0-based), never shorter than the service's Retry-After."""
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        return max(delay, error.retry_after or 0.0)
+
+    def execute(self, model, send, token_estimate=0, timeout=None, deadline=None):
+        """
+        Run one request under the limits, retrying retryable failures.
+
+        Args:
+            model: Model the request is for; limits are kept per model
+            send: Callable taking the attempt timeout in seconds and returning
+                (result, tokens used or None); it raises LLMError on failure
+            token_estimate: Prompt plus maximum output tokens, charged up front
+            timeout: Timeout of each attempt in seconds
+            deadline: time.monotonic() time by which the request must finish;
+                defaults to the deadline of the current deadline_scope
+
+        Returns:
+            (result, retries, seconds spent waiting for limits and backoff)
+
+        Raises:
+            LLMDeadlineExceeded: The deadline passed before a response arrived
+            LLMError: The request failed and could not be retried further
+        """
+        deadline = resolve_deadline(deadline)
+        _, tokens = self._model_buckets(model)
+        waited = 0.0
+
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.monotonic()
+            self._admit(model, token_estimate, deadline)
+            remaining = self._remaining(deadline)
+            if not self._slots.acquire(timeout=max(0.0, remaining) if remaining is not None else None):
+                self._release(model, 1, token_estimate)
+                raise LLMDeadlineExceeded(f"Deadline reached while waiting for a free {model} request slot")
+            waited += time.monotonic() - queued_at
+
+            try:
+                remaining = self._remaining(deadline)
+                if remaining is not None and remaining <= 0:
+                    self._release(model, 1, token_estimate)
+                    raise LLMDeadlineExceeded(f"Deadline reached before the {model} request was sent")
+                attempt_timeout = timeout if remaining is None else min(timeout or remaining, remaining)
+                result, used = send(attempt_timeout)
+            except LLMError as error:
+                if isinstance(error, LLMDeadlineExceeded):
+                    raise
+                failure = error
+            else:
+                failure = None
+            finally:
+                self._slots.release()
+
+            if failure is None:
+                # Settle the estimate against the tokens the service actually counted
+                if tokens and used is not None:
+                    tokens.refund(token_estimate - used)
+                return result, attempt, waited
+
+            failure.attempts = attempt + 1
+            # The service does not count the tokens of rejected or failed requests
+            self._release(model, 0, token_estimate)
+            if not failure.retryable or attempt == self.max_retries:
+                raise failure
+
+            delay = self.backoff(attempt, failure)
+            if isinstance(failure, LLMRateLimitError):
+                for bucket in self._model_buckets(model):
+                    if bucket:
+                        bucket.pause(delay)
+            logger.warning(f"{model} request failed ({failure}); retry {attempt + 1} of {self.max_retries} in {delay:.1f}s")
+            backoff_start = time.monotonic()
+            try:
+                self._sleep(delay, deadline, f"a {model} retry")
+            except LLMDeadlineExceeded as deadline_error:
+                deadline_error.attempts = attempt + 1
+                raise deadline_error from failure
+            waited += time.monotonic() - backoff_start
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide request scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
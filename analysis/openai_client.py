@@ -0,0 +1,238 @@
+import os
+import time
+import threading
+import logging
+
+from .instrumentation import record_api_call, record_value
+from .llm_scheduler import (
+    get_scheduler, resolve_deadline, LLMRateLimitError, LLMServiceError, LLMTimeoutError, LLMRequestError,
+    LLMDeadlineExceeded
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Default per-request timeout in seconds
+DEFAULT_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 120))
+
+# Size of the shared HTTP connection pool
+MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+
+# Tokens charged against the tokens-per-minute limit for each image in a request
+# (a high-detail 1024x1024 image costs 765) and for a response when max_tokens is not set
+IMAGE_TOKEN_ESTIMATE = 1000
+DEFAULT_OUTPUT_TOKEN_ESTIMATE = 1024
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Return the process-wide OpenAI client.
+
+    The client is created once and shares one pooled HTTP connection pool between
+    all callers, so concurrent requests reuse keep-alive connections instead of
+    opening a new client per call. The SDK's own retries are off; the request
+    scheduler retries instead.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            import httpx
+            import openai
+
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+                timeout=DEFAULT_TIMEOUT
+            )
+            _client = openai.OpenAI(
+                api_key=os.environ.get('OPENAI_API_KEY'),
+                http_client=http_client,
+                timeout=DEFAULT_TIMEOUT,
+                max_retries=0
+            )
+        return _client
+
+
+def _retry_after(response):
+    """Seconds the Retry-After headers of an error response ask to wait, or None."""
+    headers = getattr(response, 'headers', None) or {}
+    for header, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+        try:
+            return float(headers[header]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def to_llm_error(error):
+    """
+    Map an OpenAI SDK exception to the matching LLMError.
+
+    Returns:
+        LLMError, or None if error is not an API error
+    """
+    import httpx
+    import openai
+
+    message = f"OpenAI request failed: {error}"
+    # A streamed response that breaks off raises the httpx error itself
+    if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException)):
+        return LLMTimeoutError(message)
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return LLMServiceError(message)
+    if not isinstance(error, openai.APIStatusError):
+        return None
+
+    status = error.status_code
+    retry_after = _retry_after(error.response)
+    if status == 429:
+        # An exhausted quota also answers 429, but waiting will not refill it
+        exhausted = getattr(error, 'code', None) == 'insufficient_quota'
+        return LLMRateLimitError(message, status, retry_after, retryable=False if exhausted else None)
+    if status >= 500 or status in (408, 409):
+        return LLMServiceError(message, status, retry_after)
+    return LLMRequestError(message, status)
+
+
+def estimate_request_tokens(messages, model, max_tokens=None):
+    """Tokens a request counts against the tokens-per-minute limit: prompt text, images and maximum output."""
+    from .tokenizer import count_tokens
+
+    total = max_tokens or DEFAULT_OUTPUT_TOKEN_ESTIMATE
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            total += count_tokens(content, model)
+            continue
+        for part in content or ():
+            if part.get('type') == 'text':
+                total += count_tokens(part.get('text', ''), model)
+            else:
+                total += IMAGE_TOKEN_ESTIMATE
+    return total
+
+
+def _read_stream(stream, deadline, on_delta):
+    """
+    Pass a streamed completion's text to on_delta as it arrives.
+
+    Returns:
+        (content, usage or None)
+    """
+    parts = []
+    usage = None
+    started = time.perf_counter()
+    with stream:
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage = chunk.usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    record_value('llm_first_token_seconds', time.perf_counter() - started)
+                parts.append(delta)
+                on_delta(delta)
+            if deadline is not None and time.monotonic() > deadline:
+                raise LLMDeadlineExceeded("Deadline reached while the response was streaming")
+    return "".join(parts), usage
+
+
+def chat_completion(messages, model="gpt-4o", temperature=None, max_tokens=None, timeout=None, use_cache=True,
+                    deadline=None, on_delta=None):
+    """
+    Run a chat completion and return the message content, reusing cached responses.
+
+    The request goes through the process-wide scheduler, which applies the
+    rate and concurrency limits and retries rate limits, server errors and
+    timeouts with backoff. With on_delta the response is streamed; a stream
+    that fails after text was passed on is not retried, since the caller has
+    already used that text.
+
+    Args:
+        messages: Chat messages to send
+        model: OpenAI model to use
+        temperature: Sampling temperature (omitted from the request when None)
+        max_tokens: Maximum output tokens (omitted from the request when None)
+        timeout: Per-attempt timeout in seconds (defaults to DEFAULT_TIMEOUT)
+        use_cache: Whether to read from and write to the response cache
+        deadline: time.monotonic() time by which the call must finish
+            (defaults to the deadline of the current deadline_scope)
+        on_delta: Optional callback called with each piece of the response text
+            as it arrives (once with the whole text for a cached response)
+
+    Returns:
+        The content of the first completion choice
+
+    Raises:
+        LLMError: The request failed; LLMDeadlineExceeded if the deadline passed first
+    """
+    from .response_cache import get_response_cache, ResponseCache
+
+    cache = get_response_cache() if use_cache else None
+    cache_key = ResponseCache.make_key(model, temperature, max_tokens, messages) if cache else None
+    if cache:
+        cached_content = cache.get(cache_key)
+        if cached_content is not None:
+            logger.info(f"Using cached {model} response")
+            record_api_call(model, 0.0, cached=True)
+            if on_delta:
+                on_delta(cached_content)
+            return cached_content
+
+    request = {"model": model, "messages": messages}
+    if temperature is not None:
+        request["temperature"] = temperature
+    if max_tokens is not None:
+        request["max_tokens"] = max_tokens
+
+    deadline = resolve_deadline(deadline)
+    delivered = []
+
+    def deliver(delta):
+        delivered.append(True)
+        on_delta(delta)
+
+    def send(attempt_timeout):
+        try:
+            if on_delta:
+                stream = get_openai_client().chat.completions.create(
+                    **request, timeout=attempt_timeout, stream=True, stream_options={"include_usage": True}
+                )
+                content, usage = _read_stream(stream, deadline, deliver)
+            else:
+                response = get_openai_client().chat.completions.create(**request, timeout=attempt_timeout)
+                content, usage = response.choices[0].message.content, getattr(response, 'usage', None)
+        except LLMDeadlineExceeded:
+            raise
+        except Exception as e:
+            llm_error = to_llm_error(e)
+            if llm_error is None:
+                raise
+            if delivered:
+                llm_error.retryable = False
+            raise llm_error from e
+        return (content, usage), getattr(usage, 'total_tokens', None)
+
+    start = time.perf_counter()
+    (content, usage), retries, queued = get_scheduler().execute(
+        model,
+        send,
+        token_estimate=estimate_request_tokens(messages, model, max_tokens),
+        timeout=timeout or DEFAULT_TIMEOUT,
+        deadline=deadline
+    )
+    record_api_call(
+        model,
+        time.perf_counter() - start - queued,
+        prompt_tokens=getattr(usage, 'prompt_tokens', None),
+        completion_tokens=getattr(usage, 'completion_tokens', None),
+        retries=retries,
+        queued_seconds=queued
+    )
+
+    if cache and content:
+        cache.set(cache_key, content)
+    return content
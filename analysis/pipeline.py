@@ -0,0 +1,160 @@
+import os
+import logging
+
+from .document_processor import DocumentProcessor
+from .evidence_corpus import EvidenceCorpus
+from .screenshot_handler import EvidenceScreenshotHandler
+from .llm_processor import LLMProcessor
+from .response_processor import ResponsePreprocessor
+from .template_analyzer import TemplateAnalyzer
+from .report_generator import ReportGenerator
+from .instrumentation import RunMetrics, track
+from .llm_scheduler import deadline_scope
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# ------- Report Pipeline Module -------
+class ReportPipeline:
+    """Run the evidence-to-report pipeline for one evidence set without the Streamlit UI."""
+
+    # Stage names in execution order, used for timing summaries
+    STAGES = [
+        "extract_text",
+        "screenshots",
+        "template_analysis",
+        "llm",
+        "preprocess",
+        "vision_extraction",
+        "fill_template",
+        "save",
+    ]
+
+    # Seconds every LLM request of a run (report, chunk summaries, vision) must finish within; 0 for no limit
+    LLM_DEADLINE = float(os.environ.get('REPORT_LLM_DEADLINE', 1800))
+
+    def __init__(self, provider="openai", model="gpt-4o", auditor_name=""):
+        """Initialize the pipeline with the AI provider settings."""
+        self.provider = provider.lower()
+        self.model = model
+        self.auditor_name = auditor_name
+        self.metrics = RunMetrics()
+
+    @property
+    def timings(self):
+        """Wall-clock seconds per stage of the last run."""
+        return {name: entry['wall_seconds'] for name, entry in self.metrics.stage_summary().items()}
+
+    @staticmethod
+    def build_evidence_prompt(evidence_paths):
+        """Build the evidence file reference prompt sent alongside the evidence text."""
+        evidence_names = [os.path.basename(path) for path in evidence_paths]
+        evidence_prompt = "Evidence files provided: " + ", ".join(evidence_names)
+        evidence_prompt += "\n\nPlease reference these evidence files where appropriate in the report, especially in the 'SIGHTED EVIDENCE' sections."
+        return evidence_prompt
+
+    def run(self, evidence_paths, template_path, output_path=None, on_progress=None, on_preview=None):
+        """
+        Generate a report for one evidence set.
+
+        Args:
+            evidence_paths: List of evidence file paths
+            template_path: Path to the Word report template
+            output_path: Optional path to save the completed report to
+            on_progress: Optional callback(fraction, message) called as each stage starts
+            on_preview: Optional callback(markdown) called with the preprocessed report
+                so far each time a section of the streamed AI response completes
+
+        Returns:
+            Dictionary with 'report_doc', 'report_content', 'evidence_images', 'timings'
+            and 'metrics' keys
+        """
+        self.metrics = RunMetrics(run_name=os.path.basename(output_path) if output_path else "")
+
+        def progress(fraction, message):
+            if on_progress is not None:
+                on_progress(fraction, message)
+
+        # Each wrapped stage records itself into the active metrics collector, and
+        # every LLM request of the run shares one deadline
+        with self.metrics.scope(), deadline_scope(self.LLM_DEADLINE):
+            # Extract text from evidence files
+            progress(0.05, "Extracting content from evidence files...")
+            evidence_corpus = EvidenceCorpus.from_results(DocumentProcessor.process_files(evidence_paths), model=self.model)
+
+            # Generate screenshots of evidence files
+            progress(0.3, "Capturing screenshots from evidence files...")
+            screenshot_handler = EvidenceScreenshotHandler()
+            try:
+                evidence_images = screenshot_handler.process_evidence_files(evidence_paths)
+            finally:
+                screenshot_handler.clean_up()
+
+            # Analyze template structure
+            progress(0.5, "Analyzing template structure...")
+            compiled_template = TemplateAnalyzer.compile_template(template_path)
+            template_prompt = compiled_template.prompt
+
+            # Generate the audit report content, preprocessing each section as it streams in
+            progress(0.55, "Generating audit report with AI...")
+            response_preprocessor = ResponsePreprocessor()
+            streamed = False
+
+            def on_delta(text):
+                nonlocal streamed
+                streamed = True
+                if response_preprocessor.feed(text) and on_preview is not None:
+                    on_preview(response_preprocessor.preview())
+
+            evidence_prompt = self.build_evidence_prompt(evidence_paths)
+            if self.provider == "openai":
+                llm_response = LLMProcessor.analyze_with_model(
+                    prompt=evidence_prompt,
+                    provider=self.provider,
+                    model=self.model,
+                    evidence_text=evidence_corpus,
+                    template_structure=template_prompt,
+                    auditor_name=self.auditor_name,
+                    on_delta=on_delta,
+                    # Batched evidence reports its progress within the AI stage
+                    on_progress=lambda message, fraction: progress(0.55 + 0.3 * fraction, message)
+                )
+            else:
+                prompt = LLMProcessor.create_audit_prompt(evidence_corpus, template_prompt, self.auditor_name)
+                prompt += "\n\n" + evidence_prompt
+                llm_response = LLMProcessor.analyze_with_model(
+                    prompt=prompt,
+                    provider=self.provider,
+                    model=self.model,
+                    on_delta=on_delta
+                )
+
+            # Finish processing the AI response
+            progress(0.85, "Processing AI response...")
+            with track("preprocess"):
+                if not streamed:
+                    # The provider answered without streaming
+                    response_preprocessor.feed(llm_response)
+                processed_response = response_preprocessor.finish()
+
+            # Fill the template with audit results and evidence images
+            progress(0.9, "Filling template with audit results and evidence images...")
+            report_generator = ReportGenerator()
+            report_generator.set_evidence_images(evidence_images)
+            report_generator.set_preprocessor(response_preprocessor)
+            report_doc = report_generator.fill_template_document(compiled_template, response_preprocessor.document, self.auditor_name)
+
+            if report_doc and output_path:
+                with track("save"):
+                    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                    report_doc.save(output_path)
+
+        return {
+            'report_doc': report_doc,
+            'report_content': processed_response,
+            'evidence_images': evidence_images,
+            'timings': self.timings,
+            'metrics': self.metrics.to_dict(),
+        }
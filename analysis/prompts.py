@@ -1,20 +1,106 @@
+import string
+import threading
 from datetime import datetime
 
-def get_prompt(**kwargs):
-    current_date = datetime.now().strftime('%d/%m/%Y')
+from .tokenizer import count_tokens
+
 
-    auditor_name = kwargs.get("auditor_name", "")
-    evidence_text = kwargs.get("evidence_text", "")
-    template_structure = kwargs.get("template_structure", "")
-    chunk_summaries = kwargs.get("chunk_summaries", "")
-    evidence_summaries = kwargs.get("evidence_summaries", "")
-    report_content = kwargs.get("report_content", "")
-    use_prompt = kwargs.get("use_prompt", "")
+# Characters of a report sent to the corrective-action extraction prompt
+CORRECTIVE_REPORT_CHARS = 4000
 
 
-    audit_prompt_1 = f"""
+# ------- Prompt Registry Module -------
+class PromptTemplate:
+    """
+    Prompt text compiled once into literal parts and {field} placeholders.
+
+    A placeholder may carry a fallback after a colon, used when the value is
+    empty: {auditor_name:Internal Auditor}. The literal text and its token
+    count are fixed, so the size of a prompt can be worked out from the sizes
+    of its values without rendering it. A value with a parts() method, such as
+    an EvidenceCorpus, is written straight into the prompt piece by piece
+    instead of being joined into a string of its own first.
+    """
+
+    __slots__ = ('name', 'parts', 'fields', 'limits', 'static_text', '_static_tokens', '_lock')
+
+    def __init__(self, name, text, limits=None):
+        """
+        Compile the template.
+
+        Args:
+            name: Registry name
+            text: Prompt text with {field} or {field:fallback} placeholders
+            limits: Optional dictionary of field -> maximum characters of its value
+        """
+        self.name = name
+        # (literal text, field name or None, fallback) in prompt order
+        self.parts = [(literal, field, fallback or "") for literal, field, fallback, _ in string.Formatter().parse(text)]
+        self.fields = tuple(dict.fromkeys(field for _, field, _ in self.parts if field))
+        self.limits = limits or {}
+        self.static_text = "".join(literal for literal, _, _ in self.parts)
+        self._static_tokens = {}
+        self._lock = threading.Lock()
+
+    def _value(self, field, fallback, values):
+        """The value written for a placeholder: a string, or an object with parts()."""
+        value = values.get(field)
+        if field == 'current_date' and not value:
+            value = datetime.now().strftime('%d/%m/%Y')
+        if not value:
+            return fallback
+        if field in self.limits and isinstance(value, str):
+            return value[:self.limits[field]]
+        return value
+
+    def render(self, **values):
+        """
+        Fill the placeholders and return the prompt.
+
+        Missing or empty values are written as their fallback, or left empty;
+        current_date defaults to today's date.
+        """
+        pieces = []
+        for literal, field, fallback in self.parts:
+            pieces.append(literal)
+            if field is None:
+                continue
+            value = self._value(field, fallback, values)
+            if hasattr(value, 'parts'):
+                pieces.extend(value.parts())
+            else:
+                pieces.append(str(value))
+        return "".join(pieces)
+
+    def static_tokens(self, model="gpt-4o"):
+        """Tokens of the literal text, counted once per model."""
+        with self._lock:
+            if model not in self._static_tokens:
+                self._static_tokens[model] = count_tokens(self.static_text, model)
+            return self._static_tokens[model]
+
+    def token_count(self, model="gpt-4o", **values):
+        """
+        Tokens of the rendered prompt, without rendering it.
+
+        The literal text's count is fixed; each value is counted on its own
+        (using its token_count if it has one). One token per placeholder is
+        added for tokens that merge across a placeholder boundary, so the count
+        does not fall below the rendered prompt's.
+        """
+        total = self.static_tokens(model)
+        for _, field, fallback in self.parts:
+            if field is None:
+                continue
+            value = self._value(field, fallback, values)
+            total += 1 + (value.token_count if hasattr(value, 'token_count') else count_tokens(str(value), model))
+        return total
+
+
+# Detailed audit report prompt (get_prompt number 1)
+AUDIT_PROMPT_1 = """
 - **Audit Date:** {current_date}
-- **Lead Auditor Designation:** {auditor_name if auditor_name else 'Lead Internal Auditor'}
+- **Lead Auditor Designation:** {auditor_name:Lead Internal Auditor}
 
 ---
 
@@ -97,7 +183,7 @@ def get_prompt(**kwargs):
 
 ### Core Documentation Sections
 - **AUDIT DATE:** Utilize the specified date: {current_date}
-- **AUDITOR:** Enter designated auditor: {auditor_name if auditor_name else 'Lead Internal Auditor'}
+- **AUDITOR:** Enter designated auditor: {auditor_name:Lead Internal Auditor}
 - **AUDIT ADDRESS:** Extract from evidence or apply appropriate organizational location with full address details
 
 
@@ -173,7 +259,7 @@ Provide comprehensive information for all verification elements:
 Conclude the report with formal signature block:
 
 ```
-{auditor_name if auditor_name else 'Lead Internal Auditor'}  
+{auditor_name:Lead Internal Auditor}  
 Lead Internal Auditor  
 {current_date}
 ```
@@ -196,7 +282,9 @@ The final audit report must:
 
 Generate ONLY the completed audit report without any explanatory comments or descriptions of your process.
             """
-    audit_prompt_2 = f"""
+
+# Audit report prompt with the evidence embedded (get_prompt number 2)
+AUDIT_PROMPT_2 = """
 # ENHANCED ISO INTERNAL AUDIT REPORT GENERATOR
 
 ## AUDITOR ROLE SPECIFICATION
@@ -220,7 +308,7 @@ Your task is to generate a comprehensive, evidence-based Internal Audit Report t
 ```
 
 - **Audit Date:** {current_date}
-- **Lead Auditor Designation:** {auditor_name if auditor_name else 'Lead Internal Auditor'}
+- **Lead Auditor Designation:** {auditor_name:Lead Internal Auditor}
 
 ---
 
@@ -232,7 +320,7 @@ You MUST provide complete and appropriate content for ALL of the following secti
 
 1. **AUDIT TITLE:** "Internal Audit - Customer Feedback Process"
 2. **AUDIT DATE:** {current_date}
-3. **AUDITOR:** {auditor_name if auditor_name else 'Lead Internal Auditor'} 
+3. **AUDITOR:** {auditor_name:Lead Internal Auditor} 
 4. **AUDIT ADDRESS:** "Remote internal audit"
 5. **AUDIT SCOPE:** "This internal audit applies to the implementation of the organisation's Customer Feedback Process at the Osborne Park location"
 6. **AUDIT CRITERIA:** "ISO 9001:2015:
@@ -275,7 +363,7 @@ Internal audits occur to verify the effectiveness and implementation of the Cust
     
     Conclude with:
     ```
-    {auditor_name if auditor_name else 'Internal Auditor'}
+    {auditor_name:Internal Auditor}
     Internal Auditor
     {current_date}
     ```
@@ -432,7 +520,7 @@ CRITICAL INSTRUCTION: You can only have findings in EITHER the NONCONFORMANCES s
   
   Conclude with:
   ```
-  {auditor_name if auditor_name else 'Internal Auditor'}
+  {auditor_name:Internal Auditor}
   Internal Auditor
   {current_date}
   ```
@@ -482,13 +570,14 @@ Generate ONLY the completed audit report without any explanatory comments or des
 
 I REQUIRE ALL SECTIONS TO BE COMPLETED, ESPECIALLY THE AUDIT REPORT FINAL COMMENTS SECTION. UNDER NO CIRCUMSTANCES SHOULD THIS SECTION BE OMITTED.
 """
-  
-    summary_prompt_3 = f"""
+
+# First evidence chunk of a report that is too large for one prompt (get_prompt number 3)
+SUMMARY_PROMPT_3 = """
 You are a certified ISO Internal Auditor tasked with creating a professional audit report.
 
 First, analyze these evidence chunks I'm providing from multiple documents:
 
-{chunk_summaries[0] if chunk_summaries else "No evidence provided."}
+{chunk_summary:No evidence provided.}
 
 Additional evidence chunks will be provided separately due to context limitations.
 
@@ -503,8 +592,20 @@ For now, just identify and note:
 
 Format your response as bullet points organized by topic area. Be specific but concise.
 """
-  
-    final_report_prompt = f"""
+
+# Each further evidence chunk of a report that is too large for one prompt
+CHUNK_CONTINUATION_PROMPT = """
+                        Continue analyzing this additional evidence chunk:
+                        
+                        EVIDENCE CHUNK {chunk_number}:
+                        {chunk}
+                        
+                        Follow the same format as before - identify key findings, issues, and process compliance status.
+                        Be specific but concise with bullet points by topic area.
+                        """
+
+# Report written from the chunk summaries (get_prompt number 4)
+FINAL_REPORT_PROMPT = """
 You are a certified ISO Internal Auditor.
 
 Based on the evidence analyses I've provided, create a complete, formal Internal Audit Report following the provided template structure.
@@ -517,7 +618,7 @@ TEMPLATE STRUCTURE:
 
 AUDIT DETAILS:
 - Audit Date: {current_date}
-- Auditor Name: {auditor_name if auditor_name else 'Internal Auditor'}
+- Auditor Name: {auditor_name:Internal Auditor}
 
 REQUIREMENTS:
 1. Follow the exact template structure provided
@@ -532,7 +633,8 @@ REQUIREMENTS:
 Format your response as a complete audit report ready for delivery.
     """
 
-    correlative_prompt = f"""
+# Corrective-action extraction from a finished report (get_prompt number 5)
+CORRECTIVE_ACTIONS_PROMPT = """
 Extract the following information from this internal audit report:
 
 1. Details of issues identified (in 1-2 concise sentences)
@@ -542,22 +644,65 @@ Extract the following information from this internal audit report:
 Format the output as JSON with keys 'details', 'corrective_actions', and 'source_of_issue'.
 
 REPORT CONTENT:
-{report_content[:4000]}  # Limit to first 4000 chars for token efficiency
+{report_content}  # Limit to first 4000 chars for token efficiency
 """
-    
-    # return prompots
-    if use_prompt == 1:
-        return audit_prompt_1
-    elif use_prompt == 2:
-        return audit_prompt_2
-    elif use_prompt == 3:
-        return summary_prompt_3
-    elif use_prompt == 4:
-        return final_report_prompt
-    elif use_prompt == 5:
-        return correlative_prompt
-    else:
+
+
+# Registered prompts by name
+PROMPTS = {}
+
+# get_prompt() numbers of the registered prompts
+PROMPT_NUMBERS = {
+    1: "audit_report_detailed",
+    2: "audit_report",
+    3: "evidence_chunk_summary",
+    4: "final_report",
+    5: "corrective_actions",
+}
+
+
+def register_prompt(name, text, limits=None):
+    """Compile a prompt and add it to the registry; returns the PromptTemplate."""
+    PROMPTS[name] = PromptTemplate(name, text, limits)
+    return PROMPTS[name]
+
+
+register_prompt("audit_report_detailed", AUDIT_PROMPT_1)
+register_prompt("audit_report", AUDIT_PROMPT_2)
+register_prompt("evidence_chunk_summary", SUMMARY_PROMPT_3)
+register_prompt("evidence_chunk_continuation", CHUNK_CONTINUATION_PROMPT)
+register_prompt("final_report", FINAL_REPORT_PROMPT)
+register_prompt("corrective_actions", CORRECTIVE_ACTIONS_PROMPT, limits={'report_content': CORRECTIVE_REPORT_CHARS})
+
+
+def get_template(name):
+    """Return a registered PromptTemplate by name or get_prompt() number."""
+    return PROMPTS[PROMPT_NUMBERS.get(name, name)]
+
+
+def render_prompt(name, **values):
+    """Render the registered prompt name (or number) with values; only that prompt is built."""
+    return get_template(name).render(**values)
+
+
+def get_prompt(**kwargs):
+    """
+    Render one prompt by number, the way callers have always asked for prompts.
+
+    Args:
+        use_prompt: 1-5, see PROMPT_NUMBERS
+        Other keyword arguments fill the prompt: auditor_name, evidence_text,
+        template_structure, chunk_summaries (the first is used),
+        evidence_summaries, report_content
+
+    Returns:
+        The prompt text
+    """
+    use_prompt = kwargs.pop("use_prompt", "")
+    if use_prompt not in PROMPT_NUMBERS:
         raise AssertionError("pass parameter of type dict ->{'use_prompt':val[1?2?3?]}")
-    
-  
 
+    chunk_summaries = kwargs.pop("chunk_summaries", "")
+    if chunk_summaries:
+        kwargs["chunk_summary"] = chunk_summaries[0]
+    return render_prompt(use_prompt, **kwargs)
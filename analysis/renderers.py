@@ -0,0 +1,333 @@
+import os
+import sys
+import shutil
+import atexit
+import tempfile
+import subprocess
+import logging
+
+from .image_budget import render_zoom
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Seconds a single document conversion may take before it is abandoned
+RENDER_TIMEOUT = float(os.environ.get('DOCUMENT_RENDER_TIMEOUT', 60))
+
+# Office fixed-format export constants
+WD_EXPORT_FORMAT_PDF = 17
+XL_TYPE_PDF = 0
+
+
+# ------- Document Renderer Module -------
+class DocumentRenderer:
+    """
+    Interface for backends that convert office documents to PDF.
+
+    A renderer may keep its office application resident between conversions:
+    open() starts it, to_pdf() reuses it and close() shuts it down.
+    """
+
+    name = ""
+    SUPPORTED_EXTENSIONS = set()
+
+    @classmethod
+    def is_available(cls):
+        """Return True if the backend can run on this machine."""
+        raise NotImplementedError
+
+    @classmethod
+    def supports(cls, file_path):
+        """Return True if the backend can convert this file type."""
+        return os.path.splitext(file_path)[1].lower() in cls.SUPPORTED_EXTENSIONS
+
+    def open(self):
+        """Start the backend's resident application, if it has one."""
+
+    def close(self):
+        """Shut down the backend's resident application, if it has one."""
+
+    def to_pdf(self, source_path, output_dir):
+        """
+        Convert a document to PDF.
+
+        Args:
+            source_path: Path to the document
+            output_dir: Directory to write the PDF to
+
+        Returns:
+            Path to the PDF, or None if the conversion failed
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _pdf_path(source_path, output_dir):
+        """Output path of the PDF for a source document."""
+        return os.path.abspath(os.path.join(output_dir, os.path.splitext(os.path.basename(source_path))[0] + ".pdf"))
+
+    @staticmethod
+    def _pdf_if_written(pdf_path):
+        """Return the PDF path if the conversion produced a non-empty file."""
+        if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+            return pdf_path
+        return None
+
+
+class LibreOfficeRenderer(DocumentRenderer):
+    """Headless LibreOffice conversion; works on Linux, macOS and Windows."""
+
+    name = "libreoffice"
+    SUPPORTED_EXTENSIONS = {'.docx', '.doc', '.dotx', '.dot', '.rtf', '.odt', '.xlsx', '.xls', '.ods'}
+
+    # Default install locations checked when soffice is not on PATH
+    WINDOWS_PATHS = [
+        r"C:\Program Files\LibreOffice\program\soffice.exe",
+        r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+    ]
+    MACOS_PATH = "/Applications/LibreOffice.app/Contents/MacOS/soffice"
+
+    def __init__(self):
+        """Initialize the renderer; the user profile is created on open()."""
+        self._profile_dir = None
+
+    @classmethod
+    def find_binary(cls):
+        """Locate the soffice binary (LIBREOFFICE_PATH overrides the search)."""
+        configured = os.environ.get('LIBREOFFICE_PATH')
+        if configured:
+            return configured if os.path.exists(configured) else None
+
+        for candidate in ("soffice", "libreoffice"):
+            found = shutil.which(candidate)
+            if found:
+                return found
+
+        for candidate in cls.WINDOWS_PATHS + [cls.MACOS_PATH]:
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    @classmethod
+    def is_available(cls):
+        return cls.find_binary() is not None
+
+    def _profile_url(self):
+        """Return this renderer's LibreOffice user profile as a file URL."""
+        path = os.path.abspath(self._profile_dir).replace("\\", "/")
+        return "file:///" + path.lstrip("/")
+
+    def _command(self, *args):
+        """Build a headless soffice command line that uses this renderer's profile."""
+        return [
+            self.find_binary(),
+            f"-env:UserInstallation={self._profile_url()}",
+            "--headless", "--norestore", "--nologo", "--nodefault", "--nolockcheck",
+        ] + list(args)
+
+    def open(self):
+        """
+        Create and initialise a private user profile.
+
+        LibreOffice refuses to start a second instance on a profile that is in
+        use, so every renderer gets its own profile. Most of soffice's first
+        start is spent populating the profile; doing it once here keeps the
+        later conversions warm.
+        """
+        if self._profile_dir is not None:
+            return
+        self._profile_dir = tempfile.mkdtemp(prefix=f"lo_profile_{os.getpid()}_")
+        atexit.register(shutil.rmtree, self._profile_dir, True)
+        try:
+            subprocess.run(self._command("--terminate_after_init"), capture_output=True, timeout=RENDER_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Could not initialise LibreOffice profile: {str(e)}")
+
+    def close(self):
+        if self._profile_dir is not None:
+            shutil.rmtree(self._profile_dir, ignore_errors=True)
+            self._profile_dir = None
+
+    def to_pdf(self, source_path, output_dir):
+        if not self.find_binary():
+            logger.error("LibreOffice is not installed")
+            return None
+        self.open()
+
+        command = self._command("--convert-to", "pdf", "--outdir", output_dir, os.path.abspath(source_path))
+        try:
+            completed = subprocess.run(command, capture_output=True, timeout=RENDER_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.error(f"LibreOffice timed out converting {source_path}")
+            return None
+        except OSError as e:
+            logger.error(f"Could not run LibreOffice: {str(e)}")
+            return None
+
+        if completed.returncode != 0:
+            logger.error(f"LibreOffice failed on {source_path}: {completed.stderr.decode(errors='replace').strip()}")
+        return self._pdf_if_written(self._pdf_path(source_path, output_dir))
+
+
+class _OfficeComRenderer(DocumentRenderer):
+    """Shared lifecycle for renderers that drive a resident Office application through COM."""
+
+    PROG_ID = ""
+
+    def __init__(self):
+        """Initialize the renderer; the application is started on open()."""
+        self._app = None
+
+    @classmethod
+    def is_available(cls):
+        if sys.platform != "win32":
+            return False
+        try:
+            import win32com.client  # noqa: F401
+            import pythoncom  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def open(self):
+        if self._app is not None:
+            return
+        import pythoncom
+        import win32com.client
+
+        pythoncom.CoInitialize()
+        # DispatchEx starts a private, invisible instance owned by this process
+        self._app = win32com.client.DispatchEx(self.PROG_ID)
+        self._app.Visible = False
+        self._app.DisplayAlerts = False
+
+    def close(self):
+        if self._app is None:
+            return
+        import pythoncom
+
+        try:
+            self._app.Quit()
+        except Exception as e:
+            logger.warning(f"Error closing {self.PROG_ID}: {str(e)}")
+        self._app = None
+        pythoncom.CoUninitialize()
+
+    def _export(self, source_path, pdf_path):
+        """Export one document to PDF with the resident application."""
+        raise NotImplementedError
+
+    def to_pdf(self, source_path, output_dir):
+        pdf_path = self._pdf_path(source_path, output_dir)
+        for attempt in range(2):
+            try:
+                self.open()
+                # The export call returns once the PDF is written, so no polling is needed
+                self._export(os.path.abspath(source_path), pdf_path)
+                return self._pdf_if_written(pdf_path)
+            except Exception as e:
+                # The resident application may have died; restart it once
+                logger.error(f"{self.PROG_ID} conversion failed for {source_path}: {str(e)}")
+                self.close()
+        return None
+
+
+class WordComRenderer(_OfficeComRenderer):
+    """Microsoft Word automation through COM; Windows only."""
+
+    name = "word"
+    PROG_ID = "Word.Application"
+    SUPPORTED_EXTENSIONS = {'.docx', '.doc', '.dotx', '.dot', '.rtf'}
+
+    def _export(self, source_path, pdf_path):
+        doc = self._app.Documents.Open(source_path, ReadOnly=True, AddToRecentFiles=False)
+        try:
+            doc.ExportAsFixedFormat(pdf_path, WD_EXPORT_FORMAT_PDF)
+        finally:
+            doc.Close(SaveChanges=False)
+
+
+class ExcelComRenderer(_OfficeComRenderer):
+    """Microsoft Excel automation through COM; Windows only."""
+
+    name = "excel"
+    PROG_ID = "Excel.Application"
+    SUPPORTED_EXTENSIONS = {'.xlsx', '.xls'}
+
+    def open(self):
+        super().open()
+        self._app.EnableEvents = False
+
+    def _export(self, source_path, pdf_path):
+        workbook = self._app.Workbooks.Open(source_path, UpdateLinks=False, ReadOnly=True)
+        try:
+            workbook.ActiveSheet.ExportAsFixedFormat(XL_TYPE_PDF, pdf_path)
+        finally:
+            workbook.Close(SaveChanges=False)
+
+
+# Backends in order of preference when none is configured
+RENDERERS = {
+    LibreOfficeRenderer.name: LibreOfficeRenderer,
+    WordComRenderer.name: WordComRenderer,
+    ExcelComRenderer.name: ExcelComRenderer,
+}
+
+
+def get_renderer_class(name=None, file_path=None):
+    """
+    Choose a renderer backend.
+
+    Args:
+        name: Backend name; defaults to the DOCUMENT_RENDERER environment variable,
+              otherwise the first available backend
+        file_path: If given, only backends that support this file type are considered
+
+    Returns:
+        A DocumentRenderer subclass, or None if no backend is available
+    """
+    name = (name or os.environ.get('DOCUMENT_RENDERER', '')).lower()
+    if name:
+        candidates = [RENDERERS[name]] if name in RENDERERS else []
+        if not candidates:
+            logger.error(f"Unknown document renderer: {name}")
+    else:
+        candidates = list(RENDERERS.values())
+
+    for renderer_class in candidates:
+        if file_path and not renderer_class.supports(file_path):
+            continue
+        if renderer_class.is_available():
+            return renderer_class
+    return None
+
+
+def pdf_to_png_pages(pdf_path, max_pages=1, zoom=None):
+    """Rasterise the first pages of a PDF to PNG bytes (zoom defaults to render_zoom per page)."""
+    import fitz  # PyMuPDF
+
+    pages = []
+    with fitz.open(pdf_path) as pdf_document:
+        for page_num in range(min(max_pages, len(pdf_document))):
+            page = pdf_document[page_num]
+            page_zoom = zoom or render_zoom(page.rect.width, page.rect.height)
+            pages.append(page.get_pixmap(matrix=fitz.Matrix(page_zoom, page_zoom)).tobytes("png"))
+    return pages
+
+
+def render_pages(renderer, file_path, max_pages=1, zoom=None):
+    """
+    Render a document to PNG page images (document -> PDF -> PNG).
+
+    Returns:
+        List of PNG bytes, one per page; empty if rendering failed
+    """
+    output_dir = tempfile.mkdtemp(prefix="render_")
+    try:
+        pdf_path = renderer.to_pdf(file_path, output_dir)
+        if not pdf_path:
+            return []
+        return pdf_to_png_pages(pdf_path, max_pages=max_pages, zoom=zoom)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
@@ -1,35 +1,46 @@
 import os
 import tempfile
+import shutil
 import re
-import time
+import io
+import base64
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from docx import Document
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml import parse_xml
 from docx.oxml.ns import nsdecls
 from docx.shared import Pt
-from dotenv import load_dotenv
-import pythoncom
+
+from .openai_client import chat_completion
+from .instrumentation import track_stage, track, submit_with_context, record_value
+from .converter_pool import get_converter_pool
+from .image_budget import ImageBudget, EMBED_WIDTH_INCHES, EMBED_HEIGHT_INCHES
+from .response_document import ResponseDocument, Heading, TextLine, Table
+from .evidence_index import get_evidence_index
+from .template_analyzer import CompiledTemplate
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-load_dotenv(".env")
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
-
 
 class ReportGenerator:
     """Generate audit reports with evidence images and score-based checkmark placement."""
     
+    # Maximum number of vision extraction requests in flight at once
+    VISION_MAX_CONCURRENCY = int(os.getenv('OPENAI_VISION_CONCURRENCY', 4))
+    
+    # Per-request timeout in seconds for vision extraction
+    VISION_REQUEST_TIMEOUT = float(os.getenv('OPENAI_VISION_TIMEOUT', 60))
+    
     def __init__(self):
         """Initialize the ReportGenerator."""
         self.evidence_images = {}
+        self.evidence_index = get_evidence_index(())
         self.evidence_metadata = {}
         self.preprocessor = None
-        self.image_paths = []
-        self.report_images_dir = None
+        self.image_budget = ImageBudget()
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.process_list = []
         self.used_evidence = set()
@@ -43,19 +54,28 @@ class ReportGenerator:
             evidence_metadata: Dictionary with score and category information
         """
         self.evidence_images = evidence_images
+        self.evidence_index = get_evidence_index(evidence_images)
         self.evidence_metadata = evidence_metadata or {}
     
     def set_preprocessor(self, preprocessor):
         """Set the response preprocessor instance."""
         self.preprocessor = preprocessor
 
-    def clean_audit_data(self, raw_text: str):
-        import re
-        import logging
-        logger = logging.getLogger(__name__)
+    def clean_audit_data(self, report_content):
+        """
+        Split the report content into the header, legend, process table and footer fields.
         
-        lines = raw_text.strip("`").splitlines()
-        logger.info(f"UNCLEANED:{lines}")
+        Args:
+            report_content: Preprocessed response as a ResponseDocument, or markdown text
+        
+        Returns:
+            [{"header": {...}, "legend": {...}}, {"body": [row, ...]}, {"footer": {...}}]
+        """
+        if isinstance(report_content, ResponseDocument):
+            document = report_content
+        else:
+            document = ResponseDocument.parse(report_content.strip("`"))
+        logger.debug(f"Cleaning report content with {len(document.blocks)} blocks")
 
         result = [
             {"header": {}, "legend": {}},
@@ -70,74 +90,76 @@ class ReportGenerator:
         in_final_comments = False
         final_comments_text = []
 
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("```"):
-                continue
-                
-            # Handle section headers and separators
-            if line.startswith("# ") or line == "|---|---|":
-                continue
-                
-            # Special handling for AUDIT REPORT FINAL COMMENTS section
-            if line == "## AUDIT REPORT FINAL COMMENTS":
-                in_final_comments = True
-                section = "footer"
+        def collect_final_comment(line):
+            """Add a line to the final comments; returns False at the signature block."""
+            nonlocal in_final_comments
+            if "Internal Auditor" in line:
+                if final_comments_text:  # Only add if we have content
+                    result[2]["footer"]["AUDIT REPORT FINAL COMMENTS"] = "\n".join(final_comments_text)
+                in_final_comments = False
+                return False
+            if line and not line.startswith("```"):
+                final_comments_text.append(line)
+            return True
+
+        for block in document.blocks:
+            if isinstance(block, Heading):
+                # Special handling for AUDIT REPORT FINAL COMMENTS section
+                if block.text.upper() == "AUDIT REPORT FINAL COMMENTS":
+                    in_final_comments = True
+                    section = "footer"
+                elif in_final_comments and block.level > 1:
+                    collect_final_comment(block.render_lines()[0])
                 continue
-                
-            if in_final_comments:
-                # Check if we've reached the signature block at the end
-                if "Internal Auditor" in line:
-                    if final_comments_text:  # Only add if we have content
-                        result[2]["footer"]["AUDIT REPORT FINAL COMMENTS"] = "\n".join(final_comments_text)
-                    in_final_comments = False
-                    continue
-                
-                # Collect final comments text
-                if line:  # Only add non-empty lines
-                    final_comments_text.append(line)
+
+            if isinstance(block, TextLine):
+                # Outside the final comments only table rows carry fields
+                if in_final_comments:
+                    collect_final_comment(block.text.strip())
                 continue
 
-            parts = [p.strip() for p in line.strip("|").split("|")]
+            for parts in block.rows:
+                if in_final_comments and collect_final_comment(Table.render_row(parts)):
+                    continue
 
-            # Handle Legend
-            if section == "header" and len(parts) == 2 and parts[0] in legend_keys:
-                result[0]["legend"][parts[0]] = parts[1]
-                section = "legend"
-                continue
+                # Handle Legend
+                if section == "header" and len(parts) == 2 and parts[0] in legend_keys:
+                    result[0]["legend"][parts[0]] = parts[1]
+                    section = "legend"
+                    continue
 
-            # Handle Process Table Header
-            if len(parts) == 7 and parts[0].upper() == "PROCESS":
-                process_headers = parts
-                process_table_active = True
-                section = "body"
-                continue
+                # Handle Process Table Header
+                if len(parts) == 7 and parts[0].upper() == "PROCESS":
+                    process_headers = parts
+                    process_table_active = True
+                    section = "body"
+                    continue
 
-            # Handle Process Table Rows
-            if process_table_active and len(parts) == 7:
-                process_data = {}
-                for idx, key in enumerate(process_headers):
-                    val = parts[idx].strip()
-                    if key.upper().startswith("PROCESS"):
-                        val = re.sub(r"^Process:\s*", "", val, flags=re.I)
-                        key = "PROCESS"
-                    elif key.upper().startswith("SIGHTED"):
-                        val = re.sub(r"^Evidence:\s*", "", val, flags=re.I)
-                        key = "SIGHTED EVIDENCE"
-                    process_data[key.strip()] = val
-                result[1]["body"].append(process_data)
-                continue
+                # Handle Process Table Rows
+                if process_table_active and len(parts) == 7:
+                    process_data = {}
+                    for idx, key in enumerate(process_headers):
+                        val = parts[idx].replace("\n", "<br>")
+                        if key.upper().startswith("PROCESS"):
+                            val = re.sub(r"^Process:\s*", "", val, flags=re.I)
+                            key = "PROCESS"
+                        elif key.upper().startswith("SIGHTED"):
+                            val = re.sub(r"^Evidence:\s*", "", val, flags=re.I)
+                            key = "SIGHTED EVIDENCE"
+                        process_data[key.strip()] = val
+                    result[1]["body"].append(process_data)
+                    continue
 
-            # Handle Key:Value pairs
-            if len(parts) == 2:
-                key, val = parts
-                if section == "header":
-                    result[0]["header"][key] = val
-                elif section in {"legend", "body"}:
-                    section = "footer"
-                    result[2]["footer"][key] = val
-                elif section == "footer":
-                    result[2]["footer"][key] = val
+                # Handle Key:Value pairs
+                if len(parts) == 2:
+                    key, val = parts[0], parts[1].replace("\n", "<br>")
+                    if section == "header":
+                        result[0]["header"][key] = val
+                    elif section in {"legend", "body"}:
+                        section = "footer"
+                        result[2]["footer"][key] = val
+                    elif section == "footer":
+                        result[2]["footer"][key] = val
 
         # Remove empty PROCESS rows
         cleaned_body = []
@@ -192,18 +214,37 @@ class ReportGenerator:
 
         return result
     
+    @track_stage("fill_template")
     def fill_template_document(self, template_path, report_content, auditor_name=""):
-        """Fill the template document with the report content including evidence images."""
+        """
+        Fill the template document with the report content including evidence images.
+        
+        Args:
+            template_path: CompiledTemplate from TemplateAnalyzer.compile_template, or the
+                           path of the Word template
+            report_content: Preprocessed response; pass ResponsePreprocessor.document
+                            to reuse its parsed model, or markdown text
+            auditor_name: Auditor name written into the report
+        """
         try:
-            # Load the template document
-            doc = Document(template_path)
+            # Load a fresh copy of the compiled template
+            if isinstance(template_path, CompiledTemplate):
+                template = template_path
+            else:
+                template = CompiledTemplate.load(template_path)
+            doc = template.new_document()
             
             # Clean the data
             # logger.info(f"UNCLEAN DATA:{report_content}")
             cleaned_data = self.clean_audit_data(report_content)
             
             # Process the document sections and insert evidence
-            self._process_document(doc, cleaned_data, auditor_name)
+            self._process_document(doc, cleaned_data, auditor_name, template)
+            
+            image_stats = self.image_budget.stats()
+            record_value("embedded_images", image_stats)
+            logger.info(f"Embedded {image_stats['images']} evidence images ({image_stats['unique_images']} unique): "
+                        f"{image_stats['bytes_before'] // 1024} KB -> {image_stats['bytes_after'] // 1024} KB")
             
             return doc
         except Exception as e:
@@ -212,36 +253,31 @@ class ReportGenerator:
     
  
 
-    def _fill_header_table(self, table, header_content):
-        """Fill the header table with content."""
+    def _fill_header_table(self, table, header_content, header_fields):
+        """Fill the header table with content, addressing rows by the compiled field coordinates."""
         if not table:
             return
-            
-        for row in table.rows:
-            if len(row.cells) >= 2:
-                field_name = row.cells[0].text.strip()
-                if field_name in header_content:
-                    row.cells[1].text = header_content[field_name]
+        
+        rows = table.rows
+        for field_name, row_indices in header_fields.items():
+            if field_name in header_content:
+                for row_idx in row_indices:
+                    rows[row_idx].cells[1].text = header_content[field_name]
 
 
-    def _process_document(self, doc, content_sections, auditor_name):
+    def _process_document(self, doc, content_sections, auditor_name, template):
         """Process all document sections and insert evidence in a single consolidated approach."""
-        # Setup temp directory for images if needed
-        if self.evidence_images and not self.report_images_dir:
-            self.report_images_dir = os.path.join(tempfile.gettempdir(), f"report_images_{int(time.time())}")
-            os.makedirs(self.report_images_dir, exist_ok=True)
         
         # logger.info(f"All image:{self.evidence_images} DATA:{content_sections}")
         # Extract the tables
-        tables = doc.tables
-        if len(tables) < 4:
+        if not template.has_report_tables:
             logger.error("Document doesn't have the expected table structure")
             return
-            
-        header_table = tables[0]
-        legend_table = tables[1]
-        evidence_table = tables[2]
-        findings_table = tables[3]
+        
+        tables = doc.tables
+        header_table = tables[template.HEADER_TABLE]
+        evidence_table = tables[template.EVIDENCE_TABLE]
+        findings_table = tables[template.FINDINGS_TABLE]
         
         # Extract content from the clean structure
         header_content, legend_content, body_content, footer_content = {}, {}, [], {}
@@ -263,13 +299,13 @@ class ReportGenerator:
                         footer_content.pop(key)
         
         # 1. Fill the header table
-        self._fill_header_table(header_table, header_content)
+        self._fill_header_table(header_table, header_content, template.header_fields)
         
         # 2. Preprocess body_content to handle Excel files with multiple entries
         consolidated_content = self._consolidate_excel_entries(body_content)
         
         # 3. Fill the evidence table with consolidated entries
-        nc_ofi_comments = self._fill_evidence_table(evidence_table, consolidated_content)
+        nc_ofi_comments = self._fill_evidence_table(evidence_table, consolidated_content, template.evidence_rows)
         
         # 4. Update footer content with collected NC/OFI comments
         if nc_ofi_comments['NC']:
@@ -283,7 +319,7 @@ class ReportGenerator:
             footer_content['OPPORTUNITIES FOR IMPROVEMENTS'] = 'Nil'
         
         # 5. Fill the findings table
-        self._fill_findings_table(findings_table, footer_content, auditor_name)
+        self._fill_findings_table(findings_table, footer_content, auditor_name, template.findings_fields)
 
     def _consolidate_excel_entries(self, body_content):
         """Consolidate multiple entries with the same evidence file (especially Excel files)."""
@@ -340,17 +376,15 @@ class ReportGenerator:
         
         return consolidated_entries
 
-    def _fill_evidence_table(self, table, body_content):
+    def _fill_evidence_table(self, table, body_content, evidence_rows):
         """Fill the evidence table with content and process images in one pass.
+        The compiled template's skeleton already has the evidence rows cleared;
+        evidence_rows holds the cell count of each of them.
         Returns collected NC/OFI comments to be added to the footer."""
-        if not table or len(table.rows) <= 1:
+        if not table or not evidence_rows:
             return {'NC': [], 'OFI': []}
-            
-        # Clear all rows first
-        for row_idx in range(1, len(table.rows)):
-            row = table.rows[row_idx]
-            for cell_idx in range(len(row.cells)):
-                row.cells[cell_idx].text = ""
+        
+        rows = table.rows
         
         # Extract image text content once (avoid repeated calls)
         image_text_data = self._extract_image_text_content() if self.evidence_images else {}
@@ -365,12 +399,12 @@ class ReportGenerator:
         
         # Process each row
         for idx, entry in enumerate(body_content):
-            if idx + 1 >= len(table.rows):  # Check bounds
+            if idx >= len(evidence_rows):  # Check bounds
                 break
-                    
-            row = table.rows[idx + 1]
-            if len(row.cells) < 7:  # Ensure we have all needed cells
+            
+            if evidence_rows[idx] < 7:  # Ensure we have all needed cells
                 continue
+            row = rows[idx + 1]
                     
             # Get process and evidence data
             process_name = entry.get('PROCESS', '')
@@ -435,22 +469,19 @@ class ReportGenerator:
         # Add extracted text data if available
         if evidence_file.lower().endswith(('.xlsx', '.xls')):
             # For Excel files, collect all customer data entries
-            for key, val in image_text_data.items():
-                # Look for matching evidence file
-                if evidence_file.lower() in key.lower() or key.split(".")[0].lower() in evidence_file.lower():
-                    excel_data.append(val)
+            for key in self.evidence_index.related_files(evidence_file):
+                if key in image_text_data:
+                    excel_data.append(image_text_data[key])
             
             # Add consolidated Excel data if we found any
             if excel_data:
                 process_cell_content += f"\n\nEvidence Data:\n" + "\n\n".join(excel_data)
                 logger.info(f"Added Excel data for {evidence_file}")
         else:
-            # For non-Excel files, just add the matching data
-            for key, val in image_text_data.items():
-                process_extract = key.split(".")[0]
-                evidence = evidence_file.split(".")[0]
-                if process_extract == evidence or process_extract == process_name:
-                    process_cell_content += f"\n\nEvidence Data:\n{val}"
+            # For non-Excel files, just add the data of files with the same stem
+            for key in self.evidence_index.files_with_stem(evidence_file.split(".")[0], process_name):
+                if key in image_text_data:
+                    process_cell_content += f"\n\nEvidence Data:\n{image_text_data[key]}"
                     logger.info(f"Added data for File:{evidence_file} Process:{process_name}")
         
         # Add to process list if not already there
@@ -527,28 +558,20 @@ class ReportGenerator:
         img_data = img_data_list[0]  # Use the first image in the list
         
         try:
-            # Create image file
-            ext = img_data.get('format', 'png').lower()
-            image_filename = f"evidence_{os.path.basename(file_name)}.{ext}"
-            image_path = os.path.join(self.report_images_dir, image_filename)
-            
-            # Write image to file
-            with open(image_path, 'wb') as img_file:
-                img_file.write(img_data['data'])
-            
-            # Save path to prevent garbage collection
-            self.image_paths.append(image_path)
+            # Downscale and recompress to the display size; identical images share one encoding
+            image_bytes, _ = self.image_budget.prepare(img_data['data'], img_data.get('format', 'png').lower())
             
             # Add image to cell with consistent size
             paragraph = cell.add_paragraph()
             run = paragraph.add_run()
             
-            width_inches = 2.0
-            height_inches = 1.5
+            width_inches = EMBED_WIDTH_INCHES
+            height_inches = EMBED_HEIGHT_INCHES
             width_emu = int(width_inches * 914400)  # 1 inch = 914400 EMUs
             height_emu = int(height_inches * 914400)
             
-            run.add_picture(image_path, width=width_emu, height=height_emu)
+            # python-docx keys image parts by content hash, so repeated images share one part
+            run.add_picture(io.BytesIO(image_bytes), width=width_emu, height=height_emu)
             
             # Add caption
             caption = cell.add_paragraph()
@@ -612,35 +635,33 @@ class ReportGenerator:
         if comment and category in ['OFI', 'NC'] and comments_idx < len(row.cells) and not row.cells[comments_idx].text.strip():
             row.cells[comments_idx].text = comment
     
-    def _fill_findings_table(self, table, footer_content, auditor_name):
+    def _fill_findings_table(self, table, footer_content, auditor_name, findings_fields):
+        """Fill the findings table with content, addressing rows by the compiled field coordinates."""
         logger.info(f'COMMENTS: {footer_content}')
 
-        """Fill the findings table with content."""
         if not table:
             return
-    
         
-        # Use exactly the same logic as the old method that works well
-        for row in table.rows:
-            if len(row.cells) >= 2:
-                field_name = row.cells[0].text.strip()
-                content = next((v for k, v in footer_content.items() if field_name.startswith(k)), None)
-
-                if content is not None:
-                    content = content.replace("<br>", "\n")
-                    row.cells[1].text = content
-                if 'AUDIT REPORT FINAL COMMENTS' in field_name:
-                    existing_text = row.cells[1].text
-                    if existing_text and existing_text.__len__() > 5:
-                        row.cells[1].text = existing_text
-                    else:
-                        row.cells[1].text = ''
-                        row.cells[1].text = (
-                            f"{existing_text}\n\n"
-                            f"{auditor_name if auditor_name else 'INTERNAL AUDITOR'}"
-                            f"{' INTERNAL AUDITOR' if auditor_name else ''}\n"
-                            f"{datetime.now().strftime('%d/%m/%Y')}"
-                        )
+        rows = table.rows
+        for row_idx, field_name in findings_fields:
+            row = rows[row_idx]
+            content = next((v for k, v in footer_content.items() if field_name.startswith(k)), None)
+
+            if content is not None:
+                content = content.replace("<br>", "\n")
+                row.cells[1].text = content
+            if 'AUDIT REPORT FINAL COMMENTS' in field_name:
+                existing_text = row.cells[1].text
+                if existing_text and existing_text.__len__() > 5:
+                    row.cells[1].text = existing_text
+                else:
+                    row.cells[1].text = ''
+                    row.cells[1].text = (
+                        f"{existing_text}\n\n"
+                        f"{auditor_name if auditor_name else 'INTERNAL AUDITOR'}"
+                        f"{' INTERNAL AUDITOR' if auditor_name else ''}\n"
+                        f"{datetime.now().strftime('%d/%m/%Y')}"
+                    )
 
 
 
@@ -684,39 +705,12 @@ class ReportGenerator:
             # Fallback to simple format
             cell.text = f"{content}\n\n{auditor_name if auditor_name else 'Internal Auditor'}\n{datetime.now().strftime('%d/%m/%Y')}"
     
-    def _extract_image_text_content(self):
-        """Extract text content from evidence images using GPT-4o Vision."""
-        if not self.evidence_images or not self.openai_api_key:
-            return {}
-            
-        extracted_contents = {}
-        
-        try:
-            import openai
-            client = openai.OpenAI(api_key=self.openai_api_key)
-            
-            for evidence_file, images in self.evidence_images.items():
-                if not images:
-                    continue
-                
-                # Check if this is an Excel file - handle differently
-                is_excel = evidence_file.lower().endswith(('.xlsx', '.xls'))
-                
-                # Specific prompt for different file types    
-                system_prompt = """You are an expert at extracting customer feedback data. 
-                Extract ONLY the following key fields in this EXACT format:
-                
-                **Customer:** [Customer Name]
-                **Date:** [Date in DD/MM/YYYY format]
-                **Score:** [Total Score, format as X/Y]  
-                **Comments:** [Brief summary of key comments]
-                
-                If you cannot find one of these fields, leave it blank but maintain the format.
-                Be concise and precise."""
-                
-                # Different prompt for Excel files
-                if is_excel:
-                    system_prompt = """You are an expert at extracting data from customer feedback spreadsheets. 
+    @staticmethod
+    def _vision_system_prompt(is_excel):
+        """Get the vision extraction system prompt for an evidence file type."""
+        # Different prompt for Excel files
+        if is_excel:
+            return """You are an expert at extracting data from customer feedback spreadsheets. 
                     This image contains a spreadsheet with multiple customer feedback entries.
                     
                     Extract data for ALL VISIBLE customers in the image, with each customer's data in this format:
@@ -736,52 +730,97 @@ class ReportGenerator:
                     Present each customer as a separate entry with a blank line between entries.
                     If data for any field is missing, leave it blank but maintain the format.
                     Be concise and precise."""
-                    
-                try:
-                    # Use first image
-                    img_data = images[0]
-                    
-                    # Convert to Base64
-                    import base64
-                    base64_image = base64.b64encode(img_data['data']).decode('utf-8')
-                    
-                    # Create prompt for GPT-4o Vision
-                    messages = [
+        
+        # Specific prompt for different file types    
+        return """You are an expert at extracting customer feedback data. 
+                Extract ONLY the following key fields in this EXACT format:
+                
+                **Customer:** [Customer Name]
+                **Date:** [Date in DD/MM/YYYY format]
+                **Score:** [Total Score, format as X/Y]  
+                **Comments:** [Brief summary of key comments]
+                
+                If you cannot find one of these fields, leave it blank but maintain the format.
+                Be concise and precise."""
+    
+    def _extract_single_image_text(self, evidence_file, images):
+        """Extract text from the first image of one evidence file with GPT-4o Vision."""
+        # Check if this is an Excel file - handle differently
+        is_excel = evidence_file.lower().endswith(('.xlsx', '.xls'))
+        
+        try:
+            # Use first image
+            img_data = images[0]
+            
+            # Convert to Base64
+            base64_image = base64.b64encode(img_data['data']).decode('utf-8')
+            
+            # Create prompt for GPT-4o Vision
+            messages = [
+                {
+                    "role": "system",
+                    "content": self._vision_system_prompt(is_excel)
+                },
+                {
+                    "role": "user",
+                    "content": [
                         {
-                            "role": "system",
-                            "content": system_prompt
+                            "type": "text",
+                            "text": f"Extract the [customer feedback data] / [data process] from this {'spreadsheet' if is_excel else 'image'}."
                         },
                         {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": f"Extract the [customer feedback data] / [data process] from this {'spreadsheet' if is_excel else 'image'}."
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/{img_data.get('format', 'png')};base64,{base64_image}"
-                                    }
-                                }
-                            ]
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/{img_data.get('format', 'png')};base64,{base64_image}"
+                            }
                         }
                     ]
-                    
-                    # Call the API
-                    response = client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=messages,
-                        max_tokens=1000  # Increased for Excel files with multiple entries
-                    )
-                    
-                    # Extract the content
-                    extracted_text = response.choices[0].message.content
-                    extracted_contents[evidence_file] = extracted_text
-                    logger.info(f"Successfully extracted text from {os.path.basename(evidence_file)}")
-                    
-                except Exception as e:
-                    logger.error(f"Error extracting from {evidence_file}: {str(e)}")
+                }
+            ]
+            
+            # Call the API (the shared client pools connections across threads)
+            with track("vision_extraction.file", file=os.path.basename(evidence_file)):
+                extracted_text = chat_completion(
+                    model="gpt-4o",
+                    messages=messages,
+                    max_tokens=1000,  # Increased for Excel files with multiple entries
+                    timeout=self.VISION_REQUEST_TIMEOUT
+                )
+            logger.info(f"Successfully extracted text from {os.path.basename(evidence_file)}")
+            return extracted_text
+            
+        except Exception as e:
+            logger.error(f"Error extracting from {evidence_file}: {str(e)}")
+            return None
+    
+    @track_stage("vision_extraction")
+    def _extract_image_text_content(self):
+        """Extract text content from evidence images using GPT-4o Vision, several files at a time."""
+        if not self.evidence_images or not self.openai_api_key:
+            return {}
+            
+        extracted_contents = {}
+        
+        try:
+            evidence_items = [(evidence_file, images) for evidence_file, images in self.evidence_images.items() if images]
+            if not evidence_items:
+                return {}
+            
+            # The pool size bounds the number of vision requests in flight
+            results = {}
+            max_workers = max(1, min(self.VISION_MAX_CONCURRENCY, len(evidence_items)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    submit_with_context(executor, self._extract_single_image_text, evidence_file, images): evidence_file
+                    for evidence_file, images in evidence_items
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            
+            # Keep the evidence file order so downstream matching behaves as before
+            for evidence_file, _ in evidence_items:
+                if results.get(evidence_file) is not None:
+                    extracted_contents[evidence_file] = results[evidence_file]
                     
         except Exception as e:
             logger.error(f"Error setting up image extraction: {str(e)}")
@@ -905,134 +944,20 @@ class ReportGenerator:
             return False
         
     def _match_evidence_to_process(self, process_name, evidence_file):
-        """Find the most relevant evidence file for a process."""
-        if not self.evidence_images:
-            return None
-            
-        evidence_files = list(self.evidence_images.keys())
-        if not evidence_files:
-            return None
-            
-        # First try: Match based on exact evidence file name
-        if evidence_file:
-            for file in evidence_files:
-                if file in self.used_evidence:
-                    continue
-                
-                # Check if the evidence file name is contained in the full file path
-                if evidence_file.lower() in os.path.basename(file).lower():
-                    self.used_evidence.add(file)
-                    return file
-        
-        # Extract keywords from process text
-        process_keywords = set()
-        if process_name:
-            process_keywords = set(process_name.lower().replace('.', ' ').replace('_', ' ').replace('-', ' ').split())
-        
-        evidence_keywords = set()
-        if evidence_file:
-            evidence_keywords = set(evidence_file.lower().replace('.', ' ').replace('_', ' ').replace('-', ' ').split())
-        
-        # Second try: Look for keyword overlap with both process and evidence name
-        for file in evidence_files:
-            if file in self.used_evidence:
-                continue
-                
-            file_base = os.path.basename(file).lower()
-            file_keywords = set(file_base.replace('.', ' ').replace('_', ' ').replace('-', ' ').split())
-            
-            # Check for keyword overlap with process or evidence name
-            if (process_keywords and process_keywords.intersection(file_keywords)) or (evidence_keywords and evidence_keywords.intersection(file_keywords)):
-                self.used_evidence.add(file)
-                return file
-        
-        # Third try: Look for any keyword match
-        for file in evidence_files:
-            if file in self.used_evidence:
-                continue
-                
-            file_base = os.path.basename(file).lower()
-            
-            for keyword in process_keywords.union(evidence_keywords):
-                if keyword in file_base and len(keyword) > 2:  # Only match on meaningful keywords
-                    self.used_evidence.add(file)
-                    return file
-        
-        # Final try: Just use any unused file
-        for file in evidence_files:
-            if file not in self.used_evidence:
-                self.used_evidence.add(file)
-                return file
-        
-        # If all files are used, return the first one that best matches
-        # Score each file for relevance
-        best_score = -1
-        best_file = None
-        
-        for file in evidence_files:
-            file_base = os.path.basename(file).lower()
-            file_keywords = set(file_base.replace('.', ' ').replace('_', ' ').replace('-', ' ').split())
-            
-            # Calculate score based on keyword overlap
-            score = len(process_keywords.intersection(file_keywords)) + len(evidence_keywords.intersection(file_keywords))
-            
-            # Bonus for exact matches
-            if process_name and process_name.lower() in file_base:
-                score += 10
-            if evidence_file and evidence_file.lower() in file_base:
-                score += 10
-                
-            if score > best_score:
-                best_score = score
-                best_file = file
-        
-        # If we found a good match, use it even if used before
-        if best_file and best_score > 0:
-            return best_file
-            
-        # Otherwise, just return the first file
-        return evidence_files[0] if evidence_files else None
+        """Find the most relevant evidence file for a process, preferring files not used yet."""
+        return self.evidence_index.match_process(process_name, evidence_file, self.used_evidence)
 
     def _convert_to_pdf(self, docx_path, pdf_path):
-        """Convert DOCX to PDF using available methods."""
-        # Method 1: Try with win32com (Windows only)
+        """Convert DOCX to PDF with the shared converter pool."""
+        output_dir = tempfile.mkdtemp()
         try:
-            import win32com.client
-            pythoncom.CoInitialize()
-            
-            # Initialize Word
-            word = win32com.client.Dispatch("Word.Application")
-            word.Visible = False
-            
-            try:
-                # Open document and save as PDF
-                doc = word.Documents.Open(os.path.abspath(docx_path))
-                doc.SaveAs(os.path.abspath(pdf_path), FileFormat=17)  # 17 = PDF
-                doc.Close()
-                word.Quit()
-                
-                if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-                    return True
-            finally:
-                try:
-                    word.Quit()
-                except:
-                    pass
-                pythoncom.CoUninitialize()
-                
-        except Exception as e:
-            logger.warning(f"Error using win32com for PDF conversion: {str(e)}")
-        
-        # Method 2: Try with docx2pdf if available
-        try:
-            from docx2pdf import convert
-            convert(docx_path, pdf_path)
-            if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-                return True
-        except ImportError:
-            logger.info("docx2pdf not available")
+            converted_path = get_converter_pool().convert_to_pdf(docx_path, output_dir)
+            if not converted_path:
+                return False
+            shutil.move(converted_path, pdf_path)
+            return os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0
         except Exception as e:
-            logger.warning(f"Error using docx2pdf: {str(e)}")
-        
-        # No methods succeeded
-        return False
\ No newline at end of file
+            logger.warning(f"Error converting {docx_path} to PDF: {str(e)}")
+            return False
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
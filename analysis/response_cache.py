@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+
+from .evidence_cache import user_cache_dir, ensure_private_dir
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# ------- Response Cache Module -------
+class ResponseCache:
+    """Interface for caches of OpenAI responses keyed by the request parameters."""
+
+    @staticmethod
+    def make_key(model, temperature, max_tokens, messages):
+        """Build a cache key from the model, sampling settings and a hash of the messages."""
+        messages_hash = hashlib.sha256(
+            json.dumps(messages, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        return f"{model}|{temperature}|{max_tokens}|{messages_hash}"
+
+    def get(self, key):
+        """Return the cached response for a key, or None on a miss."""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        """Store a response for a key."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every cached response."""
+        raise NotImplementedError
+
+
+class NullResponseCache(ResponseCache):
+    """Cache that never stores anything, used to bypass caching."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk response cache backed by SQLite with TTL and size-based eviction."""
+
+    DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, db_path=None, ttl_seconds=None, max_bytes=None):
+        """Initialize the cache database."""
+        if not db_path:
+            # The default lives in a directory only this user can read or replace
+            db_path = os.path.join(ensure_private_dir(user_cache_dir()), "responses.sqlite3")
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else self.DEFAULT_TTL_SECONDS
+        self.max_bytes = max_bytes if max_bytes is not None else self.DEFAULT_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        """Open a connection; one per operation keeps the cache safe across threads."""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, key):
+        """Return the cached response for a key, or None if missing or expired."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value FROM responses WHERE key = ? AND created >= ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            row = None
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def set(self, key, value):
+        """Store a response and evict expired or least recently used entries."""
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+    def _evict(self, conn, now):
+        """Drop expired entries, then the least recently used ones until under the size limit."""
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Return the hit and miss counters."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+_active_cache = None
+_active_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the response cache used for OpenAI calls, configured from the environment."""
+    global _active_cache
+    with _active_cache_lock:
+        if _active_cache is None:
+            if os.environ.get('OPENAI_RESPONSE_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes'):
+                _active_cache = NullResponseCache()
+            else:
+                ttl_hours = os.environ.get('OPENAI_RESPONSE_CACHE_TTL_HOURS')
+                max_mb = os.environ.get('OPENAI_RESPONSE_CACHE_MAX_MB')
+                try:
+                    _active_cache = SQLiteResponseCache(
+                        db_path=os.environ.get('OPENAI_RESPONSE_CACHE_PATH'),
+                        ttl_seconds=float(ttl_hours) * 3600 if ttl_hours else None,
+                        max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None
+                    )
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"Response cache unavailable, caching disabled: {str(e)}")
+                    _active_cache = NullResponseCache()
+        return _active_cache
+
+
+def set_response_cache(cache):
+    """Replace the response cache, e.g. with NullResponseCache() to bypass caching."""
+    global _active_cache
+    with _active_cache_lock:
+        _active_cache = cache
@@ -0,0 +1,228 @@
+import re
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Markdown heading: one to six '#' followed by the heading text
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*)$')
+
+
+
+def split_table_row(line):
+    """Split a stripped markdown table line into trimmed cell texts."""
+    inner = line[1:]
+    if inner.endswith('|'):
+        inner = inner[:-1]
+    return [cell.strip() for cell in inner.split('|')]
+
+
+def is_separator_row(line):
+    """Return True for a table separator line such as |---|:---:|."""
+    return '-' in line and not line.strip('|:- \t')
+
+
+# ------- Response Document Module -------
+class Heading:
+    """Markdown heading, e.g. '## AUDIT REPORT FINAL COMMENTS'."""
+
+    __slots__ = ('level', 'text')
+
+    def __init__(self, level, text):
+        """Initialize the heading."""
+        self.level = level
+        self.text = text
+
+    def render_lines(self):
+        return ['#' * self.level + ' ' + self.text]
+
+
+class TextLine:
+    """Line of prose, list item or blank line, kept verbatim."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        """Initialize the line."""
+        self.text = text
+
+    def render_lines(self):
+        return [self.text]
+
+
+class Table:
+    """
+    Markdown table; rows[0] is the header row.
+
+    Cells hold plain text. A cell may contain newlines, which are written as
+    <br> so the row stays on one line.
+    """
+
+    __slots__ = ('rows', 'separator')
+
+    def __init__(self, header):
+        """Initialize the table with its header row."""
+        self.rows = [header]
+        self.separator = None  # Separator cells as written, None for the standard |---|
+
+    @property
+    def header(self):
+        return self.rows[0]
+
+    @property
+    def body(self):
+        """Rows below the header."""
+        return self.rows[1:]
+
+    @property
+    def columns(self):
+        """Lower-cased header texts."""
+        return [cell.lower() for cell in self.header]
+
+    def column_index(self, name):
+        """Index of the column whose lower-cased header is name, or -1."""
+        columns = self.columns
+        return columns.index(name) if name in columns else -1
+
+    @property
+    def is_process_table(self):
+        """True for the process / sighted evidence table."""
+        columns = self.columns
+        return 'process' in columns and 'sighted evidence' in columns
+
+    @staticmethod
+    def render_row(cells):
+        return '|' + '|'.join(cell.replace('\n', '<br>') for cell in cells) + '|'
+
+    def render_lines(self):
+        separator = self.separator or ['---'] * len(self.header)
+        return [self.render_row(self.header), self.render_row(separator)] + [self.render_row(row) for row in self.body]
+
+
+class ResponseDocument:
+    """
+    Typed model of a markdown AI response: a flat list of Heading, TextLine
+    and Table blocks built in a single pass over the text.
+
+    The preprocessing stages and the report generator work on this model
+    instead of re-splitting and re-scanning the response text.
+    """
+
+    def __init__(self, blocks=None):
+        """Initialize the document from a list of blocks."""
+        self.blocks = blocks or []
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parse a markdown response in one linear pass.
+
+        Table lines have their cells trimmed, separator rows are recognised and
+        a table ends at the first line that does not start with '|'.
+
+        Args:
+            text: Response text
+
+        Returns:
+            ResponseDocument
+        """
+        blocks = []
+        table = None
+
+        for line in text.split('\n'):
+            stripped = line.strip()
+
+            if stripped.startswith('|'):
+                if table is None:
+                    table = Table(split_table_row(stripped))
+                    blocks.append(table)
+                elif is_separator_row(stripped):
+                    # Only the separator under the header is kept; stray ones are dropped
+                    if len(table.rows) == 1 and table.separator is None:
+                        table.separator = split_table_row(stripped)
+                else:
+                    table.rows.append(split_table_row(stripped))
+                continue
+
+            table = None
+            match = HEADING_PATTERN.match(stripped)
+            if match:
+                blocks.append(Heading(len(match.group(1)), match.group(2).strip()))
+            else:
+                blocks.append(TextLine(line.rstrip('\r')))
+
+        return cls(blocks)
+
+    def render(self):
+        """
+        Render the document back to markdown.
+
+        Tables are always followed by a blank line so that following text is
+        not read as part of the table.
+        """
+        lines = []
+        last = len(self.blocks) - 1
+        for index, block in enumerate(self.blocks):
+            lines.extend(block.render_lines())
+            if isinstance(block, Table) and index < last:
+                following = self.blocks[index + 1]
+                if not (isinstance(following, TextLine) and not following.text.strip()):
+                    lines.append('')
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.render()
+
+    def tables(self):
+        """Yield (block index, table) for every table."""
+        for index, block in enumerate(self.blocks):
+            if isinstance(block, Table):
+                yield index, block
+
+    def process_tables(self):
+        """Yield (block index, table) for every process / sighted evidence table."""
+        for index, table in self.tables():
+            if table.is_process_table:
+                yield index, table
+
+    def key_value_rows(self):
+        """Yield the cell lists of every two-column table row, header rows included."""
+        for _, table in self.tables():
+            for row in table.rows:
+                if len(row) == 2:
+                    yield row
+
+    def sections(self, colon_headings=True):
+        """
+        Group the document's lines under the heading above them.
+
+        Args:
+            colon_headings: Also treat prose lines ending in ':' as headings
+
+        Returns:
+            Dictionary mapping heading text to the text below it
+        """
+        sections = {}
+        current_heading = None
+        current_lines = []
+
+        for block in self.blocks:
+            heading = None
+            if isinstance(block, Heading):
+                heading = block.text
+            elif colon_headings and isinstance(block, TextLine) and block.text.strip().endswith(':'):
+                heading = block.text.strip().rstrip(':').strip()
+
+            if heading is not None:
+                if current_heading and current_lines:
+                    sections[current_heading] = '\n'.join(current_lines)
+                current_heading = heading
+                current_lines = []
+            elif current_heading:
+                current_lines.extend(block.render_lines())
+
+        if current_heading and current_lines:
+            sections[current_heading] = '\n'.join(current_lines)
+        return sections
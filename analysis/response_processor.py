@@ -1,68 +1,25 @@
-import sys
-import streamlit as st
 import os
-import tempfile
-from datetime import datetime
-import pandas as pd
-import docx
-from docx import Document
-import comtypes.client
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
-import fitz  # PyMuPDF
-import io
-import win32gui
-import win32ui
-import win32con
-import win32com.client
-from dotenv import load_dotenv
-import pytesseract
-import mammoth
-import base64
-import win32com.client
-import pythoncom
-import time
-from PIL import Image
-import openai
-from PIL import Image, ImageDraw, ImageFont
-from docx import Document
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl import Workbook, load_workbook
 import re
-import openpyxl
-from openpyxl.drawing.image import Image as ExcelImage
-from docxcompose.composer import Composer
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-
-# from trial import _extract_from_excel as EXTRACT_FROM_EXCEL
-                
-
-from typing import List, Dict, Tuple, Union, Optional
 import logging
 
+from .instrumentation import track_stage
+from .response_document import ResponseDocument, Heading, TextLine, HEADING_PATTERN
+from .evidence_index import get_evidence_index
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+# Plain-text headings such as "Audit Scope:" that are turned into markdown headings
+PLAIN_HEADING_PATTERN = re.compile(r'^[A-Z][A-Za-z\s]+:$')
 
-load_dotenv(".env")
-
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
-
-# Set page configuration
-# st.set_page_config(
-#     page_title="AI Audit Report Generator",
-#     page_icon="📊",
-#     layout="wide",
-#     initial_sidebar_state="expanded"
-# )
-
-
-
+# Checkmark variations from different LLMs, all standardized to CHECKMARK
+CHECKMARK = '✓'
+CHECKMARK_VARIATIONS = ['✔', '✔️', 'X', 'x', '✗', '✘', '☑', '☒', '☐']
+CHECKMARK_TOKEN_PATTERN = re.compile(
+    r'(?<!\S)(?:' + '|'.join(re.escape(symbol) for symbol in sorted(CHECKMARK_VARIATIONS, key=len, reverse=True)) + r')(?!\S)'
+)
 
 
 # ------ Response Processor -------------
@@ -72,11 +29,16 @@ class ResponsePreprocessor:
     def __init__(self):
         """Initialize the ResponsePreprocessor."""
         self.evidence_images = {}
+        self.evidence_index = get_evidence_index(())
         self.evidence_metadata = {}  # Store score data, company names, dates
         self.image_paths = []
         self.static_text = {}
         self.evidence_replacements = {}
         self.score_data = {}  # Store scores for each evidence file
+        self.score_annotations = {}
+        self.document = None  # ResponseDocument from the last preprocess() call
+        self._open_lines = None  # Complete lines of the streamed section not closed yet
+        self._partial_line = ""  # Streamed text after the last newline
     
     def set_evidence_images(self, evidence_images, evidence_metadata=None):
         """
@@ -87,6 +49,7 @@ class ResponsePreprocessor:
             evidence_metadata: Dictionary with extracted scores, company names, dates
         """
         self.evidence_images = evidence_images
+        self.evidence_index = get_evidence_index(evidence_images)
         self.evidence_metadata = evidence_metadata or {}
     
     def set_static_text(self, static_text):
@@ -99,131 +62,32 @@ class ResponsePreprocessor:
         self.static_text = static_text
     
     @staticmethod
-    def clean_response(response_text):
-        """Clean up the AI response to ensure proper formatting."""
-        
-        # Fix common formatting issues with tables
-        cleaned_text = []
-        lines = response_text.split('\n')
-        in_table = False
-        table_header_detected = False
-        
-        for i, line in enumerate(lines):
-            # Detect start of table
-            if line.strip().startswith('|') and line.strip().endswith('|'):
-                if not in_table:
-                    in_table = True
-                    # If this is the first line of the table, ensure it's properly formatted
-                    if '|' in line and not table_header_detected:
-                        table_header_detected = True
-                
-                # Ensure the line has properly formatted pipe separators
-                cells = line.split('|')
-                cleaned_line = '|' + '|'.join(cell.strip() for cell in cells[1:-1]) + '|'
-                cleaned_text.append(cleaned_line)
-                
-                # Check if the next line is the separator row
-                if i + 1 < len(lines) and '-+-' in lines[i+1].replace('|', '+'):
-                    # This is a header row, next line should be a separator
-                    continue
-                elif i + 1 < len(lines) and in_table and '---' in lines[i+1] and '|' in lines[i+1]:
-                    # This is a proper separator row, keep it
-                    continue
-                elif in_table and table_header_detected and i + 1 < len(lines) and not '---' in lines[i+1] and '|' not in lines[i+1]:
-                    # We need to add a separator row after the header
-                    cells = line.split('|')
-                    separator = '|' + '|'.join(['---' for _ in cells[1:-1]]) + '|'
-                    cleaned_text.append(separator)
-            
-            # Detect end of table
-            elif in_table and not line.strip().startswith('|'):
-                in_table = False
-                table_header_detected = False
-                cleaned_text.append('')  # Add blank line after table
-                if line.strip():  # Add non-empty line
-                    cleaned_text.append(line)
-            else:
-                # Regular line
-                cleaned_text.append(line)
-        
-        return '\n'.join(cleaned_text)
-
-    @staticmethod
-    def ensure_proper_headings(response_text):
-        """Ensure headings use proper markdown format."""
-        lines = response_text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            # Check for potential headings that don't use markdown format
-            if re.match(r'^[A-Z][A-Za-z\s]+:$', line.strip()):
-                # Convert "Heading:" format to "# Heading"
-                heading_text = line.strip().rstrip(':')
-                cleaned_lines.append(f"## {heading_text}")
-            else:
-                cleaned_lines.append(line)
-        
-        return '\n'.join(cleaned_lines)
+    def ensure_proper_headings(document):
+        """Turn plain "Heading:" lines into level-2 headings."""
+        for index, block in enumerate(document.blocks):
+            if isinstance(block, TextLine) and PLAIN_HEADING_PATTERN.match(block.text.strip()):
+                document.blocks[index] = Heading(2, block.text.strip().rstrip(':'))
+        return document
     
     @staticmethod
-    def standardize_table_format(response_text):
-        """Standardize table formats across different AI providers' outputs."""
-        # Find all tables in the response
-        table_pattern = r'(\|.*\|[\r\n]+\|[-\s:|]+\|[\r\n]+((?:\|.*\|[\r\n]+)*))'
-        tables = re.finditer(table_pattern, response_text, re.MULTILINE)
-        
-        result = response_text
-        for table_match in tables:
-            if not isinstance(table_match, type(None)):
-                table = table_match.group(0)
-                # Ensure separator row uses standard format
-                lines = table.split('\n')
-                if len(lines) >= 2:
-                    header_line = lines[0]
-                    separator_line = lines[1]
-                    
-                    # Count columns in header
-                    column_count = header_line.count('|') - 1
-                    
-                    # Create standardized separator
-                    standard_separator = '|' + '|'.join(['---' for _ in range(column_count)]) + '|'
-                    
-                    # Replace the separator line
-                    standardized_table = table.replace(separator_line, standard_separator)
-                    result = result.replace(table, standardized_table)
-        
-        return result
+    def standardize_table_format(document):
+        """Standardize table separator rows across different AI providers' outputs."""
+        for _, table in document.tables():
+            # The standard |---|---| separator is written for every header column
+            table.separator = None
+        return document
     
     @staticmethod
-    def fix_checkmark_symbols(response_text):
-        """Standardize checkmark symbols used in the report."""
-        # Common variations of checkmarks from different LLMs
-        checkmark_variations = ['✓', '✔', '✔️', 'X', 'x', '✗', '✘', '☑', '☒', '☐']
-        
-        # Standardize to a single checkmark symbol
-        result = response_text
-        for symbol in checkmark_variations:
-            if symbol != '✓':  # We're standardizing to this symbol
-                result = result.replace(f' {symbol} ', ' ✓ ')
-                result = result.replace(f'|{symbol}|', '|✓|')
-                result = result.replace(f'| {symbol} |', '| ✓ |')
-                # Handle cases where it's just the symbol alone in a cell
-                result = result.replace(f'| {symbol} ', '| ✓ ')
-                result = result.replace(f' {symbol} |', ' ✓ |')
-        
-        # Special case for OK/OFI/NC/NA columns
-        lines = result.split('\n')
-        for i, line in enumerate(lines):
-            if '|' in line:
-                cells = line.split('|')
-                for j, cell in enumerate(cells):
-                    cell_stripped = cell.strip()
-                    # If a cell just contains a symbol in the OK column
-                    if cell_stripped in checkmark_variations and j >= 1:
-                        cells[j] = ' ✓ '
-                lines[i] = '|'.join(cells)
-        
-        return '\n'.join(lines)
+    def fix_checkmark_symbols(document):
+        """Standardize checkmark symbols used in the report's tables."""
+        for _, table in document.tables():
+            for row in table.rows:
+                for j, cell in enumerate(row):
+                    if cell in CHECKMARK_VARIATIONS:
+                        row[j] = CHECKMARK
+                    elif cell:
+                        row[j] = CHECKMARK_TOKEN_PATTERN.sub(CHECKMARK, cell)
+        return document
     
     def analyze_evidence_scores(self):
         """
@@ -346,231 +210,108 @@ class ResponsePreprocessor:
         self.score_data = score_analysis
         return score_analysis
     
-    def process_evidence_references(self, response_text):
+    def process_evidence_references(self, document):
         """
         Process any evidence references in the response and prepare them for inclusion.
         
-        This method looks for evidence file references in the text and marks them
-        for replacement with actual images during document generation.
+        This method looks for evidence file references in the process table and
+        marks them for replacement with actual images during document generation.
         """
         if not self.evidence_images:
-            return response_text
-        
+            return document
+            
         # First analyze scores to determine which category each evidence falls into
         self.analyze_evidence_scores()
-            
-        # Look for evidence references in the SIGHTED EVIDENCE column of tables
-        lines = response_text.split('\n')
-        in_table = False
-        is_process_table = False
-        header_row = []
-        evidence_col_idx = -1
-        process_col_idx = -1
-        ok_col_idx = -1
-        ofi_col_idx = -1
-        nc_col_idx = -1
-        na_col_idx = -1
-        comments_col_idx = -1
-        
-        # Create a mapping for evidence replacements and score annotations
+        
+        # Rows are keyed by (table block index, row index in the table body)
         evidence_replacements = {}
         score_annotations = {}
         
-        for i, line in enumerate(lines):
-            # Detect start of table
-            if line.strip().startswith('|') and line.strip().endswith('|') and not in_table:
-                in_table = True
-                # Parse header row
-                header_cells = [cell.strip().lower() for cell in line.split('|')[1:-1]]
-                header_row = header_cells
-                
-                # Identify if this is the process-evidence table by checking for key columns
-                if 'process' in header_cells and 'sighted evidence' in header_cells:
-                    is_process_table = True
-                    process_col_idx = header_cells.index('process')
-                    evidence_col_idx = header_cells.index('sighted evidence')
-                    
-                    # Find OK/OFI/NC/NA columns
-                    if 'ok' in header_cells:
-                        ok_col_idx = header_cells.index('ok')
-                    if 'ofi' in header_cells:
-                        ofi_col_idx = header_cells.index('ofi')
-                    if 'nc' in header_cells:
-                        nc_col_idx = header_cells.index('nc')
-                    if 'na' in header_cells:
-                        na_col_idx = header_cells.index('na')
-                    if 'additional comments' in header_cells:
-                        comments_col_idx = header_cells.index('additional comments')
+        for table_index, table in document.process_tables():
+            process_col_idx = table.column_index('process')
+            evidence_col_idx = table.column_index('sighted evidence')
+            category_cols = {
+                'OK': table.column_index('ok'),
+                'OFI': table.column_index('ofi'),
+                'NC': table.column_index('nc'),
+                'NA': table.column_index('na'),
+            }
+            comments_col_idx = table.column_index('additional comments')
             
-            # Process table rows if we're in a process-evidence table
-            elif in_table and is_process_table and line.strip().startswith('|'):
-                # Skip separator row
-                if all(cell.strip() == '' or all(c in '-:' for c in cell) for cell in line.split('|')[1:-1]):
+            for row_index, cells in enumerate(table.body):
+                if len(cells) <= evidence_col_idx:
+                    continue
+                process_text = cells[process_col_idx] if process_col_idx < len(cells) else ""
+                matched_file = self.evidence_index.match_cell(cells[evidence_col_idx], process_text)
+                if not matched_file:
                     continue
                 
-                cells = [cell.strip() for cell in line.split('|')[1:-1]]
-                if len(cells) > evidence_col_idx:
-                    evidence_text = cells[evidence_col_idx]
-                    process_text = cells[process_col_idx] if process_col_idx >= 0 and process_col_idx < len(cells) else ""
-                    
-                    # Match this row to an evidence file
-                    matched_file = None
-                    for evidence_file in self.evidence_images:
-                        # Check for evidence filename in the evidence text
-                        if evidence_file.lower() in evidence_text.lower() or any(word in evidence_text.lower() for word in evidence_file.lower().split('.')):
-                            matched_file = evidence_file
-                            break
-                        
-                        # Also check if process name matches the file name
-                        evidence_keyword = os.path.basename(evidence_file).split('.')[0].lower()
-                        if evidence_keyword in process_text.lower():
-                            matched_file = evidence_file
-                            break
-                    
-                    if matched_file:
-                        # Mark this cell for image replacement
-                        evidence_replacements[i] = {
-                            'row_index': i,
-                            'evidence_col': evidence_col_idx,
-                            'file_name': matched_file
-                        }
-                        
-                        # Determine where to place checkmark based on score analysis
-                        if matched_file in self.score_data:
-                            category = self.score_data[matched_file]['category']
-                            comment = self.score_data[matched_file]['comment']
-                            
-                            # Store checkmark placement and comments
-                            score_annotations[i] = {
-                                'row_index': i,
-                                'category': category,
-                                'ok_col': ok_col_idx,
-                                'ofi_col': ofi_col_idx,
-                                'nc_col': nc_col_idx,
-                                'na_col': na_col_idx,
-                                'comments_col': comments_col_idx,
-                                'comment': comment
-                            }
-            
-            # Detect end of table
-            elif in_table and not line.strip().startswith('|'):
-                in_table = False
-                is_process_table = False
-                header_row = []
-                evidence_col_idx = -1
-                process_col_idx = -1
-                ok_col_idx = -1
-                ofi_col_idx = -1
-                nc_col_idx = -1
-                na_col_idx = -1
-                comments_col_idx = -1
+                key = (table_index, row_index)
+                # Mark this cell for image replacement
+                evidence_replacements[key] = {
+                    'row_index': row_index,
+                    'evidence_col': evidence_col_idx,
+                    'file_name': matched_file
+                }
+                
+                if matched_file not in self.score_data:
+                    continue
+                category = self.score_data[matched_file]['category']
+                comment = self.score_data[matched_file]['comment']
+                score_annotations[key] = {
+                    'row_index': row_index,
+                    'category': category,
+                    'comment': comment
+                }
+                
+                # Clear any existing checkmarks, then tick the column for the category
+                for col_idx in category_cols.values():
+                    if 0 <= col_idx < len(cells):
+                        cells[col_idx] = ''
+                col_idx = category_cols.get(category, -1)
+                if 0 <= col_idx < len(cells):
+                    cells[col_idx] = CHECKMARK
+                
+                # Add comment if needed
+                if category in ['OFI', 'NC'] and comment and 0 <= comments_col_idx < len(cells):
+                    cells[comments_col_idx] = comment
         
         # Store the references for later use during document generation
         self.evidence_replacements = evidence_replacements
         self.score_annotations = score_annotations
         
-        # Now modify the response text to add checkmarks and comments
-        modified_lines = lines.copy()
-        
-        # Add checkmarks based on score analysis
-        for row_idx, annotation in score_annotations.items():
-            row_cells = modified_lines[row_idx].split('|')
-            
-            # Clear any existing checkmarks in OK/OFI/NC/NA columns
-            for col_idx in [annotation['ok_col'], annotation['ofi_col'], annotation['nc_col'], annotation['na_col']]:
-                if col_idx >= 0 and col_idx + 1 < len(row_cells):
-                    row_cells[col_idx + 1] = ' '
-            
-            # Add checkmark to appropriate column
-            if annotation['category'] == 'OK' and annotation['ok_col'] >= 0:
-                row_cells[annotation['ok_col'] + 1] = ' ✓ '
-            elif annotation['category'] == 'OFI' and annotation['ofi_col'] >= 0:
-                row_cells[annotation['ofi_col'] + 1] = ' ✓ '
-            elif annotation['category'] == 'NC' and annotation['nc_col'] >= 0:
-                row_cells[annotation['nc_col'] + 1] = ' ✓ '
-            elif annotation['category'] == 'NA' and annotation['na_col'] >= 0:
-                row_cells[annotation['na_col'] + 1] = ' ✓ '
-            
-            # Add comment if needed
-            if annotation['category'] in ['OFI', 'NC'] and annotation['comment'] and annotation['comments_col'] >= 0:
-                row_cells[annotation['comments_col'] + 1] = f" {annotation['comment']} "
-            
-            # Reassemble the row
-            modified_lines[row_idx] = '|'.join(row_cells)
-        
-        # Determine if we have any OFIs or NCs
-        has_ofi = any(ann['category'] == 'OFI' for ann in score_annotations.values())
-        has_nc = any(ann['category'] == 'NC' for ann in score_annotations.values())
-        
-        # Update NONCONFORMANCES and OPPORTUNITIES FOR IMPROVEMENTS sections
-        for i, line in enumerate(modified_lines):
-            if "NONCONFORMANCES" in line.upper() and i + 1 < len(modified_lines):
-                if has_nc:
-                    # Add Yes on the next line after NONCONFORMANCES
-                    modified_lines[i+1] = "Yes"
-                    # Add explanation if not already present
-                    if i + 2 < len(modified_lines) and not modified_lines[i+2].strip():
-                        nc_comments = [ann['comment'] for ann in score_annotations.values() if ann['category'] == 'NC']
-                        if nc_comments:
-                            modified_lines[i+2] = nc_comments[0]
-                else:
-                    # Add No on the next line after NONCONFORMANCES
-                    modified_lines[i+1] = "No"
-            
-            if "OPPORTUNITIES FOR IMPROVEMENTS" in line.upper() and i + 1 < len(modified_lines):
-                if has_ofi:
-                    # Add Yes on the next line after OPPORTUNITIES FOR IMPROVEMENTS
-                    modified_lines[i+1] = "Yes"
-                    # Add explanation if not already present
-                    if i + 2 < len(modified_lines) and not modified_lines[i+2].strip():
-                        ofi_comments = [ann['comment'] for ann in score_annotations.values() if ann['category'] == 'OFI']
-                        if ofi_comments:
-                            modified_lines[i+2] = ofi_comments[0]
-                else:
-                    # Add No on the next line after OPPORTUNITIES FOR IMPROVEMENTS
-                    modified_lines[i+1] = "No"
-        
-        # Return the modified text
-        return '\n'.join(modified_lines)
+        # Answer the NONCONFORMANCES and OPPORTUNITIES FOR IMPROVEMENTS fields:
+        # (Yes/No, first explanation) for each
+        findings = {}
+        for label, category in (('NONCONFORMANCES', 'NC'), ('OPPORTUNITIES FOR IMPROVEMENTS', 'OFI')):
+            comments = [ann['comment'] for ann in score_annotations.values() if ann['category'] == category]
+            findings[label] = ("Yes" if comments else "No", comments[0] if comments and comments[0] else "")
+        
+        # Two-column rows hold the answer in their value cell
+        for cells in document.key_value_rows():
+            for label, (answer, comment) in findings.items():
+                if label in cells[0].upper():
+                    cells[1] = f"{answer}\n{comment}" if comment else answer
+        
+        # Headings and prose labels hold it on the next line, with the explanation
+        # on the line after that if it is blank
+        blocks = document.blocks
+        for i in range(len(blocks) - 1):
+            if not isinstance(blocks[i], (Heading, TextLine)) or not isinstance(blocks[i + 1], TextLine):
+                continue
+            label_text = blocks[i].text.upper()
+            for label, (answer, comment) in findings.items():
+                if label in label_text:
+                    blocks[i + 1].text = answer
+                    if comment and i + 2 < len(blocks) and isinstance(blocks[i + 2], TextLine) and not blocks[i + 2].text.strip():
+                        blocks[i + 2].text = comment
+        
+        return document
     
     @staticmethod
-    def extract_headers_from_content(response_text):
+    def extract_headers_from_content(document):
         """Extract section headers from the content to help with template filling."""
-        headers = {}
-        current_header = None
-        current_content = []
-        
-        lines = response_text.split('\n')
-        for line in lines:
-            # Check for markdown headers
-            if line.strip().startswith('#'):
-                # Save previous header content if exists
-                if current_header and current_content:
-                    headers[current_header] = '\n'.join(current_content)
-                    current_content = []
-                
-                # Extract new header text
-                header_text = line.strip().lstrip('#').strip()
-                current_header = header_text
-            # Check for plain text headers that end with colon
-            elif line.strip() and not line.strip().startswith('|') and line.strip().endswith(':'):
-                # Save previous header content if exists
-                if current_header and current_content:
-                    headers[current_header] = '\n'.join(current_content)
-                    current_content = []
-                
-                # Extract new header text
-                header_text = line.strip().rstrip(':').strip()
-                current_header = header_text
-            elif current_header:
-                # Collect content for current header
-                current_content.append(line)
-        
-        # Save the last section
-        if current_header and current_content:
-            headers[current_header] = '\n'.join(current_content)
-        
-        return headers
+        return document.sections()
     
     def extract_customer_data(self):
         """
@@ -610,127 +351,164 @@ class ResponsePreprocessor:
             
         return customer_data
     
-    def enhance_process_content(self, response_text):
+    def enhance_process_content(self, document):
         """
-        Add customer information to process cells in the response text.
+        Add customer information to process cells in the response.
         This ensures the total score is visible in the report.
         """
         customer_data = self.extract_customer_data()
         
         if not customer_data:
-            return response_text
+            return document
+        
+        for _, table in document.process_tables():
+            process_col_idx = table.column_index('process')
+            evidence_col_idx = table.column_index('sighted evidence')
             
-        lines = response_text.split('\n')
-        in_table = False
-        is_process_table = False
-        header_row = []
-        process_col_idx = -1
-        evidence_col_idx = -1
-        
-        for i, line in enumerate(lines):
-            # Detect start of table
-            if line.strip().startswith('|') and line.strip().endswith('|') and not in_table:
-                in_table = True
-                # Parse header row
-                header_cells = [cell.strip().lower() for cell in line.split('|')[1:-1]]
-                header_row = header_cells
+            for cells in table.body:
+                if len(cells) <= max(process_col_idx, evidence_col_idx):
+                    continue
+                process_text = cells[process_col_idx]
                 
-                # Identify if this is the process-evidence table by checking for key columns
-                if 'process' in header_cells and 'sighted evidence' in header_cells:
-                    is_process_table = True
-                    process_col_idx = header_cells.index('process')
-                    evidence_col_idx = header_cells.index('sighted evidence')
-            
-            # Process table rows if we're in a process-evidence table
-            elif in_table and is_process_table and line.strip().startswith('|'):
-                # Skip separator row
-                if all(cell.strip() == '' or all(c in '-:' for c in cell) for cell in line.split('|')[1:-1]):
+                # Match this row to an evidence file
+                matched_file = self.evidence_index.match_cell(cells[evidence_col_idx])
+                
+                # Add customer data to process cell if we found a match
+                if not matched_file or matched_file not in customer_data:
                     continue
+                data = customer_data[matched_file]
                 
-                # Get the cells for this row
-                cells = line.split('|')
-                if len(cells) > process_col_idx + 1 and len(cells) > evidence_col_idx + 1:
-                    process_text = cells[process_col_idx + 1].strip()
-                    evidence_text = cells[evidence_col_idx + 1].strip()
-                    
-                    # Match this row to an evidence file
-                    matched_file = None
-                    for evidence_file in self.evidence_images:
-                        if evidence_file.lower() in evidence_text.lower() or any(word in evidence_text.lower() for word in evidence_file.lower().split('.')):
-                            matched_file = evidence_file
-                            break
-                    
-                    # Add customer data to process cell if we found a match
-                    if matched_file and matched_file in customer_data:
-                        data = customer_data[matched_file]
-                        
-                        # Create formatted customer data
-                        formatted_data = []
-                        
-                        # Start with existing process text if not empty
-                        if process_text:
-                            formatted_data.append(process_text)
-                            formatted_data.append("")  # Add blank line
-                        else:
-                            # Use file name as process name if cell is empty
-                            base_name = os.path.basename(matched_file).split('.')[0]
-                            process_name = ' '.join(word.capitalize() for word in base_name.replace('_', ' ').replace('-', ' ').split())
-                            formatted_data.append(f"Process: {process_name}")
-                            formatted_data.append("")  # Add blank line
-                        
-                        # Add customer information
-                        formatted_data.append("Evidence Details:")
-                        
-                        if data['company']:
-                            formatted_data.append(f"Customer: {data['company']}")
-                        if data['date']:
-                            formatted_data.append(f"Date: {data['date']}")
-                        if data['score']:
-                            formatted_data.append(f"Score: {data['score']}")
-                        
-                        # Add comments if available
-                        if data['comments']:
-                            formatted_data.append("Comments:")
-                            for comment in data['comments']:
-                                formatted_data.append(f"- {comment[:100]}...")
-                        
-                        # Update the process cell with the formatted content
-                        cells[process_col_idx + 1] = " " + "\n".join(formatted_data) + " "
-                        
-                        # Update the line in the response text
-                        lines[i] = "|".join(cells)
-            
-            # Detect end of table
-            elif in_table and not line.strip().startswith('|'):
-                in_table = False
-                is_process_table = False
-                header_row = []
-                process_col_idx = -1
-                evidence_col_idx = -1
-        
-        return '\n'.join(lines)
+                # Create formatted customer data
+                formatted_data = []
+                
+                # Start with existing process text if not empty
+                if process_text:
+                    formatted_data.append(process_text)
+                    formatted_data.append("")  # Add blank line
+                else:
+                    # Use file name as process name if cell is empty
+                    base_name = os.path.basename(matched_file).split('.')[0]
+                    process_name = ' '.join(word.capitalize() for word in base_name.replace('_', ' ').replace('-', ' ').split())
+                    formatted_data.append(f"Process: {process_name}")
+                    formatted_data.append("")  # Add blank line
+                
+                # Add customer information
+                formatted_data.append("Evidence Details:")
+                
+                if data['company']:
+                    formatted_data.append(f"Customer: {data['company']}")
+                if data['date']:
+                    formatted_data.append(f"Date: {data['date']}")
+                if data['score']:
+                    formatted_data.append(f"Score: {data['score']}")
+                
+                # Add comments if available
+                if data['comments']:
+                    formatted_data.append("Comments:")
+                    for comment in data['comments']:
+                        formatted_data.append(f"- {comment[:100]}...")
+                
+                # Update the process cell; the newlines are written as <br> in the table
+                cells[process_col_idx] = "\n".join(formatted_data)
+        
+        return document
     
-    def preprocess(self, response_text):
-        """Apply all preprocessing steps to the AI response."""
-        # Clean table formatting
-        cleaned = self.clean_response(response_text)
+    def _finalise(self, text):
+        """Parse a closed part of the response, run the section-local steps on it and append it to self.document."""
+        section = ResponseDocument.parse(text)
         
         # Fix heading formats
-        cleaned = self.ensure_proper_headings(cleaned)
+        self.ensure_proper_headings(section)
         
         # Standardize tables
-        cleaned = self.standardize_table_format(cleaned)
+        self.standardize_table_format(section)
         
         # Fix checkmark symbols
-        cleaned = self.fix_checkmark_symbols(cleaned)
+        self.fix_checkmark_symbols(section)
         
         # Enhance process content with customer data
-        cleaned = self.enhance_process_content(cleaned)
+        self.enhance_process_content(section)
+        
+        self.document.blocks.extend(section.blocks)
+    
+    def feed(self, chunk):
+        """
+        Add the next piece of a streamed AI response.
+        
+        Complete lines are held in the open section. When a heading line
+        arrives, everything above it is closed: parsed, run through the steps
+        that only look at their own section, and appended to self.document, so
+        preview() grows while the response is still streaming. A section can
+        always be closed there because a heading also ends any table above it.
+        Call set_evidence_images() before the first chunk.
+        
+        Returns:
+            True if one or more sections were finalised
+        """
+        if self._open_lines is None:
+            self.document = ResponseDocument()
+            self._open_lines = []
+            self._partial_line = ""
+        
+        *lines, self._partial_line = (self._partial_line + chunk).split('\n')
+        if not lines:
+            return False
+        
+        # Close the open section at the last heading among the new lines
+        first_new = len(self._open_lines)
+        self._open_lines.extend(lines)
+        close_at = None
+        for index in range(len(self._open_lines) - 1, first_new - 1, -1):
+            if HEADING_PATTERN.match(self._open_lines[index].strip()):
+                close_at = index
+                break
+        if not close_at:
+            return False
+        
+        self._finalise('\n'.join(self._open_lines[:close_at]))
+        del self._open_lines[:close_at]
+        return True
+    
+    def preview(self):
+        """Markdown of the sections finalised so far (the whole response after finish())."""
+        return self.document.render() if self.document else ""
+    
+    def finish(self):
+        """
+        Finalise the last section of a streamed response and apply the whole-report steps.
+        
+        Evidence references, score checkmarks and the NONCONFORMANCES and
+        OPPORTUNITIES FOR IMPROVEMENTS answers depend on every table of the
+        report, so they are applied here rather than per section.
+        
+        Returns:
+            The preprocessed response as markdown text
+        """
+        if self._open_lines is None:
+            self.feed("")
+        self._finalise('\n'.join(self._open_lines + [self._partial_line]))
+        self._open_lines = None
+        self._partial_line = ""
         
         # Process evidence references and add checkmarks based on scores
-        cleaned = self.process_evidence_references(cleaned)
+        self.process_evidence_references(self.document)
         
-        # Extract headers for template filling
-        headers = self.extract_headers_from_content(cleaned)
+        return self.document.render()
+    
+    @track_stage("preprocess")
+    def preprocess(self, response_text):
+        """
+        Apply all preprocessing steps to a complete AI response.
         
-        return cleaned
+        The response goes through the same path as a streamed one, fed in one
+        piece: it is parsed once into a ResponseDocument, every step edits that
+        model and the text is rendered once at the end. The model is kept in
+        self.document so the report generator can fill the template from it
+        without parsing the text again.
+        
+        Returns:
+            The preprocessed response as markdown text
+        """
+        self._open_lines = None
+        self.feed(response_text)
+        return self.finish()
@@ -1,117 +1,89 @@
-import sys
-import streamlit as st
 import os
-import tempfile
-from datetime import datetime
-import pandas as pd
-import docx
-from docx import Document
-import comtypes.client
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
-import fitz  # PyMuPDF
 import io
-import win32gui
-import win32ui
-import win32con
-import win32com.client
-from dotenv import load_dotenv
-import pytesseract
-import mammoth
-import base64
-import win32com.client
-import pythoncom
-import time
-from PIL import Image
-import openai
-from PIL import Image, ImageDraw, ImageFont
-from docx import Document
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl import Workbook, load_workbook
-import re
-import openpyxl
-from openpyxl.drawing.image import Image as ExcelImage
-from docxcompose.composer import Composer
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+import threading
+import collections
+import logging
 
-# from trial import _extract_from_excel as EXTRACT_FROM_EXCEL
-                
+from docx import Document
 
-from typing import List, Dict, Tuple, Union, Optional
-import logging
+from .instrumentation import track_stage
+from .evidence_cache import EvidenceCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-
-load_dotenv(".env")
-
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
-
-# # Set page configuration
-# st.set_page_config(
-#     page_title="AI Audit Report Generator",
-#     page_icon="📊",
-#     layout="wide",
-#     initial_sidebar_state="expanded"
-# )
-
-
-
 # ------- Template Analysis Module -------
 class TemplateAnalyzer:
     """Analyze audit report templates and extract their structure for direct filling."""
     
     @staticmethod
+    @track_stage("template_analysis")
     def extract_template_structure(template_path):
         """Extract the detailed structure of the template document including form fields and tables."""
         try:
-            doc = Document(template_path)
-            template_structure = {
-                'paragraphs': [],
-                'tables': []
+            return TemplateAnalyzer.structure_from_document(Document(template_path))
+        except Exception as e:
+            import streamlit as st
+            st.error(f"Error analyzing template: {e}")
+            return {'paragraphs': [], 'tables': []}
+    
+    @staticmethod
+    def structure_from_document(doc):
+        """Extract the structure of an already loaded template document."""
+        template_structure = {
+            'paragraphs': [],
+            'tables': []
+        }
+        
+        # Extract paragraph headers and any form fields
+        for para in doc.paragraphs:
+            if para.text.strip():
+                template_structure['paragraphs'].append({
+                    'text': para.text,
+                    'style': para.style.name,
+                    'alignment': para.alignment
+                })
+        
+        # Extract tables with detailed structure
+        for table_idx, table in enumerate(doc.tables):
+            rows = table.rows
+            table_data = {
+                'id': f'table_{table_idx}',
+                'rows': len(rows),
+                'cols': len(rows[0].cells) if rows else 0,
+                'cells': []
             }
             
-            # Extract paragraph headers and any form fields
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    template_structure['paragraphs'].append({
-                        'text': para.text,
-                        'style': para.style.name,
-                        'alignment': para.alignment
+            for row_idx, row in enumerate(rows):
+                for col_idx, cell in enumerate(row.cells):
+                    cell_text = cell.text.strip()
+                    table_data['cells'].append({
+                        'row': row_idx,
+                        'col': col_idx,
+                        'text': cell_text,
+                        'is_header': row_idx == 0 or col_idx == 0,
+                        'is_form_field': cell_text == '' and (row_idx > 0 and col_idx > 0)
                     })
             
-            # Extract tables with detailed structure
-            for table_idx, table in enumerate(doc.tables):
-                table_data = {
-                    'id': f'table_{table_idx}',
-                    'rows': len(table.rows),
-                    'cols': len(table.rows[0].cells) if table.rows else 0,
-                    'cells': []
-                }
-                
-                for row_idx, row in enumerate(table.rows):
-                    for col_idx, cell in enumerate(row.cells):
-                        cell_text = cell.text.strip()
-                        table_data['cells'].append({
-                            'row': row_idx,
-                            'col': col_idx,
-                            'text': cell_text,
-                            'is_header': row_idx == 0 or col_idx == 0,
-                            'is_form_field': cell_text == '' and (row_idx > 0 and col_idx > 0)
-                        })
-                
-                template_structure['tables'].append(table_data)
-            
-            return template_structure
-        except Exception as e:
-            st.error(f"Error analyzing template: {e}")
-            return {'paragraphs': [], 'tables': []}
+            template_structure['tables'].append(table_data)
+        
+        return template_structure
+    
+    @staticmethod
+    @track_stage("template_analysis")
+    def compile_template(template_path):
+        """
+        Return the compiled form of a template, compiling it only the first time it is seen.
+        
+        Args:
+            template_path: Path to the Word template
+        
+        Returns:
+            CompiledTemplate with the prompt text, fill coordinates and document skeleton
+        """
+        return CompiledTemplate.load(template_path)
     
     @staticmethod
     def format_template_for_prompt(template_structure):
@@ -151,3 +123,184 @@ class TemplateAnalyzer:
                     prompt_parts.append("| " + " | ".join(['---'] * len(row_cells)) + " |")
         
         return '\n'.join(prompt_parts)
+
+
+# ------- Compiled Template Module -------
+class CompiledTemplate:
+    """
+    Everything a run needs from a report template, computed once per template.
+    
+    Holds the template structure rendered for the prompt, the table and row
+    coordinates of the header, legend, evidence and findings fields, and a
+    serialised skeleton of the document with the evidence rows already
+    cleared. Filling a report loads the skeleton and writes straight to those
+    coordinates instead of re-reading the template and scanning rows by label.
+    Compiled templates are cached by the SHA-256 of the template, in memory
+    and in the evidence cache directory.
+    """
+    
+    # Bump when the compiled layout changes so cached entries are rebuilt
+    VERSION = 2
+    
+    # Positions of the report tables in the template
+    HEADER_TABLE = 0
+    LEGEND_TABLE = 1
+    EVIDENCE_TABLE = 2
+    FINDINGS_TABLE = 3
+    
+    # Compiled templates, and template path hashes, kept in memory
+    MEMORY_ENTRIES = 8
+    
+    _memory = collections.OrderedDict()
+    _path_hashes = collections.OrderedDict()
+    _lock = threading.Lock()
+    
+    def __init__(self, template_hash, structure, prompt, skeleton, table_count,
+                 header_fields, legend_fields, evidence_rows, findings_fields):
+        """Initialize the compiled template; use compile() or load() to build one."""
+        self.template_hash = template_hash
+        self.structure = structure
+        self.prompt = prompt
+        self.skeleton = skeleton
+        self.table_count = table_count
+        self.header_fields = header_fields          # field label -> row indices in the header table
+        self.legend_fields = legend_fields          # legend label -> row index in the legend table
+        self.evidence_rows = evidence_rows          # cell count of each evidence row below the header
+        self.findings_fields = findings_fields      # (row index, field label) in the findings table
+    
+    def to_dict(self):
+        """Plain data for the evidence cache; the skeleton stays bytes."""
+        return {
+            'template_hash': self.template_hash,
+            'structure': self.structure,
+            'prompt': self.prompt,
+            'skeleton': self.skeleton,
+            'table_count': self.table_count,
+            'header_fields': self.header_fields,
+            'legend_fields': self.legend_fields,
+            'evidence_rows': self.evidence_rows,
+            'findings_fields': self.findings_fields,
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a compiled template from to_dict() data."""
+        return cls(
+            data['template_hash'], data['structure'], data['prompt'], data['skeleton'], data['table_count'],
+            data['header_fields'], data['legend_fields'], data['evidence_rows'],
+            [tuple(field) for field in data['findings_fields']]
+        )
+    
+    @property
+    def has_report_tables(self):
+        """True if the template has the header, legend, evidence and findings tables."""
+        return self.table_count > self.FINDINGS_TABLE
+    
+    @staticmethod
+    def _labelled_rows(table):
+        """(row index, first-cell label) of every row with a label and a value cell."""
+        labelled = []
+        for row_idx, row in enumerate(table.rows):
+            cells = row.cells
+            if len(cells) >= 2:
+                labelled.append((row_idx, cells[0].text.strip()))
+        return labelled
+    
+    @classmethod
+    def compile(cls, template_path, template_hash=None):
+        """
+        Compile a template from one read of the document.
+        
+        Args:
+            template_path: Path to the Word template
+            template_hash: SHA-256 of the template, computed if not given
+        """
+        template_hash = template_hash or EvidenceCache.hash_file(template_path)
+        doc = Document(template_path)
+        
+        # The structure is taken before the evidence rows are cleared, since
+        # their example text is part of the prompt
+        structure = TemplateAnalyzer.structure_from_document(doc)
+        prompt = TemplateAnalyzer.format_template_for_prompt(structure)
+        
+        tables = doc.tables
+        header_fields, legend_fields, evidence_rows, findings_fields = {}, {}, [], []
+        if len(tables) > cls.FINDINGS_TABLE:
+            for row_idx, label in cls._labelled_rows(tables[cls.HEADER_TABLE]):
+                header_fields.setdefault(label, []).append(row_idx)
+            for row_idx, label in cls._labelled_rows(tables[cls.LEGEND_TABLE]):
+                legend_fields.setdefault(label, row_idx)
+            findings_fields = cls._labelled_rows(tables[cls.FINDINGS_TABLE])
+            
+            # Every report starts with empty evidence rows, so clear them once here
+            for row in tables[cls.EVIDENCE_TABLE].rows[1:]:
+                cells = row.cells
+                evidence_rows.append(len(cells))
+                for cell in cells:
+                    cell.text = ""
+        else:
+            logger.warning(f"Template {os.path.basename(template_path)} has {len(tables)} tables; "
+                           f"the report tables will not be filled")
+        
+        skeleton = io.BytesIO()
+        doc.save(skeleton)
+        
+        return cls(template_hash, structure, prompt, skeleton.getvalue(), len(tables),
+                   header_fields, legend_fields, evidence_rows, findings_fields)
+    
+    @classmethod
+    def _hash_for_path(cls, template_path):
+        """Template hash, recomputed only when the file's size or modification time changes."""
+        stat = os.stat(template_path)
+        path_key = (os.path.abspath(template_path), stat.st_size, stat.st_mtime_ns)
+        with cls._lock:
+            template_hash = cls._path_hashes.get(path_key)
+            if template_hash is not None:
+                cls._path_hashes.move_to_end(path_key)
+        if template_hash is None:
+            template_hash = EvidenceCache.hash_file(template_path)
+            # Every job uploads its template to a new path, so only the recent ones are kept
+            with cls._lock:
+                cls._path_hashes[path_key] = template_hash
+                while len(cls._path_hashes) > cls.MEMORY_ENTRIES:
+                    cls._path_hashes.popitem(last=False)
+        return template_hash
+    
+    @classmethod
+    def load(cls, template_path):
+        """
+        Return the compiled template for a file, from memory, the on-disk cache or a fresh compile.
+        
+        Args:
+            template_path: Path to the Word template
+        """
+        template_hash = cls._hash_for_path(template_path)
+        with cls._lock:
+            compiled = cls._memory.get(template_hash)
+            if compiled is not None:
+                cls._memory.move_to_end(template_hash)
+                return compiled
+        
+        cache = EvidenceCache.default()
+        cache_key = f"{template_hash}-template-v{cls.VERSION}"
+        compiled = None
+        cached = cache.get(cache_key)
+        if cached is not None:
+            try:
+                compiled = cls.from_dict(cached)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring malformed compiled template {cache_key}: {str(e)}")
+        if compiled is None:
+            compiled = cls.compile(template_path, template_hash)
+            cache.set(cache_key, compiled.to_dict())
+            logger.info(f"Compiled template {os.path.basename(template_path)} ({len(compiled.skeleton) // 1024} KB skeleton)")
+        
+        with cls._lock:
+            cls._memory[template_hash] = compiled
+            while len(cls._memory) > cls.MEMORY_ENTRIES:
+                cls._memory.popitem(last=False)
+        return compiled
+    
+    def new_document(self):
+        """Open a fresh copy of the template skeleton for one report."""
+        return Document(io.BytesIO(self.skeleton))
@@ -0,0 +1,84 @@
+import threading
+import logging
+from functools import lru_cache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Encodings for the models we use; unknown models fall back to the gpt-4o encoding
+MODEL_ENCODINGS = {
+    "gpt-4o": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+    "gpt-4": "cl100k_base",
+}
+DEFAULT_ENCODING = "o200k_base"
+
+# Rough characters-per-token ratio used when no tokenizer is available
+FALLBACK_CHARS_PER_TOKEN = 4
+
+# Only texts up to this many characters are memoised; longer ones, such as
+# whole prompts, are rarely counted twice and would pin megabytes in the memo
+MEMO_MAX_CHARS = 4096
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model="gpt-4o"):
+    """
+    Load the BPE tokenizer for a model, or return None if it is unavailable.
+
+    tiktoken reads its BPE ranks from TIKTOKEN_CACHE_DIR when set, so pointing
+    that at a directory with the encoding files lets this work fully offline.
+    """
+    encoding_name = MODEL_ENCODINGS.get(model, DEFAULT_ENCODING)
+    with _encodings_lock:
+        if encoding_name not in _encodings:
+            try:
+                import tiktoken
+                _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+            except ImportError:
+                logger.warning("tiktoken is not installed; using an approximate token count")
+                _encodings[encoding_name] = None
+            except Exception as e:
+                # Remember the failure so we do not retry a download on every call
+                logger.warning(f"Could not load tokenizer {encoding_name}, using an approximate token count: {str(e)}")
+                _encodings[encoding_name] = None
+        return _encodings[encoding_name]
+
+
+def _encode_count(text, model):
+    """Count tokens for a text without memoising it."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=4096)
+def _count_tokens(text, model):
+    """Count tokens for a short text segment, memoised per segment and model."""
+    return _encode_count(text, model)
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Count the tokens a text uses for a model."""
+    if not text:
+        return 0
+    if len(text) > MEMO_MAX_CHARS:
+        return _encode_count(text, model)
+    return _count_tokens(text, model)
+
+
+def split_to_token_budget(text, max_tokens, model="gpt-4o"):
+    """Split a text into pieces of at most max_tokens tokens each."""
+    max_tokens = max(1, int(max_tokens))
+    encoding = get_encoding(model)
+    if encoding is None:
+        step = max_tokens * FALLBACK_CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
@@ -0,0 +1,123 @@
+"""
+Import-time benchmark and regression guard for the analysis package.
+
+Each module is imported in a fresh interpreter under `python -X importtime`.
+The script reports the module's cumulative import time and the heaviest
+third-party packages it pulls in. It fails if a module loads a backend that
+should only be imported on first use (Streamlit, pandas, PyMuPDF, Tesseract,
+the OpenAI SDK, the Windows COM modules, ...) or if a module takes longer
+than --budget-ms to import.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time analysis.pipeline --budget-ms 1500 --top 10
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+# Backends that must be imported lazily by the code that uses them
+LAZY_BACKENDS = {
+    'streamlit', 'pandas', 'fitz', 'pymupdf', 'pytesseract', 'openai', 'httpx', 'tiktoken',
+    'mammoth', 'docxcompose', 'reportlab', 'xlrd', 'comtypes', 'pythoncom', 'pywintypes',
+    'win32com', 'win32gui', 'win32ui', 'win32con',
+}
+
+# Written to stderr just before the measured import, after interpreter start-up
+START_MARKER = "-- import starts --"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def package_modules(package="analysis"):
+    """The package and every module in it, except the command line entry point."""
+    names = [package]
+    for file_name in sorted(os.listdir(os.path.join(REPO_ROOT, package))):
+        stem, extension = os.path.splitext(file_name)
+        if extension == ".py" and stem not in ("__init__", "__main__"):
+            names.append(f"{package}.{stem}")
+    return names
+
+
+def measure_import(module):
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns:
+        List of (level, module name, self us, cumulative us) for every import
+        made by the statement, in the order importtime reports them
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.stderr.write('{START_MARKER}\\n'); import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    entries = []
+    started = False
+    for line in result.stderr.splitlines():
+        if line == START_MARKER:
+            started = True
+        if not started or not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # Column header
+        # Top-level imports are indented by one space, each nested level by two more
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((level, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def summarize(module, entries, top):
+    """Return (total ms, heaviest [(package, ms)], lazy backends that were imported)."""
+    total_us = sum(cumulative for level, _, _, cumulative in entries if level == 0)
+
+    # Time spent in each third-party package, counted where the import entered it.
+    # importtime lists a module after its imports, so walk the entries backwards
+    # to see every module's parent first.
+    packages = {}
+    parents = {}
+    for level, name, _, cumulative in reversed(entries):
+        parents[level] = name
+        package = name.split(".")[0]
+        if package == module.split(".")[0] or package.startswith("_") or package in sys.stdlib_module_names:
+            continue
+        parent = parents.get(level - 1) if level > 0 else None
+        if parent is None or parent.split(".")[0] != package:
+            packages[package] = packages.get(package, 0) + cumulative
+    heaviest = sorted((item for item in packages.items() if item[1] >= 1000), key=lambda item: item[1], reverse=True)[:top]
+
+    loaded = sorted({name.split(".")[0] for _, name, _, _ in entries} & LAZY_BACKENDS)
+    return total_us / 1000, [(name, us / 1000) for name, us in heaviest], loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", help="Modules to import (default: the package and each of its modules)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if a module takes longer than this to import")
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest packages to list per module")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'module':<34} {'import ms':>9}  heaviest packages (ms)")
+    for module in args.modules or package_modules():
+        total_ms, heaviest, loaded = summarize(module, measure_import(module), args.top)
+        packages = ", ".join(f"{name} {ms:.0f}" for name, ms in heaviest)
+        print(f"{module:<34} {total_ms:>9.1f}  {packages}")
+
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)} at import time")
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            failures.append(f"{module} took {total_ms:.0f} ms to import (budget {args.budget_ms:.0f} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
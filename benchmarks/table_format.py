@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for table standardisation in ResponsePreprocessor.
+
+Compares the earlier regex-and-replace standardize_table_format, which
+copied the whole response once per table, with the ResponseDocument path
+used now (parse once, standardize every table's separator, render once) on
+synthetic responses with a growing number of tables.
+
+The legacy time grows with tables x document size; the model time grows
+with the document size only. For a handful of tables the single regex pass
+is cheaper than a parse and render, but the parse is shared by every
+preprocessing stage and by ReportGenerator.clean_audit_data.
+
+Run from the repository root:
+
+    python -m benchmarks.table_format
+    python -m benchmarks.table_format --tables 100 200 400 800 1600 --repeat 5
+"""
+import re
+import time
+import argparse
+
+from analysis.response_document import ResponseDocument
+from analysis.response_processor import ResponsePreprocessor
+
+
+def legacy_standardize_table_format(response_text):
+    """The regex-and-replace implementation replaced by the document model, kept for comparison."""
+    table_pattern = r'(\|.*\|[\r\n]+\|[-\s:|]+\|[\r\n]+((?:\|.*\|[\r\n]+)*))'
+    tables = re.finditer(table_pattern, response_text, re.MULTILINE)
+
+    result = response_text
+    for table_match in tables:
+        if not isinstance(table_match, type(None)):
+            table = table_match.group(0)
+            lines = table.split('\n')
+            if len(lines) >= 2:
+                header_line = lines[0]
+                separator_line = lines[1]
+                column_count = header_line.count('|') - 1
+                standard_separator = '|' + '|'.join(['---' for _ in range(column_count)]) + '|'
+                standardized_table = table.replace(separator_line, standard_separator)
+                result = result.replace(table, standardized_table)
+
+    return result
+
+
+def document_standardize_table_format(response_text):
+    """Standardize tables the way ResponsePreprocessor.preprocess does now."""
+    document = ResponseDocument.parse(response_text)
+    ResponsePreprocessor.standardize_table_format(document)
+    return document.render()
+
+
+def synthetic_response(table_count, rows_per_table=8):
+    """Build a response with table_count process tables, each under its own heading."""
+    parts = ["# INTERNAL AUDIT REPORT", ""]
+    for t in range(table_count):
+        parts.append(f"## Process area {t}")
+        parts.append(f"Evidence reviewed for area {t} is summarised below.")
+        parts.append("")
+        parts.append("| PROCESS | SIGHTED EVIDENCE | OK | OFI | NC | NA | ADDITIONAL COMMENTS |")
+        parts.append("|:--------|------------------|:--:|----|----|----|---------------------|")
+        for r in range(rows_per_table):
+            parts.append(f"| Process {t}.{r} | Register entry {r}, form QF-{t:03d} | ✓ |  |  |  | "
+                         f"Records for item {r} were complete and signed off. |")
+        parts.append("")
+    return "\n".join(parts) + "\n"
+
+
+def best_time(func, text, repeat):
+    """Best wall time in seconds over repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[100, 200, 400, 800], help="Table counts to test")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best is reported")
+    args = parser.parse_args(argv)
+
+    print(f"{'tables':>7} {'KB':>7} {'legacy ms':>10} {'us/table':>9} {'model ms':>9} {'us/table':>9} {'speed-up':>9}")
+    for table_count in args.tables:
+        text = synthetic_response(table_count)
+        legacy = best_time(legacy_standardize_table_format, text, args.repeat)
+        model = best_time(document_standardize_table_format, text, args.repeat)
+        print(f"{table_count:>7} {len(text) // 1024:>7} {legacy * 1000:>10.1f} {legacy / table_count * 1e6:>9.1f} "
+              f"{model * 1000:>9.1f} {model / table_count * 1e6:>9.1f} {legacy / model:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Lets `pytest` import the analysis package from the repository root
@@ -0,0 +1,87 @@
+import os
+import threading
+
+import pytest
+
+from analysis import batch
+from analysis.batch import BatchRunner
+from analysis.instrumentation import RunMetrics
+
+
+class FakePipeline:
+    """Stands in for ReportPipeline: writes a placeholder report or fails for sets named 'broken'."""
+
+    STAGES = batch.ReportPipeline.STAGES
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, provider, model, auditor_name):
+        self.timings = {}
+        self.metrics = RunMetrics("fake")
+
+    def run(self, evidence_paths, template_path, output_path=None):
+        with FakePipeline.lock:
+            FakePipeline.running += 1
+            FakePipeline.peak = max(FakePipeline.peak, FakePipeline.running)
+        try:
+            if "broken" in output_path:
+                raise RuntimeError("model unavailable")
+            with open(output_path, 'wb') as f:
+                f.write(b"DOCX")
+            self.timings = {'extract_text': 0.5 * len(evidence_paths), 'llm': 2.0}
+            return {'report_doc': object()}
+        finally:
+            with FakePipeline.lock:
+                FakePipeline.running -= 1
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "ReportPipeline", FakePipeline)
+    root = tmp_path / "evidence"
+    for set_name, files in {"site-b": ["notes.txt", "survey.docx"], "site-a": ["register.xlsx"],
+                            "broken": ["scan.pdf"], "empty": ["ignored.exe"]}.items():
+        (root / set_name).mkdir(parents=True)
+        for name in files:
+            (root / set_name / name).write_bytes(b"evidence")
+    return BatchRunner(str(root), str(tmp_path / "template.docx"), str(tmp_path / "reports"), max_workers=2)
+
+
+def test_each_subdirectory_is_an_evidence_set(runner):
+    sets = runner.discover_evidence_sets()
+    assert list(sets) == ["broken", "site-a", "site-b"]
+    assert [os.path.basename(path) for path in sets["site-b"]] == ["notes.txt", "survey.docx"]
+
+
+def test_root_without_subdirectories_is_one_set(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(b"")
+    (tmp_path / "b.txt").write_bytes(b"")
+    runner = BatchRunner(str(tmp_path), "template.docx", str(tmp_path / "out"))
+    sets = runner.discover_evidence_sets()
+    assert list(sets) == [tmp_path.name]
+    assert len(sets[tmp_path.name]) == 2
+
+
+def test_run_reports_every_set_in_name_order(runner):
+    FakePipeline.peak = 0
+    results = runner.run()
+    assert [r['set_name'] for r in results] == ["broken", "site-a", "site-b"]
+    assert [r['status'] for r in results] == ["failed", "ok", "ok"]
+    assert results[0]['error'] == "model unavailable"
+    assert results[0]['output_path'] is None
+    with open(results[2]['output_path'], 'rb') as f:
+        assert f.read() == b"DOCX"
+    assert results[2]['files'] == 2
+    assert 1 <= FakePipeline.peak <= runner.max_workers
+
+
+def test_timing_summary(runner):
+    summary = BatchRunner.format_timing_summary(runner.run())
+    lines = summary.splitlines()
+    assert lines[0].split() == ["Stage", "Total", "(s)", "Mean", "(s)", "Max", "(s)"]
+    assert lines[1].split() == ["extract_text", "1.50", "0.75", "1.00"]
+    assert lines[2].split() == ["llm", "4.00", "2.00", "2.00"]
+    assert "API calls: 0 (0 cached)" in summary
+    assert "Reports generated: 2/3" in summary
+    assert "  FAILED broken: model unavailable" in lines
@@ -0,0 +1,93 @@
+import collections
+
+import pytest
+from docx import Document
+
+from analysis.evidence_cache import EvidenceCache
+from analysis.template_analyzer import CompiledTemplate
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    doc = Document()
+    doc.add_paragraph("Audit Report")
+    header = doc.add_table(rows=3, cols=2)
+    for row, label in zip(header.rows, ("Audit Title", "Auditee", "Audit Title")):
+        row.cells[0].text = label
+    legend = doc.add_table(rows=2, cols=2)
+    for row, label in zip(legend.rows, ("NC", "OFI")):
+        row.cells[0].text = label
+    evidence = doc.add_table(rows=3, cols=7)
+    evidence.rows[0].cells[0].text = "Process"
+    evidence.rows[1].cells[0].text = "Example evidence"
+    findings = doc.add_table(rows=2, cols=2)
+    for row, label in zip(findings.rows, ("Strengths", "Auditor")):
+        row.cells[0].text = label
+
+    path = tmp_path / "template.docx"
+    doc.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = EvidenceCache(cache_dir=str(tmp_path / "evidence"))
+    monkeypatch.setattr(EvidenceCache, "_default", cache)
+    monkeypatch.setattr(CompiledTemplate, "_memory", collections.OrderedDict())
+    monkeypatch.setattr(CompiledTemplate, "_path_hashes", collections.OrderedDict())
+    return cache
+
+
+def test_compile_records_field_coordinates(template_path):
+    compiled = CompiledTemplate.compile(template_path)
+    assert compiled.has_report_tables
+    assert compiled.header_fields == {"Audit Title": [0, 2], "Auditee": [1]}
+    assert compiled.legend_fields == {"NC": 0, "OFI": 1}
+    assert compiled.evidence_rows == [7, 7]
+    assert compiled.findings_fields == [(0, "Strengths"), (1, "Auditor")]
+    # The example evidence is part of the prompt but not of the skeleton
+    assert "Example evidence" in compiled.prompt
+    skeleton = compiled.new_document()
+    assert skeleton.tables[2].rows[1].cells[0].text == ""
+    assert skeleton.tables[2].rows[0].cells[0].text == "Process"
+
+
+def test_dict_round_trip(template_path):
+    compiled = CompiledTemplate.compile(template_path)
+    restored = CompiledTemplate.from_dict(compiled.to_dict())
+    assert vars(restored) == vars(compiled)
+
+
+def test_load_reuses_memory_then_disk(template_path, cache):
+    compiled = CompiledTemplate.load(template_path)
+    assert CompiledTemplate.load(template_path) is compiled
+
+    # A fresh process finds the compiled template in the evidence cache
+    CompiledTemplate._memory.clear()
+    hits = cache.stats()['hits']
+    restored = CompiledTemplate.load(template_path)
+    assert restored is not compiled
+    assert cache.stats()['hits'] == hits + 1
+    assert vars(restored) == vars(compiled)
+
+
+def test_malformed_cache_entry_is_recompiled(template_path, cache):
+    template_hash = EvidenceCache.hash_file(template_path)
+    cache.set(f"{template_hash}-template-v{CompiledTemplate.VERSION}", {'prompt': "incomplete"})
+    compiled = CompiledTemplate.load(template_path)
+    assert compiled.has_report_tables
+    assert compiled.template_hash == template_hash
+
+
+def test_path_hashes_are_bounded(template_path, cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(CompiledTemplate, "MEMORY_ENTRIES", 2)
+    with open(template_path, 'rb') as f:
+        template = f.read()
+    # Each job writes the same template to its own path
+    for job in range(5):
+        path = tmp_path / f"job-{job}.docx"
+        path.write_bytes(template)
+        compiled = CompiledTemplate.load(str(path))
+    assert len(CompiledTemplate._path_hashes) == 2
+    assert len(CompiledTemplate._memory) == 1
+    assert compiled.template_hash == EvidenceCache.hash_file(template_path)
@@ -0,0 +1,41 @@
+from concurrent.futures import CancelledError
+
+import pytest
+
+from analysis.converter_pool import ConverterPool, _Task
+
+
+@pytest.fixture
+def pool():
+    pool = ConverterPool(size=1, task_timeout=60)
+    yield pool
+    pool.shutdown()
+
+
+def test_workers_are_spawned_not_forked(pool):
+    assert pool._context.get_start_method() == "spawn"
+
+
+def test_requests_round_trip_through_a_worker(pool):
+    assert pool.submit("ping").result(timeout=60) is True
+    with pytest.raises(RuntimeError, match="No document renderer available"):
+        pool.submit("pdf", "file.unknown", ".").result(timeout=60)
+    assert pool.stats()['completed'] == 2
+
+
+def test_shutdown_resolves_every_queued_request():
+    pool = ConverterPool(size=1)
+    queued = _Task(1, "render", ("a.docx", 1, None), 60)
+    # A request requeued after its worker died is already running
+    retried = _Task(2, "render", ("b.docx", 1, None), 60)
+    retried.future.set_running_or_notify_cancel()
+    retried.retried = True
+    pool._pending.extend([queued, retried])
+
+    pool.shutdown()
+    with pytest.raises(CancelledError):
+        queued.future.result(timeout=1)
+    with pytest.raises(RuntimeError, match="shut down"):
+        retried.future.result(timeout=1)
+    with pytest.raises(RuntimeError, match="shut down"):
+        pool.submit("ping")
@@ -0,0 +1,84 @@
+import collections
+
+import pytest
+
+from analysis.corrective_extractor import CorrectiveActionsExtractor
+from analysis.llm_processor import LLMProcessor
+
+
+REPORT = (
+    "AUDIT TYPE\nInternal\n"
+    "OPPORTUNITIES FOR IMPROVEMENTS\nYes\n"
+    "AUDIT REPORT FINAL COMMENTS\nCalibration records for two gauges were overdue and need a review.\n"
+)
+
+LLM_RESULT = {
+    "details": "Calibration records for two gauges were overdue",
+    "corrective_actions": "Recalibrate the gauges and add them to the calibration schedule",
+    "source_of_issue": "Internal Audit",
+}
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    calls = []
+    responses = collections.deque()
+
+    def extract_corrective_actions(report_content):
+        calls.append(report_content)
+        return responses.popleft()
+
+    monkeypatch.setattr(LLMProcessor, "extract_corrective_actions", staticmethod(extract_corrective_actions))
+    monkeypatch.setattr(CorrectiveActionsExtractor, "_memo", collections.OrderedDict())
+    return collections.namedtuple("llm", "calls responses")(calls, responses)
+
+
+def test_successful_extraction_is_reused(llm):
+    llm.responses.append(LLM_RESULT)
+    cache = {}
+    data, cached = CorrectiveActionsExtractor.extract_from_report_cached(REPORT, "01/01/2026", cache=cache)
+    assert not cached
+    assert data["Corrective Actions Implemented"] == LLM_RESULT["corrective_actions"]
+
+    again, cached = CorrectiveActionsExtractor.extract_from_report_cached(REPORT, "01/01/2026", cache=cache)
+    assert cached
+    assert again == data
+    assert len(llm.calls) == 1
+
+
+def test_failed_llm_extraction_is_not_cached(llm):
+    llm.responses.extend([None, LLM_RESULT])
+    data, cached = CorrectiveActionsExtractor.extract_from_report_cached(REPORT, "01/01/2026")
+    assert not cached
+    assert data["Corrective Actions Implemented"] != LLM_RESULT["corrective_actions"]
+    assert not CorrectiveActionsExtractor._memo
+
+    # The next call retries the LLM instead of serving the fallback
+    data, cached = CorrectiveActionsExtractor.extract_from_report_cached(REPORT, "01/01/2026")
+    assert not cached
+    assert data["Corrective Actions Implemented"] == LLM_RESULT["corrective_actions"]
+    assert len(llm.calls) == 2
+
+
+def test_llm_exception_reports_incomplete(monkeypatch):
+    def fail(report_content):
+        raise RuntimeError("service unavailable")
+
+    monkeypatch.setattr(LLMProcessor, "extract_corrective_actions", staticmethod(fail))
+    data, complete = CorrectiveActionsExtractor.extract_with_status(REPORT, "01/01/2026")
+    assert not complete
+    assert data["Details"]
+    assert CorrectiveActionsExtractor.extract_from_report(REPORT, "01/01/2026") == data
+
+
+def test_default_memo_is_bounded(llm, monkeypatch):
+    monkeypatch.setattr(CorrectiveActionsExtractor, "MEMO_ENTRIES", 2)
+    llm.responses.extend([LLM_RESULT] * 4)
+    for date in ("01/01/2026", "02/01/2026", "03/01/2026"):
+        CorrectiveActionsExtractor.extract_from_report_cached(REPORT, date)
+    assert len(CorrectiveActionsExtractor._memo) == 2
+
+    # The oldest report was dropped; the newest are still served from the memo
+    assert CorrectiveActionsExtractor.extract_from_report_cached(REPORT, "03/01/2026")[1]
+    assert not CorrectiveActionsExtractor.extract_from_report_cached(REPORT, "01/01/2026")[1]
+    assert len(llm.calls) == 4
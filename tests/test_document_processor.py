@@ -0,0 +1,59 @@
+import threading
+
+import fitz
+import pytest
+
+from analysis import document_processor
+from analysis.document_processor import DocumentProcessor
+from analysis.evidence_cache import EvidenceCache
+
+
+@pytest.fixture
+def pdf_files(tmp_path):
+    paths = []
+    for name in ("audit-a", "audit-b"):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), f"Evidence from {name}")
+        path = tmp_path / f"{name}.pdf"
+        doc.save(str(path))
+        doc.close()
+        paths.append(str(path))
+    (tmp_path / "notes.txt").write_text("Calibration records were reviewed")
+    paths.append(str(tmp_path / "notes.txt"))
+    return paths
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    started = []
+
+    class RecordingPool(document_processor.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            started.append(kwargs.get('mp_context'))
+
+    monkeypatch.setattr(document_processor, "ProcessPoolExecutor", RecordingPool)
+    return started
+
+
+def test_process_files_from_a_worker_thread(pdf_files, pools, tmp_path):
+    cache = EvidenceCache(cache_dir=str(tmp_path / "cache"))
+    results = []
+    # Another thread holds a lock throughout, as the server and job workers do
+    held = threading.Lock()
+    held.acquire()
+    worker = threading.Thread(target=lambda: results.extend(DocumentProcessor.process_files(pdf_files, cache=cache)))
+    worker.start()
+    worker.join(120)
+    held.release()
+
+    assert not worker.is_alive()
+    assert [result['file_path'] for result in results] == pdf_files
+    assert "Evidence from audit-a" in results[0]['text']
+    assert "Evidence from audit-b" in results[1]['text']
+    assert "Calibration records" in results[2]['text']
+    assert [context.get_start_method() for context in pools] == ["spawn"]
+
+    # The second run is served from the cache without a process pool
+    assert [r['text'] for r in DocumentProcessor.process_files(pdf_files, cache=cache)] == [r['text'] for r in results]
+    assert len(pools) == 1
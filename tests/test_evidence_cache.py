@@ -0,0 +1,130 @@
+import os
+import pickle
+import stat
+
+import pytest
+
+from analysis import evidence_cache
+from analysis.evidence_cache import EvidenceCache, ensure_private_dir
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EvidenceCache(cache_dir=str(tmp_path / "evidence"))
+
+
+@pytest.fixture
+def evidence_file(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"Calibration records were reviewed")
+    return str(path)
+
+
+def test_miss_then_hit(cache, evidence_file):
+    key = cache.key_for_file(evidence_file, "text", 1)
+    assert cache.get(key) is None
+    cache.set(key, "Calibration records were reviewed")
+    assert cache.get(key) == "Calibration records were reviewed"
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_key_follows_content_and_version(cache, evidence_file, tmp_path):
+    key = cache.key_for_file(evidence_file, "text", 1)
+    cache.set(key, "cached text")
+
+    # A new extractor version misses, and so does a changed file
+    assert cache.get(cache.key_for_file(evidence_file, "text", 2)) is None
+    assert cache.get(cache.key_for_file(evidence_file, "screenshots", 1)) is None
+    with open(evidence_file, 'ab') as f:
+        f.write(b" and signed off")
+    assert cache.get(cache.key_for_file(evidence_file, "text", 1)) is None
+
+    # The same bytes under another name hit
+    copy = tmp_path / "renamed.txt"
+    copy.write_bytes(b"Calibration records were reviewed")
+    assert cache.get(cache.key_for_file(str(copy), "text", 1)) == "cached text"
+
+
+def test_screenshots_round_trip_with_raw_bytes(cache):
+    images = [
+        {'data': b"\x89PNG\r\n\x1a\n\x00", 'format': 'png', 'source': "a.pdf", 'description': "Page 1"},
+        {'data': b"", 'format': 'png', 'source': "a.pdf", 'description': "Page 2"},
+    ]
+    cache.set("ab-screenshots-v1", images)
+    assert cache.get("ab-screenshots-v1") == images
+
+    # The image bytes are stored as they are, not base64 or pickled
+    with open(cache._entry_path("ab-screenshots-v1"), 'rb') as f:
+        assert b"\x89PNG\r\n\x1a\n\x00" in f.read()
+
+
+def test_unsupported_values_are_not_stored(cache):
+    cache.set("cd-text-v1", object())
+    assert cache.get("cd-text-v1") is None
+    assert os.listdir(os.path.dirname(cache._entry_path("cd-text-v1"))) == []
+
+
+def test_planted_pickle_is_never_loaded(cache):
+    class Exploit:
+        def __reduce__(self):
+            return (exec, ("raise SystemExit('unpickled')",))
+
+    key = "ef-text-v1"
+    os.makedirs(os.path.dirname(cache._entry_path(key)), exist_ok=True)
+    for path in (cache._entry_path(key), cache._entry_path(key)[:-len(cache.ENTRY_SUFFIX)] + ".pkl"):
+        with open(path, 'wb') as f:
+            pickle.dump(Exploit(), f)
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._entry_path(key))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EvidenceCache(cache_dir=str(tmp_path / "evidence"), max_bytes=2500)
+    for name in ("aa", "bb", "cc"):
+        cache.set(f"{name}-text-v1", "x" * 1000)
+        # Distinct modification times order the entries for eviction
+        os.utime(cache._entry_path(f"{name}-text-v1"), (0, {"aa": 1, "bb": 2, "cc": 3}[name]))
+    cache.set("dd-text-v1", "x" * 1000)
+    assert cache.get("aa-text-v1") is None
+    assert cache.get("dd-text-v1") is not None
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = EvidenceCache(cache_dir=str(tmp_path / "evidence"), enabled=False)
+    cache.set("aa-text-v1", "text")
+    assert cache.get("aa-text-v1") is None
+    assert not os.path.exists(tmp_path / "evidence")
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_default_directory_is_private_to_the_user(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / "home-cache"))
+    cache = EvidenceCache()
+    assert cache.cache_dir == str(tmp_path / "home-cache" / "report_generation" / "evidence")
+    assert stat.S_IMODE(os.stat(cache.cache_dir).st_mode) == 0o700
+
+    # An existing directory with loose permissions is tightened
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    ensure_private_dir(str(shared))
+    assert stat.S_IMODE(os.stat(shared).st_mode) == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_directory_owned_by_another_user_disables_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(evidence_cache.os, 'getuid', lambda: os.stat(tmp_path).st_uid + 1)
+    cache = EvidenceCache(cache_dir=str(tmp_path / "evidence"))
+    assert not cache.enabled
+    cache.set("aa-text-v1", "text")
+    assert cache.get("aa-text-v1") is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason="needs symlinks")
+def test_symlinked_directory_is_refused(tmp_path):
+    target = tmp_path / "target"
+    target.mkdir()
+    link = tmp_path / "link"
+    os.symlink(target, link)
+    with pytest.raises(PermissionError):
+        ensure_private_dir(str(link))
@@ -0,0 +1,82 @@
+import os
+import random
+
+from analysis.evidence_index import EvidenceIndex, get_evidence_index, keywords
+
+
+FILES = [
+    "Company_A Survey.docx",
+    "Complaints Register.xlsx",
+    "Calibration-Records.pdf",
+    "evidence/Training Matrix.xlsx",
+    "Company_B Survey.docx",
+]
+
+
+def naive_match_cell(files, evidence_text, process_text=None):
+    for file in files:
+        if any(part in evidence_text.lower() for part in file.lower().split('.')):
+            return file
+        if process_text is not None and os.path.basename(file).lower().split('.')[0] in process_text.lower():
+            return file
+    return None
+
+
+def naive_related_files(files, name):
+    query = name.lower()
+    return [file for file in files if query in file.lower() or file.lower().split('.')[0] in query]
+
+
+def test_keywords():
+    assert keywords("Company_A Survey.docx") == {"company", "a", "survey", "docx"}
+    assert keywords("") == set()
+
+
+def test_match_cell_takes_the_first_matching_file():
+    index = EvidenceIndex(FILES)
+    assert index.match_cell("Sighted: complaints register.xlsx") == "Complaints Register.xlsx"
+    assert index.match_cell("nothing relevant") is None
+    # The process text can match an earlier file than the evidence text
+    assert index.match_cell("calibration-records.pdf", "Company_A Survey review") == "Company_A Survey.docx"
+
+
+def test_match_cell_agrees_with_a_scan_of_every_file():
+    rng = random.Random(3)
+    words = ["company_a survey", "docx", "complaints register", "calibration-records", "training matrix",
+             "xlsx", "survey", "company_b", "other", ""]
+    index = EvidenceIndex(FILES)
+    for _ in range(300):
+        evidence_text = " ".join(rng.sample(words, 2))
+        process_text = rng.choice([None, " ".join(rng.sample(words, 2))])
+        assert index.match_cell(evidence_text, process_text) == naive_match_cell(FILES, evidence_text, process_text)
+
+
+def test_match_process_prefers_unused_files():
+    index = EvidenceIndex(FILES)
+    used = set()
+    assert index.match_process("Customer surveys", "Company_B Survey.docx", used) == "Company_B Survey.docx"
+    # A shared keyword picks the next unused survey
+    assert index.match_process("Customer surveys", "survey", used) == "Company_A Survey.docx"
+    assert index.match_process("Calibration", "", used) == "Calibration-Records.pdf"
+    # With no relevant file left, any unused file is taken
+    assert index.match_process("Management review", "", used) == "Complaints Register.xlsx"
+    assert index.match_process("Management review", "", used) == "evidence/Training Matrix.xlsx"
+    assert used == set(FILES)
+
+    # Once everything is used, the most relevant file is reused
+    assert index.match_process("Training", "matrix", used) == "evidence/Training Matrix.xlsx"
+    assert index.match_process("Unrelated", "", used) == FILES[0]
+    assert EvidenceIndex([]).match_process("Training", "", set()) is None
+
+
+def test_related_files_and_stems():
+    index = EvidenceIndex(FILES)
+    for name in ("survey", "Complaints Register.xlsx and more", "company_b survey", "missing"):
+        assert index.related_files(name) == naive_related_files(FILES, name)
+    assert index.files_with_stem("Calibration-Records", "missing") == ["Calibration-Records.pdf"]
+    assert index.files_with_stem("calibration-records") == []
+
+
+def test_index_is_shared_per_file_list():
+    assert get_evidence_index(FILES) is get_evidence_index(dict.fromkeys(FILES))
+    assert len(get_evidence_index(FILES)) == len(FILES)
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+from analysis.excel_handler import (
+    ACTION_FIELDS, ENTRY_STYLE, FIRST_DATA_ROW, OPEN_ENTRY_STYLE, ExcelHandler,
+)
+
+
+def action(details, close_out=""):
+    return {
+        "Date": "01/01/2026",
+        "Source of Issue": "Internal Audit",
+        "Type": "Nonconformance",
+        "Details": details,
+        "Root Cause": "Training",
+        "Person": "Quality manager",
+        "Corrective Actions Implemented": "Retrain staff",
+        "Actual close out date": close_out,
+    }
+
+
+def register_bytes(*actions):
+    workbook = ExcelHandler.add_actions_to_register(None, list(actions))
+    return ExcelHandler.save_register_to_bytes(workbook)
+
+
+def action_rows(data):
+    sheet = load_workbook(io.BytesIO(data)).active
+    return [list(row) for row in sheet.iter_rows(min_row=FIRST_DATA_ROW, max_col=len(ACTION_FIELDS), values_only=True)
+            if any(value not in (None, '') for value in row)]
+
+
+def test_new_register_starts_after_the_header():
+    sheet = ExcelHandler.create_new_register().active
+    assert ExcelHandler.find_append_row(sheet) == FIRST_DATA_ROW
+
+
+def test_append_row_skips_formatted_trailing_rows():
+    workbook = ExcelHandler.add_actions_to_register(None, [action("First"), action("Second")])
+    sheet = workbook.active
+    # Rows that only carry formatting do not count as actions
+    sheet.cell(row=FIRST_DATA_ROW + 10, column=1).style = ENTRY_STYLE
+    assert ExcelHandler.find_append_row(sheet) == FIRST_DATA_ROW + 2
+
+
+def test_actions_are_appended_with_shared_styles():
+    data = register_bytes(action("Open issue"), action("Closed issue", "02/02/2026"))
+    sheet = load_workbook(io.BytesIO(data)).active
+    assert sheet.cell(row=FIRST_DATA_ROW, column=4).value == "Open issue"
+    assert sheet.cell(row=FIRST_DATA_ROW, column=1).style == OPEN_ENTRY_STYLE
+    assert sheet.cell(row=FIRST_DATA_ROW + 1, column=1).style == ENTRY_STYLE
+
+    updated = ExcelHandler.add_action_to_register(io.BytesIO(data), action("Third"))
+    rows = action_rows(ExcelHandler.save_register_to_bytes(updated))
+    assert [row[3] for row in rows] == ["Open issue", "Closed issue", "Third"]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_streaming_and_in_place_writes_agree(streaming):
+    existing = register_bytes(action("Open issue"), action("Closed issue", "02/02/2026"))
+    workbook = ExcelHandler.add_actions_to_register(io.BytesIO(existing), [action("New"), action("Newer", "03/03/2026")],
+                                                    streaming=streaming)
+    data = ExcelHandler.save_register_to_bytes(workbook)
+    rows = action_rows(data)
+    assert [row[3] for row in rows] == ["Open issue", "Closed issue", "New", "Newer"]
+    assert rows[2] == [action("New")[field] or None for field in ACTION_FIELDS]
+
+    sheet = load_workbook(io.BytesIO(data)).active
+    assert sheet.title == "CORRECTIVE ACTIONS REGISTER"
+    assert sheet.cell(row=1, column=1).value == "CORRECTIVE ACTIONS REGISTER"
+    assert sheet.cell(row=5, column=4).value == "Details"
+    # Styles survive the round trip, both for copied rows and for new ones
+    assert sheet.cell(row=FIRST_DATA_ROW, column=1).fill.start_color.rgb.endswith("FFFF00")
+    assert sheet.cell(row=FIRST_DATA_ROW + 2, column=1).style == OPEN_ENTRY_STYLE
+    assert sheet.cell(row=FIRST_DATA_ROW + 3, column=1).style == ENTRY_STYLE
@@ -0,0 +1,133 @@
+import os
+import stat
+import time
+
+import pytest
+
+from analysis import jobs
+from analysis.jobs import JobQueue, DONE, FAILED, QUEUED, RUNNING
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(job_dir=str(tmp_path))
+
+
+def submit(queue):
+    return queue.submit([("notes.txt", b"evidence")], ("template.docx", b"template"), auditor_name="A. Auditor")
+
+
+@pytest.fixture
+def stale_after(monkeypatch):
+    monkeypatch.setattr(jobs, "STALE_AFTER", 0.05)
+    monkeypatch.setattr(jobs, "MAX_ATTEMPTS", 3)
+
+
+def test_submit_and_claim(queue):
+    job_id = submit(queue)
+    assert queue.get(job_id)['status'] == QUEUED
+    evidence_paths, template_path = queue.input_files(job_id)
+    assert [os.path.basename(path) for path in evidence_paths] == ["notes.txt"]
+    assert os.path.basename(template_path) == "template.docx"
+
+    job = queue.claim("worker-a")
+    assert job['id'] == job_id
+    assert job['status'] == RUNNING
+    assert job['worker'] == "worker-a"
+    assert queue.claim("worker-b") is None
+
+
+def test_complete_stores_result_and_releases_inputs(queue):
+    job_id = submit(queue)
+    queue.claim("worker-a")
+    assert queue.heartbeat(job_id, "worker-a", 0.5, "Halfway", preview="# Report")
+    assert queue.get(job_id)['preview'] == "# Report"
+
+    assert queue.complete(job_id, "worker-a", b"DOCX", "# Report", [("shot.png", b"\x89PNG")], {'api': {}})
+    assert queue.get(job_id)['status'] == DONE
+    result = queue.result(job_id)
+    assert result['report_bytes'] == b"DOCX"
+    assert result['previews'] == [("shot.png", b"\x89PNG")]
+    assert result['metrics'] == {'api': {}}
+    assert not os.path.exists(queue.input_dir(job_id))
+
+
+def test_stale_worker_cannot_touch_requeued_job(queue, stale_after):
+    job_id = submit(queue)
+    queue.claim("worker-a")
+    time.sleep(0.1)
+    job = queue.claim("worker-b")
+    assert job['id'] == job_id
+    assert job['attempts'] == 2
+
+    # worker-a wakes up after its job was handed to worker-b
+    assert not queue.heartbeat(job_id, "worker-a", 0.9, "Stale progress")
+    assert not queue.complete(job_id, "worker-a", b"STALE", "stale", [], {})
+    assert not queue.fail(job_id, "worker-a", "stale failure")
+    job = queue.get(job_id)
+    assert job['status'] == RUNNING
+    assert job['worker'] == "worker-b"
+    assert job['message'] != "Stale progress"
+    assert os.path.exists(queue.input_dir(job_id))
+
+    assert queue.complete(job_id, "worker-b", b"DOCX", "# Report", [], {})
+    assert queue.result(job_id)['report_bytes'] == b"DOCX"
+
+
+def test_job_abandoned_too_often_fails(queue, stale_after, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_ATTEMPTS", 1)
+    job_id = submit(queue)
+    queue.claim("worker-a")
+    time.sleep(0.1)
+    assert queue.claim("worker-b") is None
+    assert queue.get(job_id)['status'] == FAILED
+    assert not os.path.exists(queue.input_dir(job_id))
+
+
+def test_claims_are_served_oldest_first(queue):
+    first, second = submit(queue), submit(queue)
+    assert queue.position(second) == 1
+    assert queue.claim("worker-a")['id'] == first
+    assert queue.claim("worker-b")['id'] == second
+
+
+def test_previews_are_stored_as_json_not_pickles(queue):
+    import pickle
+    import sqlite3
+
+    job_id = submit(queue)
+    queue.claim("worker-a")
+    queue.complete(job_id, "worker-a", b"DOCX", "", [("a.png", b"\x00\x01"), ("b.png", b"")], {})
+    with sqlite3.connect(queue.db_path) as conn:
+        stored = conn.execute("SELECT previews FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert isinstance(stored, str) and '"caption": "a.png"' in stored
+    assert queue.result(job_id)['previews'] == [("a.png", b"\x00\x01"), ("b.png", b"")]
+
+    # A planted pickle is never unpickled
+    class Exploit:
+        def __reduce__(self):
+            return (exec, ("raise SystemExit('unpickled')",))
+    with sqlite3.connect(queue.db_path) as conn:
+        conn.execute("UPDATE jobs SET previews = ? WHERE id = ?", (pickle.dumps(Exploit()), job_id))
+    assert queue.result(job_id)['previews'] == []
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_job_directory_is_private_to_the_user(tmp_path):
+    job_dir = tmp_path / "jobs"
+    queue = JobQueue(job_dir=str(job_dir))
+    assert stat.S_IMODE(os.stat(job_dir).st_mode) == 0o700
+
+    # A queue directory left open to other users is tightened
+    job_dir.chmod(0o777)
+    JobQueue(job_dir=str(job_dir))
+    assert stat.S_IMODE(os.stat(job_dir).st_mode) == 0o700
+    assert queue.get(submit(queue))['status'] == QUEUED
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_job_directory_owned_by_another_user_is_refused(tmp_path, monkeypatch):
+    JobQueue(job_dir=str(tmp_path / "jobs"))
+    monkeypatch.setattr(os, 'getuid', lambda: os.stat(tmp_path).st_uid + 1)
+    with pytest.raises(PermissionError):
+        JobQueue(job_dir=str(tmp_path / "jobs"))
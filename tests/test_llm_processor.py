@@ -0,0 +1,84 @@
+import sys
+import collections
+
+import pytest
+
+from analysis import tokenizer
+from analysis.evidence_corpus import EvidenceCorpus
+from analysis.llm_processor import LLMProcessor
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    prompts = []
+
+    def analyze_with_openai(prompt, model="gpt-4o", on_delta=None):
+        prompts.append(prompt)
+        return f"response {len(prompts)}"
+
+    monkeypatch.setattr(LLMProcessor, "analyze_with_openai", staticmethod(analyze_with_openai))
+    return prompts
+
+
+def large_corpus(files=3, paragraphs=40):
+    corpus = EvidenceCorpus()
+    for index in range(files):
+        corpus.add(f"file-{index}.txt", "\n\n".join(f"Paragraph {p} of file {index} " + "evidence " * 30
+                                                   for p in range(paragraphs)))
+    return corpus
+
+
+def test_batched_evidence_reports_progress_without_streamlit(fake_openai, monkeypatch):
+    # Importing streamlit would fail: the batch path must not need it
+    monkeypatch.setitem(sys.modules, "streamlit", None)
+    monkeypatch.setattr(LLMProcessor, "get_available_tokens", staticmethod(lambda model: 3000))
+    updates = []
+    report = LLMProcessor.process_batch_with_openai(large_corpus(), "TEMPLATE", "A. Auditor",
+                                                    on_progress=lambda message, fraction: updates.append((message, fraction)))
+
+    chunk_count = len(fake_openai) - 1
+    assert chunk_count > 1
+    assert report == f"response {chunk_count + 1}"
+    assert updates[0][0] == f"Processing {chunk_count} evidence chunks..."
+    assert updates[-2:] == [("Generating final comprehensive report...", 0.9), ("Report generation complete!", 1.0)]
+    fractions = [fraction for _, fraction in updates]
+    assert fractions == sorted(fractions)
+
+
+def test_evidence_that_fits_is_sent_in_one_prompt(fake_openai):
+    updates = []
+    LLMProcessor.process_batch_with_openai(large_corpus(files=1, paragraphs=2), "TEMPLATE", "A. Auditor",
+                                           on_progress=lambda message, fraction: updates.append(message))
+    assert len(fake_openai) == 1
+    assert updates == []
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    texts = collections.Counter()
+    count = LLMProcessor.estimate_token_count
+
+    def estimate_token_count(text, model="gpt-4o"):
+        texts[text] += 1
+        return count(text, model)
+
+    monkeypatch.setattr(LLMProcessor, "estimate_token_count", staticmethod(estimate_token_count))
+    return texts
+
+
+def test_chunking_a_corpus_counts_each_text_once(counted):
+    corpus = large_corpus()
+    for segment in corpus.segments:
+        segment.token_count
+    chunks = LLMProcessor.chunk_evidence(corpus, max_tokens=1500, chunk_size=750)
+
+    # Segment counts are reused, and every paragraph is tokenized once
+    assert not any(segment.text in counted for segment in corpus.segments)
+    paragraphs = [para for segment in corpus.segments for para in segment.text.split("\n\n")]
+    assert all(counted[para] == 1 for para in paragraphs)
+
+    assert len(chunks) > 1
+    assert all(tokenizer.count_tokens(chunk) <= 1500 for chunk in chunks)
+    for paragraph in paragraphs:
+        assert sum(paragraph in chunk for chunk in chunks) == 1
+
@@ -0,0 +1,150 @@
+import time
+
+import pytest
+
+from analysis import llm_scheduler
+from analysis.llm_scheduler import (
+    LLMDeadlineExceeded, LLMRateLimitError, LLMRequestError, LLMServiceError,
+    RequestScheduler, TokenBucket, deadline_scope, resolve_deadline,
+)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "BACKOFF_BASE", 0.01)
+
+
+def failing(*errors, result="ok", used=None):
+    """send() that raises the given errors in turn, then returns result."""
+    calls = []
+
+    def send(timeout):
+        calls.append(timeout)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result, used
+    send.calls = calls
+    return send
+
+
+def test_success_needs_no_retry():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+    result, retries, _ = scheduler.execute("gpt-4o", failing(), timeout=5)
+    assert (result, retries) == ("ok", 0)
+
+
+def test_retryable_errors_are_retried():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=3)
+    send = failing(LLMServiceError("502", status_code=502), LLMRateLimitError("429", status_code=429))
+    result, retries, waited = scheduler.execute("gpt-4o", send, timeout=5)
+    assert (result, retries) == ("ok", 2)
+    assert len(send.calls) == 3
+    assert waited >= 0
+
+
+def test_request_errors_are_not_retried():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+    send = failing(LLMRequestError("400", status_code=400))
+    with pytest.raises(LLMRequestError) as raised:
+        scheduler.execute("gpt-4o", send)
+    assert raised.value.attempts == 1
+    assert len(send.calls) == 1
+
+
+def test_exhausted_quota_is_not_retried():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+    send = failing(LLMRateLimitError("insufficient_quota", status_code=429, retryable=False))
+    with pytest.raises(LLMRateLimitError):
+        scheduler.execute("gpt-4o", send)
+    assert len(send.calls) == 1
+
+
+def test_retries_are_limited():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=2)
+    send = failing(*[LLMServiceError("503", status_code=503)] * 5)
+    with pytest.raises(LLMServiceError) as raised:
+        scheduler.execute("gpt-4o", send)
+    assert raised.value.attempts == 3
+    assert len(send.calls) == 3
+
+
+def test_backoff_is_bounded_and_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "BACKOFF_BASE", 1)
+    monkeypatch.setattr(llm_scheduler, "BACKOFF_MAX", 4)
+    scheduler = RequestScheduler()
+    error = LLMServiceError("503")
+    assert all(0 <= scheduler.backoff(attempt, error) <= 4 for attempt in range(10) for _ in range(20))
+    assert scheduler.backoff(0, LLMRateLimitError("429", retry_after=7)) >= 7
+
+
+def test_backoff_past_the_deadline_fails_fast():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+    send = failing(LLMRateLimitError("429", retry_after=30))
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded) as raised:
+        scheduler.execute("gpt-4o", send, deadline=time.monotonic() + 1)
+    assert time.monotonic() - start < 1
+    assert isinstance(raised.value.__cause__, LLMRateLimitError)
+
+
+def test_attempt_timeout_is_capped_by_the_deadline():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+    send = failing()
+    with deadline_scope(2):
+        scheduler.execute("gpt-4o", send, timeout=60)
+    assert 0 < send.calls[0] <= 2
+
+
+def test_passed_deadline_is_never_sent():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+    send = failing()
+    with pytest.raises(LLMDeadlineExceeded):
+        scheduler.execute("gpt-4o", send, deadline=time.monotonic() - 1)
+    assert send.calls == []
+
+
+def test_deadline_scopes_only_shorten():
+    assert resolve_deadline() is None
+    with deadline_scope(10) as outer:
+        with deadline_scope(100) as inner:
+            assert inner == outer
+        with deadline_scope(1) as inner:
+            assert inner < outer
+            assert resolve_deadline(outer) == inner
+    assert resolve_deadline() is None
+
+
+def test_rate_limit_waits_past_the_deadline_fail_fast():
+    scheduler = RequestScheduler(requests_per_minute=60, tokens_per_minute=0)
+    # Sixty requests empty the bucket; the next one would wait about a second
+    for _ in range(60):
+        scheduler.execute("gpt-4o", failing())
+    with pytest.raises(LLMDeadlineExceeded):
+        scheduler.execute("gpt-4o", failing(), deadline=time.monotonic() + 0.2)
+
+
+def test_token_bucket_reserves_into_debt_and_refunds():
+    bucket = TokenBucket(600)
+    assert bucket.reserve(600) == 0
+    wait = bucket.reserve(100)
+    assert wait == pytest.approx(10, abs=0.1)
+    # Refunding the debt leaves an empty bucket
+    bucket.refund(100)
+    assert bucket.reserve(50) == pytest.approx(5, abs=0.1)
+
+    # A request larger than the bucket waits for a full bucket, not forever
+    assert TokenBucket(60).reserve(1000) == 0
+
+
+def test_token_bucket_pause_delays_new_reservations():
+    bucket = TokenBucket(600)
+    bucket.pause(5)
+    assert 4 < bucket.paused_for() <= 5
+    assert bucket.reserve(1) > 4
+
+
+def test_tokens_are_settled_against_usage():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=1000)
+    scheduler.execute("gpt-4o", failing(used=100), token_estimate=900)
+    _, tokens = scheduler._model_buckets("gpt-4o")
+    assert tokens.tokens == pytest.approx(900, abs=5)
@@ -0,0 +1,60 @@
+import os
+import stat
+import time
+
+import pytest
+
+from analysis.response_cache import ResponseCache, SQLiteResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteResponseCache(db_path=str(tmp_path / "responses.sqlite3"))
+
+
+MESSAGES = [{"role": "user", "content": "Summarise the evidence"}]
+
+
+def test_miss_then_hit(cache):
+    key = ResponseCache.make_key("gpt-4o", 0.2, 1000, MESSAGES)
+    assert cache.get(key) is None
+    cache.set(key, "Summary")
+    assert cache.get(key) == "Summary"
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_key_covers_model_settings_and_messages():
+    key = ResponseCache.make_key("gpt-4o", 0.2, 1000, MESSAGES)
+    assert key == ResponseCache.make_key("gpt-4o", 0.2, 1000, [dict(m) for m in MESSAGES])
+    assert key != ResponseCache.make_key("gpt-4o-mini", 0.2, 1000, MESSAGES)
+    assert key != ResponseCache.make_key("gpt-4o", 0.7, 1000, MESSAGES)
+    assert key != ResponseCache.make_key("gpt-4o", 0.2, 2000, MESSAGES)
+    assert key != ResponseCache.make_key("gpt-4o", 0.2, 1000, [{"role": "user", "content": "Other"}])
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = SQLiteResponseCache(db_path=str(tmp_path / "responses.sqlite3"), ttl_seconds=0.05)
+    cache.set("key", "Summary")
+    time.sleep(0.1)
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SQLiteResponseCache(db_path=str(tmp_path / "responses.sqlite3"), max_bytes=2500)
+    cache.set("first", "x" * 1000)
+    cache.set("second", "x" * 1000)
+    time.sleep(0.01)
+    assert cache.get("first") is not None
+    cache.set("third", "x" * 1000)
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_default_database_is_private_to_the_user(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / "home-cache"))
+    cache = SQLiteResponseCache()
+    cache_dir = tmp_path / "home-cache" / "report_generation"
+    assert cache.db_path == str(cache_dir / "responses.sqlite3")
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
@@ -0,0 +1,74 @@
+from analysis.response_document import Heading, ResponseDocument, Table, TextLine
+
+
+RESPONSE = """# INTERNAL AUDIT REPORT
+
+| AUDIT TITLE | Customer Feedback Process |
+|---|---|
+| AUDITOR | Jane Doe |
+
+## PROCESS TABLE
+| PROCESS | SIGHTED EVIDENCE | OK | OFI | NC | NA | ADDITIONAL COMMENTS |
+|:-------|------------------|----|----|----|----|---------------------|
+|  Customer surveys | Company A.docx | ✔ |  |  |  | Reviewed 3 x forms |
+|---|---|---|---|---|---|---|
+| Complaint handling | Register.xlsx | | X | | | Follow up late |
+Audit Scope:
+- Feedback register
+## AUDIT REPORT FINAL COMMENTS
+The system is effective.\r
+"""
+
+
+def test_parse_builds_typed_blocks():
+    document = ResponseDocument.parse(RESPONSE)
+    kinds = [type(block) for block in document.blocks]
+    assert kinds[:4] == [Heading, TextLine, Table, TextLine]
+    assert document.blocks[0].level == 1
+    assert document.blocks[0].text == "INTERNAL AUDIT REPORT"
+
+    tables = [table for _, table in document.tables()]
+    assert len(tables) == 2
+    process = tables[1]
+    assert process.is_process_table
+    assert process.column_index("additional comments") == 6
+    # Cells are trimmed and the stray separator inside the body is dropped
+    assert process.body == [
+        ["Customer surveys", "Company A.docx", "✔", "", "", "", "Reviewed 3 x forms"],
+        ["Complaint handling", "Register.xlsx", "", "X", "", "", "Follow up late"],
+    ]
+    assert process.separator[0] == ":-------"
+
+
+def test_render_normalises_tables_and_keeps_prose():
+    rendered = ResponseDocument.parse(RESPONSE).render()
+    assert "|AUDIT TITLE|Customer Feedback Process|\n|---|---|" in rendered
+    # A table is always followed by a blank line, and carriage returns are dropped
+    assert "|Complaint handling|Register.xlsx||X|||Follow up late|\n\nAudit Scope:" in rendered
+    assert "The system is effective.\n" in rendered
+    assert "\r" not in rendered
+
+    # Rendering is stable once normalised
+    assert ResponseDocument.parse(rendered).render() == rendered
+
+
+def test_multiline_cells_render_as_br():
+    table = Table(["Field", "Value"])
+    table.rows.append(["Scope", "line one\nline two"])
+    assert ResponseDocument([table]).render() == "|Field|Value|\n|---|---|\n|Scope|line one<br>line two|"
+
+
+def test_sections_and_key_value_rows():
+    document = ResponseDocument.parse(RESPONSE)
+    sections = document.sections()
+    assert list(sections) == ["INTERNAL AUDIT REPORT", "PROCESS TABLE", "Audit Scope", "AUDIT REPORT FINAL COMMENTS"]
+    assert sections["Audit Scope"] == "- Feedback register"
+    assert "Audit Scope" not in document.sections(colon_headings=False)
+    assert ["AUDITOR", "Jane Doe"] in list(document.key_value_rows())
+
+
+def test_empty_response():
+    document = ResponseDocument.parse("")
+    assert [type(block) for block in document.blocks] == [TextLine]
+    assert document.render() == ""
+    assert list(document.tables()) == []
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+from analysis.response_document import ResponseDocument
+from analysis.response_processor import ResponsePreprocessor
+
+
+RESPONSE = """# INTERNAL AUDIT REPORT
+
+| AUDIT TITLE | Customer Feedback Process |
+|---|---|
+| AUDIT SCOPE | - Review of feedback register <br> - Survey forms <br> |
+| AUDITOR | Jane Doe |
+| OK | Conforms |
+| OFI | Opportunity for improvement |
+| NC | Nonconformance |
+| NA | Not applicable |
+
+## PROCESS TABLE
+| PROCESS | SIGHTED EVIDENCE | OK | OFI | NC | NA | ADDITIONAL COMMENTS |
+|:-------|------------------|----|----|----|----|---------------------|
+|  Process: Customer surveys | Evidence: Company A.docx score 9/10 | ✔ |  |  |  | Reviewed 3 x forms |
+| Complaint handling | Register.xlsx | | X | | | Follow up late |
+| [EMPTY] | | | | | | |
+
+Audit Scope:
+| NONCONFORMANCES | No |
+|---|---|
+| OPPORTUNITIES FOR IMPROVEMENTS | Yes <br> - faster follow up |
+
+## AUDIT REPORT FINAL COMMENTS
+The system is effective.
+
+- Strength one
+### Sub point
+Jane Doe
+Internal Auditor
+01/01/2026
+| SIGNED | yes |
+"""
+
+EVIDENCE_IMAGES = {'Company A.docx': [], 'Register.xlsx': []}
+EVIDENCE_METADATA = {
+    'Company A.docx': {'scores': ['4/10'], 'companies': ['ACME'], 'dates': ['1/1/26'], 'comments': ['slow']},
+    'Register.xlsx': {'scores': []},
+}
+
+RESPONSES = [
+    RESPONSE,
+    "",
+    "# H",
+    "x\n",
+    "# A\n\n# B\n| a | b |\n|--|--|\n| 1 | 2 |\n## C\ntext\r\nmore",
+    "Audit Scope:\nfoo\n# T\n",
+]
+
+
+def preprocessor():
+    processor = ResponsePreprocessor()
+    processor.set_evidence_images(EVIDENCE_IMAGES, EVIDENCE_METADATA)
+    return processor
+
+
+def reference(text):
+    """Run every step over the whole parsed response, as before streaming was added."""
+    processor = preprocessor()
+    document = ResponseDocument.parse(text)
+    for step in (processor.ensure_proper_headings, processor.standardize_table_format,
+                 processor.fix_checkmark_symbols, processor.enhance_process_content,
+                 processor.process_evidence_references):
+        step(document)
+    return document.render(), processor.evidence_replacements, processor.score_annotations
+
+
+@pytest.mark.parametrize("text", RESPONSES)
+def test_preprocess_matches_whole_document_steps(text):
+    processor = preprocessor()
+    assert (processor.preprocess(text), processor.evidence_replacements, processor.score_annotations) == reference(text)
+
+
+@pytest.mark.parametrize("text", RESPONSES)
+def test_streamed_chunks_match_one_shot(text):
+    expected = reference(text)
+    rng = random.Random(1)
+    for _ in range(5):
+        processor = preprocessor()
+        position = 0
+        while position < len(text):
+            size = rng.randint(1, 12)
+            processor.feed(text[position:position + size])
+            position += size
+        assert (processor.finish(), processor.evidence_replacements, processor.score_annotations) == expected
+
+
+def test_preview_grows_as_sections_close():
+    processor = preprocessor()
+    assert processor.preview() == ""
+    assert not processor.feed("# INTERNAL AUDIT REPORT\n\nIntro")
+    assert processor.preview() == ""
+
+    # The next heading closes the section above it
+    assert processor.feed(" text\n## PROCESS TABLE\n")
+    assert processor.preview() == "# INTERNAL AUDIT REPORT\n\nIntro text"
+    assert "PROCESS TABLE" not in processor.preview()
+
+    processor.finish()
+    assert processor.preview().endswith("## PROCESS TABLE\n")
+
+
+def test_preprocessed_response_standardises_the_process_table():
+    processor = preprocessor()
+    text = processor.preprocess(RESPONSE)
+    assert "|PROCESS|SIGHTED EVIDENCE|OK|OFI|NC|NA|ADDITIONAL COMMENTS|\n|---|---|---|---|---|---|---|" in text
+    assert "## Audit Scope" in text
+    assert "✔" not in text
+    # The low score marks the row as a nonconformance and answers the NONCONFORMANCES question
+    assert [a['category'] for a in processor.score_annotations.values()] == ['NC', 'OK']
+    assert "|NONCONFORMANCES|Yes<br>" in text
@@ -0,0 +1,32 @@
+from analysis import tokenizer
+from analysis.tokenizer import count_tokens, split_to_token_budget
+
+
+def test_empty_text_has_no_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens(None) == 0
+
+
+def test_short_texts_are_memoised():
+    tokenizer._count_tokens.cache_clear()
+    text = "Calibration records were reviewed."
+    first = count_tokens(text)
+    assert first > 0
+    assert count_tokens(text) == first
+    assert tokenizer._count_tokens.cache_info().hits == 1
+
+
+def test_long_texts_are_not_memoised():
+    tokenizer._count_tokens.cache_clear()
+    text = "evidence " * (tokenizer.MEMO_MAX_CHARS // 9 + 1)
+    assert len(text) > tokenizer.MEMO_MAX_CHARS
+    assert count_tokens(text) == count_tokens(text) > 0
+    assert tokenizer._count_tokens.cache_info().currsize == 0
+
+
+def test_split_respects_the_budget():
+    text = "evidence " * 500
+    pieces = split_to_token_budget(text, 100)
+    assert len(pieces) > 1
+    assert all(count_tokens(piece) <= 100 for piece in pieces)
+    assert "".join(pieces) == text